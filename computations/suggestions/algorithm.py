@@ -203,7 +203,10 @@ class pareto:
 
         outputSum = sum(t_outputs[output_id]["data"]["value"])
 
-        return (underfundingSum, outputSum, -len(t_messages), -sum(capCosts))
+        # repeated messages are folded, count every occurrence
+        messageCount = builtins.sum(m.get("count", 1) for m in t_messages)
+
+        return (underfundingSum, outputSum, -messageCount, -sum(capCosts))
 
     def optimize(self, projectId, phaseId):
         # go for a particular project
@@ -4,6 +4,7 @@ Created on 5/07/2016
 @author: achim
 '''
 import datetime
+from pymerlin import runcache
 from .utilities import *  # @UnusedWildImport
 
 class pareto_context:
@@ -19,6 +20,10 @@ class pareto_context:
 
     timelineLength = 4*12  # this is the planning horizon in months
 
+    # e.g. a runcache.MemoryCache, evaluations of the same project timing
+    # are then only simulated once
+    run_cache = None
+
     def tick_to_start_date(self, tick):
         # convert a simulation tick, as used in events/scenarios to
         # their calendar date.
@@ -136,6 +141,14 @@ class pareto_context:
                             if m.id in baselineScenIds] +
                            [m for m in pyScenarios
                             if m.id in phaseScenarioIds])
+        if self.run_cache is not None:
+            return runcache.cached_run(
+                self.msim, self.run_cache,
+                scenarios=activeScenarios,
+                end=self.timelineLength)['telemetry']
         self.msim.run(scenarios=activeScenarios, end=self.timelineLength)
         tele = self.msim.get_sim_telemetry()
+        # undo the scenario changes, the next evaluation starts from the
+        # same model
+        self.msim.rollback()
         return tele
@@ -12,7 +12,8 @@ from pymerlin import merlin
 from pymerlin import processes
 import logging
 import math
-import random
+
+import numpy as np
 
 # Global logging settings
 logging_level = logging.INFO
@@ -31,6 +32,8 @@ class StorageServiceProcess(merlin.Process):
     generates revenue.
     """
 
+    pure = True
+
     def __init__(
             self,
             default_lifecycle=20,
@@ -195,6 +198,8 @@ class OutsourcedFileLogisticsProcess(merlin.Process):
     datacenter.
     """
 
+    pure = True
+
     def __init__(
             self,
             name="Outsourced File Logistics",
@@ -693,7 +698,9 @@ class StaffProcess(merlin.Process):
                 # hire staff...
                 # print('hiring staff')
                 if self.ls_adjustment_month < self.staff_hire_period:
-                    staff_hired = random.randint(0, (line_staff_no - self.actual_line_staff))
+                    staff_hired = self.get_random_generator().integers(
+                        0, (line_staff_no - self.actual_line_staff),
+                        endpoint=True).item()
                     # print('ls staff_hired: {0}'.format(staff_hired))
                     self.actual_line_staff += staff_hired
                     new_training_cohort = {
@@ -745,8 +752,9 @@ class StaffProcess(merlin.Process):
                 # hire staff...
                 # print('hiring staff')
                 if self.ohs_adjustment_month < self.staff_hire_period:
-                    staff_hired = random.randint(0, (
-                    overhead_staff_no - self.actual_overhead_staff))
+                    staff_hired = self.get_random_generator().integers(
+                        0, (overhead_staff_no - self.actual_overhead_staff),
+                        endpoint=True).item()
                     # print('oh staff_hired: {0}'.format(staff_hired))
                     self.actual_overhead_staff += staff_hired
                     if new_training_cohort:
@@ -865,6 +873,8 @@ class StaffProcess(merlin.Process):
 
 class ICTDesktopContract(merlin.Process):
 
+    pure = True
+
     def __init__(
             self,
             actual_desktops=0,
@@ -1010,6 +1020,15 @@ class ICTDesktopContract(merlin.Process):
 
 class InternalICTDesktopService(merlin.Process):
 
+    actual_desktops = merlin.PropertyValue('actual_desktops')
+    hrs_per_desktop = merlin.PropertyValue('hrs_per_desktop')
+    cost_per_desktop = merlin.PropertyValue('cost_per_desktop')
+    maintenance_cost_per_desktop = merlin.PropertyValue(
+        'maintenance_cost_per_desktop')
+    depreciation_period = merlin.PropertyValue('depreciation_period')
+    fin_charge_percent = merlin.PropertyValue('fin_charge_percent')
+    life_time = merlin.PropertyValue('life_time')
+
     def __init__(
             self,
             actual_desktops=0,
@@ -1093,12 +1112,15 @@ class InternalICTDesktopService(merlin.Process):
         # must perfectly divide by 12
         self.cohorts_per_year = 3
 
-        # data structure to hold cohorts for depreciating
-        self.cohorts = list()
+        # the cohorts for depreciating, their ages in months and numbers
+        # of desktops
+        self.cohort_ages = np.zeros(0)
+        self.cohort_desktops = np.zeros(0, dtype=int)
 
         # random seed value for testing predictability leave None for
-        # default random.seed() gen
-        self.random_seed = 7891011
+        # the random stream of the simulation run
+        self.random_seed = None
+        self._rng = None  # type: np.random.Generator
 
         # A flag used to generate an initial scenario
         self._generated = False
@@ -1113,41 +1135,39 @@ class InternalICTDesktopService(merlin.Process):
         num_starting_cohorts = self.starting_cohort_range * self.cohorts_per_year
         months_per_cohort =  (self.starting_cohort_range * 12) / num_starting_cohorts
 
-        for i in range(0, num_starting_cohorts):
-            cohort = dict()
-            cohort['age'] = i * months_per_cohort
-            cohort['desktops'] = 0
-            self.cohorts.append(cohort)
+        self.cohort_ages = np.arange(num_starting_cohorts) * months_per_cohort
 
         # Distribute existing desktops amongst starting cohorts
         try:
-            desktops_to_distribute = int(self.get_prop_value('actual_desktops'))
+            desktops_to_distribute = int(self.actual_desktops)
             desktops_to_distribute = 0 if desktops_to_distribute < 0 else desktops_to_distribute
         except ValueError:
             desktops_to_distribute = 0
 
         if self.random_cohort_spread:
-            for i in range(0, desktops_to_distribute):
-                rand_index = random.randint(0, num_starting_cohorts - 1)
-                self.cohorts[rand_index]['desktops'] += 1
+            # every desktop is equally likely to belong to any cohort
+            self.cohort_desktops = self._rng.multinomial(
+                desktops_to_distribute,
+                np.full(num_starting_cohorts, 1.0 / num_starting_cohorts))
         else:
-            i = 0
-            while desktops_to_distribute > 0:
-                self.cohorts[i]['desktops'] += 1
-                desktops_to_distribute -= 1
-                i += 1
-                if i == len(self.cohorts):
-                    i = 0
+            # one at a time, starting with the youngest cohort again after
+            # the oldest
+            self.cohort_desktops = np.full(
+                num_starting_cohorts,
+                desktops_to_distribute // num_starting_cohorts)
+            self.cohort_desktops[
+                :desktops_to_distribute % num_starting_cohorts] += 1
 
-        assert desktops_to_distribute == \
-               sum([c['desktops'] for c in self.cohorts])
+        assert desktops_to_distribute == self.cohort_desktops.sum()
 
 
     def reset(self):
         self._generated = False
-        if self.random_seed:
-            random.seed(self.random_seed)
-        self.cohorts.clear()
+        self._rng = (
+            self.get_random_generator() if self.random_seed is None
+            else np.random.default_rng(self.random_seed))
+        self.cohort_ages = np.zeros(0)
+        self.cohort_desktops = np.zeros(0, dtype=int)
 
     def compute(self, tick):
 
@@ -1156,44 +1176,41 @@ class InternalICTDesktopService(merlin.Process):
         it_budget = self.get_input_available('IT budget')
 
         # get Process Properties
-        actual_desktops = self.get_prop_value('actual_desktops')
-        it_hrs_per_desktop = self.get_prop_value('hrs_per_desktop')
-        acq_cost_per_desktop = self.get_prop_value('cost_per_desktop')
-        maint_cost_per_desktop = self.get_prop_value(
-                                            'maintenance_cost_per_desktop')
-        depr_period = self.get_prop_value('depreciation_period')
-        financial_charge_percent = self.get_prop_value("fin_charge_percent")
-        life_time = self.get_prop_value("life_time")
+        actual_desktops = self.actual_desktops
+        it_hrs_per_desktop = self.hrs_per_desktop
+        acq_cost_per_desktop = self.cost_per_desktop
+        maint_cost_per_desktop = self.maintenance_cost_per_desktop
+        depr_period = self.depreciation_period
+        financial_charge_percent = self.fin_charge_percent
+        life_time = self.life_time
 
         if not self._generated:
             self._generated = True
             self.create_desktop_simulation()
 
         # Do the disposal steps
-        legacy_desktops = sum([c['desktops'] for c in self.cohorts])
+        legacy_desktops = self.cohort_desktops.sum().item()
 
         # Dispose of end-of-life desktop cohort
-        cohorts_to_dispose = [c for c in self.cohorts if c['age'] > (life_time * 12.0)]
-        for c in cohorts_to_dispose:
-            self.cohorts.remove(c)
+        to_dispose = self.cohort_ages > (life_time * 12.0)
 
         # Get the number of desktops to dispose
-        desktops_to_dispose = sum([c['desktops'] for c in cohorts_to_dispose])
+        desktops_to_dispose = self.cohort_desktops[to_dispose].sum().item()
+        self.cohort_ages = self.cohort_ages[~to_dispose]
+        self.cohort_desktops = self.cohort_desktops[~to_dispose]
 
         if ((legacy_desktops - desktops_to_dispose) < actual_desktops) and self.auto_purchase_cohorts:
             # We need to purchase a new cohort of pcs this month
             desktops_to_purchase = actual_desktops - (legacy_desktops - desktops_to_dispose)
-            new_cohort = dict()
-            new_cohort['desktops'] = desktops_to_purchase
-            new_cohort['age'] = 0
-            self.cohorts.append(new_cohort)
+            self.cohort_ages = np.append(self.cohort_ages, 0)
+            self.cohort_desktops = np.append(
+                self.cohort_desktops, desktops_to_purchase)
             desktops_provided = actual_desktops
         else:
             desktops_provided = (legacy_desktops - desktops_to_dispose)
 
         # age cohorts
-        for c in self.cohorts:
-            c['age'] += 1
+        self.cohort_ages += 1
 
         work_hrs_required = desktops_provided * it_hrs_per_desktop / 12.0
 
@@ -1345,9 +1362,9 @@ class RegistrationServiceProcess(merlin.Process):
             elif at == RegistrationServiceProcess.ApplicationsTrend.INCREASE:
                 self.current_applications += (self.current_applications * self.rate)
             elif at == RegistrationServiceProcess.ApplicationsTrend.RANDOM_FLUCTUATION:
-                self.current_applications += (random.randint(-self.random_range, self.random_range))
+                self.current_applications += self.get_random_generator().integers(
+                    -self.random_range, self.random_range, endpoint=True).item()
 
-        # random.seed()
         # self.current_applications += float(random.randint(-self.jitter, self.jitter))
         # self.current_applications += math.sin(tick) * self.sin_magnitude
 
@@ -97,29 +97,20 @@ class ppPrinter(merlin.Process):
 
     def compute(self, tick):
 
-        staff_available = self.get_input_available("staff")
         staff_required = self.get_prop_value("staffRequired")
 
-        if staff_available < staff_required:
+        if not self.require_input("staff", staff_required, notify=False):
             self.outputs["passportsPrinted"].connector.write(0)
-            raise merlin.InputRequirementException(
-                                        self,
-                                        self.inputs["staff"],
-                                        staff_available,
-                                        staff_required)
+            return
 
         self.inputs["staff"].consume(staff_required)
 
         budget_available = self.inputs["budget"].connector.value
         cost_per_print = self.props["costPerPrint"].get_value()
 
-        if budget_available < 0.0:
+        if not self.require_input("budget", 0.0, notify=False):
             self.outputs["passportsPrinted"].connector.write(0)
-            raise merlin.InputRequirementException(
-                                        self,
-                                        self.inputs["budget"],
-                                        budget_available,
-                                        0.0)
+            return
 
         passports = int(budget_available//cost_per_print)
         self.inputs["budget"].consume(passports*cost_per_print)
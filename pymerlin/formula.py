@@ -0,0 +1,313 @@
+"""
+.. module:: formula
+
+Processes declared as formulas instead of written as classes.
+
+A :py:class:`FormulaProcess` is given its inputs, properties and outputs,
+and expressions for what it requires, consumes and provides::
+
+    entity.create_process(formula.FormulaProcess, {
+        'name': 'Staff',
+        'inputs': {'budget': '$', 'desks': 'desks'},
+        'properties': {'staff': 100, 'salary': 5.0},
+        'requirements': {'budget': 'staff * salary', 'desks': 'staff'},
+        'outputs': {'handled': ['requests_handled', 'staff * 0.9']}})
+
+which does the same as a :py:meth:`pymerlin.merlin.Process.compute` reading
+the values, checking that every input provides what the requirements
+demand, calling :py:meth:`pymerlin.merlin.Process.consume_input` and
+:py:meth:`pymerlin.merlin.Process.provide_output`. The parameters are JSON
+compatible, so the process is serialised like any other.
+
+Expressions are Python arithmetic on the names of the inputs (the value
+available) and properties, with comparisons, ``and``, ``or``, ``not``,
+``a if condition else b`` and the functions ``min``, ``max`` and ``abs``.
+They are compiled once into a function computing all of them, shared by
+all processes with the same formulas, and into a variant operating on
+numpy arrays for :py:func:`pymerlin.horizon.run`.
+
+:py:meth:`FormulaProcess.dependencies` tells which inputs and properties an
+output depends on.
+"""
+import ast
+import functools
+from typing import (Any, Callable, Dict, FrozenSet, Iterable,  # @UnusedImports
+                    List, Mapping, Tuple)  # @UnusedImports
+
+import numpy as np
+
+from pymerlin import merlin
+
+
+_SCALAR_FUNCTIONS = {
+    'min': min,
+    'max': max,
+    'abs': abs,
+}
+
+_ARRAY_FUNCTIONS = {
+    'min': lambda *a: functools.reduce(np.minimum, a),
+    'max': lambda *a: functools.reduce(np.maximum, a),
+    'abs': np.abs,
+    '_where': np.where,
+    # the operand deciding the result, like Python's and/or
+    '_and': lambda *a: functools.reduce(lambda x, y: np.where(x, y, x), a),
+    '_or': lambda *a: functools.reduce(lambda x, y: np.where(x, x, y), a),
+    '_not': np.logical_not,
+}
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare,
+    ast.IfExp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub, ast.Not, ast.And, ast.Or,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+)
+
+# (variables, expressions, array variant) -> compiled function
+_compiled = dict()  # type: Dict[Tuple[Tuple[str, ...], Tuple[str, ...], bool], Callable]
+
+
+class FormulaProcess(merlin.Process):
+    """
+    A process computing its outputs from expressions, see
+    :py:mod:`pymerlin.formula`.
+
+    If an input provides less than its requirement, the process records and
+    notifies the insufficient input, provides zero at all outputs and consumes
+    nothing, otherwise it consumes the ``consumption`` and provides the
+    outputs.
+    """
+
+    pure = True
+
+    def __init__(
+            self,
+            name: str='Formula',
+            inputs: Mapping[str, str]=None,
+            properties: Mapping[str, Any]=None,
+            outputs: Mapping[str, Tuple[str, str]]=None,
+            requirements: Mapping[str, str]=None,
+            consumption: Mapping[str, str]=None):
+        """
+        :param inputs: ``{name: unit}``
+        :param properties: ``{name: default value}`` of number properties,
+            the name doubles as display name
+        :param outputs: ``{name: (unit, expression)}``
+        :param requirements: ``{input name: expression}``, the value needed
+            from an input
+        :param consumption: ``{input name: expression}``, the value consumed
+            from an input, the requirements by default
+        :raises pymerlin.merlin.MerlinException: on invalid names and
+            expressions
+        """
+        super(FormulaProcess, self).__init__(name)
+        inputs = inputs or {}
+        properties = properties or {}
+        outputs = outputs or {}
+        requirements = requirements or {}
+        consumption = requirements if consumption is None else consumption
+
+        for k, unit in inputs.items():
+            self.add_input(k, unit)
+        for k, default in properties.items():
+            self.add_property(
+                k, k, merlin.ProcessProperty.PropertyType.number_type,
+                default)
+        for k, (unit, _) in outputs.items():
+            self.add_output(k, unit)
+
+        for k in list(requirements) + list(consumption):
+            if k not in self.inputs:
+                raise merlin.MerlinException(
+                    "{0} is not an input of {1}".format(k, name))
+
+        self._input_names = tuple(inputs)
+        self._prop_names = tuple(properties)
+        self._required = tuple(requirements)
+        self._consumed = tuple(consumption)
+        self._provided = tuple(outputs)
+        variables = self._input_names + self._prop_names
+        if len(set(variables)) < len(variables):
+            raise merlin.MerlinException(
+                "inputs and properties of {0} share names".format(name))
+
+        self._requirement_expressions = tuple(requirements.values())
+        self._result_expressions = (
+            tuple(consumption.values()) +
+            tuple(expression for _, expression in outputs.values()))
+        # the inputs checked and the names their requirements depend on
+        self._required_names = frozenset(requirements).union(*(
+            _names(expression, variables)
+            for expression in self._requirement_expressions))
+        self._output_names = {
+            k: _names(expression, variables)
+            for k, (_, expression) in outputs.items()}
+        # replaying the last compute only depends on these
+        used = self._required_names.union(
+            *self.dependencies().values(),
+            *(_names(expression, variables)
+              for expression in consumption.values()))
+        self._key_inputs = tuple(k for k in self._input_names if k in used)
+        self._key_props = tuple(k for k in self._prop_names if k in used)
+
+        self._check = _compile(
+            variables, self._requirement_expressions, False)
+        self._results = _compile(
+            variables, self._result_expressions, False)
+
+    def dependencies(self) -> Dict[str, FrozenSet[str]]:
+        """
+        :returns: ``{output name: names}`` of the inputs and properties every
+            output depends on, the requirements and the inputs they check
+            included, as they decide whether anything is provided.
+        """
+        return {k: names | self._required_names
+                for k, names in self._output_names.items()}
+
+    def _memo_key(self):
+        # only the inputs and properties the expressions depend on
+        return (tuple([self.inputs[k].connector.value
+                       for k in self._key_inputs]),
+                tuple([self.props[k]._value for k in self._key_props]))
+
+    def compute(self, tick):
+        args = ([self.inputs[k].connector.value for k in self._input_names] +
+                [self.props[k]._value for k in self._prop_names])
+
+        required = self._check(*args)
+        sufficient = True
+        for k, value in zip(self._required, required):
+            sufficient &= self.require_input(k, value)
+        if not sufficient:
+            self.write_zero_to_all()
+            return
+
+        results = self._results(*args)
+        for k, value in zip(self._consumed, results):
+            self.consume_input(k, value)
+        for k, value in zip(self._provided, results[len(self._consumed):]):
+            self.provide_output(k, value)
+
+    def compute_horizon(self, ticks, inputs, props):
+        variables = self._input_names + self._prop_names
+        args = ([inputs[k] for k in self._input_names] +
+                [props[k] for k in self._prop_names])
+
+        required = [
+            np.broadcast_to(value, ticks.shape) for value in _compile(
+                variables, self._requirement_expressions, True)(*args)]
+        sufficient = np.ones(ticks.shape, dtype=bool)
+        for k, value in zip(self._required, required):
+            sufficient &= inputs[k] >= value
+        sim = self.parent.sim
+        for i in np.flatnonzero(~sufficient).tolist():
+            for k, value in zip(self._required, required):
+                if inputs[k][i] < value[i]:
+                    available = inputs[k][i].item()
+                    needed = value[i].item()
+                    tick = ticks[i].item()
+                    sim.record_shortfall(self, k, available, needed, tick=tick)
+                    self.notify_insufficient_input(
+                        k, available, needed, tick=tick)
+
+        results = [
+            np.where(sufficient, value, 0.0) for value in _compile(
+                variables, self._result_expressions, True)(*args)]
+        return (dict(zip(self._provided, results[len(self._consumed):])),
+                dict(zip(self._consumed, results)))
+
+
+def _parse(expression: str, variables: Iterable[str]) -> ast.Expression:
+    try:
+        tree = ast.parse(expression, mode='eval')
+    except SyntaxError as e:
+        raise merlin.MerlinException(
+            "invalid expression {0}: {1}".format(expression, e))
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES):
+            raise merlin.MerlinException(
+                "{0} not allowed in expression {1}".format(
+                    type(node).__name__, expression))
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and
+                    node.func.id in _SCALAR_FUNCTIONS and
+                    not node.keywords):
+                raise merlin.MerlinException(
+                    "only min, max and abs may be called in "
+                    "expression {0}".format(expression))
+        elif isinstance(node, ast.Name) and node.id not in variables and \
+                node.id not in _SCALAR_FUNCTIONS:
+            raise merlin.MerlinException(
+                "unknown name {0} in expression {1}".format(
+                    node.id, expression))
+        elif isinstance(node, ast.Constant) and \
+                not isinstance(node.value, (int, float)):
+            raise merlin.MerlinException(
+                "only numbers are allowed in expression {0}".format(
+                    expression))
+        elif isinstance(node, ast.Compare) and len(node.ops) > 1:
+            raise merlin.MerlinException(
+                "chained comparison in expression {0}".format(expression))
+    return tree
+
+
+def _names(expression: str, variables: Iterable[str]) -> FrozenSet[str]:
+    return frozenset(
+        node.id for node in ast.walk(_parse(expression, variables))
+        if isinstance(node, ast.Name) and node.id in variables)
+
+
+class _ArrayTransformer(ast.NodeTransformer):
+    # replaces the operators without element wise meaning by numpy calls
+
+    def _call(self, function, args, node):
+        return ast.copy_location(
+            ast.Call(func=ast.Name(id=function, ctx=ast.Load()),
+                     args=args, keywords=[]),
+            node)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._call('_where', [node.test, node.body, node.orelse],
+                          node)
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        function = '_and' if isinstance(node.op, ast.And) else '_or'
+        return self._call(function, node.values, node)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._call('_not', [node.operand], node)
+        return node
+
+
+def _compile(
+        variables: Tuple[str, ...],
+        expressions: Tuple[str, ...],
+        array: bool) -> Callable:
+    """
+    :returns: a function of the variables returning the tuple of the
+        expressions' values
+    """
+    key = (variables, expressions, array)
+    function = _compiled.get(key)
+    if function is None:
+        for v in variables:
+            if not v.isidentifier() or v in _ARRAY_FUNCTIONS:
+                raise merlin.MerlinException(
+                    "{0} can not be used in expressions".format(v))
+        # a lambda of the variables, its body replaced by the expressions
+        tree = ast.parse('lambda {0}: ()'.format(', '.join(variables)),
+                         mode='eval')
+        bodies = [_parse(e, variables).body for e in expressions]
+        if array:
+            bodies = [_ArrayTransformer().visit(b) for b in bodies]
+        tree.body.body = ast.Tuple(elts=bodies, ctx=ast.Load())
+        ast.fix_missing_locations(tree)
+        namespace = dict(_ARRAY_FUNCTIONS if array else _SCALAR_FUNCTIONS)
+        function = eval(compile(tree, '<formula>', 'eval'), namespace)
+        _compiled[key] = function
+    return function
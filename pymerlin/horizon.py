@@ -0,0 +1,304 @@
+"""
+.. module:: horizon
+
+Evaluating a simulation entity by entity instead of tick by tick.
+
+:py:meth:`pymerlin.merlin.Simulation.run` ticks the source entities once per
+step, every entity reached computes its processes for that step. :py:func:`run`
+visits every entity once instead, in topological order, and its processes
+compute all ticks of the run at once with
+:py:meth:`pymerlin.merlin.Process.compute_horizon`, so numpy does the per
+tick arithmetic::
+
+    if horizon.supported(sim, scenarios):
+        horizon.run(sim, scenarios=scenarios)
+    else:
+        sim.run(scenarios=scenarios)
+
+This requires models
+
+* whose computed entities only have processes implementing
+  ``compute_horizon``, and every output connector written by one process,
+* without cycles between the entities and without additive inputs, i.e.
+  without values fed back from earlier ticks,
+* whose scenarios only change property values, with
+  :py:class:`pymerlin.merlin.ModifyProcessPropertyAction` and
+  :py:class:`pymerlin.merlin.ScheduleProcessPropertyAction`. They are
+  executed tick by tick before any entity is computed, which gives every
+  property an array of values.
+
+The results and telemetry are those of
+:py:meth:`pymerlin.merlin.Simulation.run`, with two differences: the
+consumption of a process input has a value for every tick, and an
+:py:class:`pymerlin.merlin.InputRequirementException` raised by a process
+applies to the whole run rather than a single tick: a shortfall is recorded
+for every tick and the process provides zeros, as it does for a tick in
+:py:meth:`pymerlin.merlin.Simulation.run`. Messages and shortfalls are the
+same, but may be listed in a different order.
+"""
+import operator
+from typing import Any, Dict, Iterable, List, Set  # @UnusedImports
+
+import numpy as np
+
+from pymerlin import merlin
+from pymerlin import telemetry
+
+
+PROPERTY_ACTIONS = (merlin.ModifyProcessPropertyAction,
+                    merlin.ScheduleProcessPropertyAction)
+"""the actions scenarios of a horizon run may contain"""
+
+_id = operator.attrgetter('id')
+
+
+def supported(
+        sim: merlin.Simulation,
+        scenarios: Iterable[merlin.Scenario]=()) -> bool:
+    """
+    :returns: True if :py:func:`run` can evaluate ``sim`` with
+        ``scenarios``
+    """
+    try:
+        _plan(sim, scenarios)
+    except merlin.MerlinException:
+        return False
+    return True
+
+
+def run(
+        sim: merlin.Simulation,
+        start: int=1,
+        end: int=-1,
+        scenarios: List[merlin.Scenario]=(),
+        rollback: bool=False,
+        seed: int=None) -> None:
+    """
+    Runs ``sim`` like :py:meth:`pymerlin.merlin.Simulation.run`, with the
+    same arguments.
+
+    :raises pymerlin.merlin.MerlinException: if the model or the scenarios
+        are not :py:func:`supported`, before anything is changed
+    """
+    computed = _plan(sim, scenarios)
+
+    sim.shortfalls.clear()
+    sim._messages.clear()
+    sim._undo_log.clear()
+    sim._seed_run(seed)
+    if end > sim.num_steps:
+        sim.num_steps = end
+    sim_start = start if start > 1 else 1
+    sim_end = end if (0 < end < sim.num_steps) else sim.num_steps
+    sim.start_step = sim_start
+    for o in sim.outputs:
+        o.reset()
+    for e in sim._entities:
+        e.reset()
+
+    ticks = np.arange(sim_start, sim_end + 1)
+    try:
+        props = _property_values(sim, computed, ticks, scenarios)
+        # the values arriving at the input connectors
+        values = dict()  # type: Dict[merlin.InputConnector, np.ndarray]
+        for e in computed:
+            # an upstream entity may have failed
+            if all(i in values for i in e.inputs):
+                _compute_entity(e, ticks, values, props)
+        for o in sim.outputs:
+            _compute_output(o, ticks, values)
+    finally:
+        if rollback:
+            sim.rollback()
+
+
+def _plan(
+        sim: merlin.Simulation,
+        scenarios: Iterable[merlin.Scenario]) -> List[merlin.Entity]:
+    # the entities Simulation.run computes, in topological order
+    for s in scenarios:
+        for event in s.events:
+            for a in event.actions:
+                if not isinstance(a, PROPERTY_ACTIONS):
+                    raise merlin.MerlinException(
+                        "{0} is not supported in horizon runs".format(
+                            type(a).__name__))
+
+    entities = list(sim.get_entities())
+    downstream = dict()  # type: Dict[merlin.Entity, List[merlin.Entity]]
+    upstream_count = dict.fromkeys(entities, 0)
+    pending = list(entities)
+    while pending:
+        e = pending.pop()
+        downstream[e] = list()
+        for o_con in e.outputs:
+            for ep in o_con.get_endpoint_objects():
+                d = ep.connector.parent
+                if isinstance(d, merlin.Entity) and d not in downstream[e]:
+                    downstream[e].append(d)
+                    if d not in upstream_count:
+                        upstream_count[d] = 0
+                        pending.append(d)
+                    upstream_count[d] += 1
+
+    order = list()
+    ready = sorted((e for e, n in upstream_count.items() if n == 0),
+                   key=_id, reverse=True)
+    while ready:
+        e = ready.pop()
+        order.append(e)
+        for d in downstream[e]:
+            upstream_count[d] -= 1
+            if upstream_count[d] == 0:
+                ready.append(d)
+    if len(order) < len(upstream_count):
+        raise merlin.MerlinException(
+            "the entities of {0} form a cycle".format(sim.name))
+
+    # entities are computed once all their inputs were written
+    written = set()  # type: Set[merlin.InputConnector]
+    computed = list()
+    for e in order:
+        if not e.inputs and e not in sim.source_entities:
+            continue
+        if not all(i in written for i in e.inputs):
+            continue
+        if any(i.additive_write for i in e.inputs):
+            raise merlin.MerlinException(
+                "{0} has additive inputs".format(e.name))
+        writers = dict()  # type: Dict[merlin.OutputConnector, merlin.Process]
+        for p in e.get_processes():
+            if type(p).compute_horizon is merlin.Process.compute_horizon:
+                raise merlin.MerlinException(
+                    "{0} has no compute_horizon".format(type(p).__name__))
+            for po in p.outputs.values():
+                if writers.setdefault(po.connector, p) is not p:
+                    raise merlin.MerlinException(
+                        "{0} is written by more than one process".format(
+                            po.connector.name))
+        for o_con in writers:
+            written.update(ep.connector
+                           for ep in o_con.get_endpoint_objects())
+        computed.append(e)
+    return computed
+
+
+def _property_values(
+        sim: merlin.Simulation,
+        computed: List[merlin.Entity],
+        ticks: np.ndarray,
+        scenarios: List[merlin.Scenario]
+        ) -> Dict[merlin.ProcessProperty, List[Any]]:
+    # executes the scenario events and schedules, as Simulation.run does
+    # before the entities compute
+    props = [pp for e in computed for p in e.get_processes()
+             for pp in p.get_properties()]
+    values = {pp: list() for pp in props}
+    for t in ticks.tolist():
+        sim.current_step = t
+        sim._run_senario_events(scenarios)
+        for pp in props:
+            if pp.active_schedule is not None:
+                pp.apply_schedule(t)
+            values[pp].append(pp._value)
+    return values
+
+
+def _compute_entity(
+        e: merlin.Entity,
+        ticks: np.ndarray,
+        values: Dict[merlin.InputConnector, np.ndarray],
+        props: Dict[merlin.ProcessProperty, List[Any]]) -> None:
+    available = {i: values[i] for i in e.inputs}
+    written = dict()  # type: Dict[merlin.OutputConnector, np.ndarray]
+    e.current_time = int(ticks[-1])
+    e.processed = True
+    for priority in sorted(e._processes):
+        for p in e._processes[priority]:
+            try:
+                outputs, consumed = p.compute_horizon(
+                    ticks,
+                    {k: available[pi.connector]
+                     for k, pi in p.inputs.items()},
+                    {k: np.asarray(props[pp]) for k, pp in p.props.items()})
+            except merlin.InputRequirementException as err:
+                # processes still raising instead of recording shortfalls,
+                # the entities downstream get zeros, as in Entity._process
+                for t, a, r in zip(
+                        ticks.tolist(),
+                        np.broadcast_to(err.input_value, ticks.shape).tolist(),
+                        np.broadcast_to(err.value, ticks.shape).tolist()):
+                    e.sim.record_shortfall(p, err.input_name(), a, r, tick=t)
+                outputs, consumed = {k: 0.0 for k in p.outputs}, {}
+            for k, c in consumed.items():
+                pi = p.inputs[k]
+                c = np.broadcast_to(c, ticks.shape)
+                available[pi.connector] = available[pi.connector] - c
+                _set_telemetry(pi, 'consume', c.tolist())
+            for k, po in p.outputs.items():
+                written[po.connector] = np.broadcast_to(
+                    outputs[k], ticks.shape)
+
+    for p in e.get_processes():
+        for pp in p.get_properties():
+            _set_telemetry(pp, 'value', props[pp])
+    for i, a in available.items():
+        i.value = a[-1].item()
+    for o_con, a in written.items():
+        _write(o_con, a, e.current_time, values)
+
+
+def _write(
+        o_con: merlin.OutputConnector,
+        written: np.ndarray,
+        time: int,
+        values: Dict[merlin.InputConnector, np.ndarray]) -> None:
+    # the telemetry of every write, the inputs' shares are derived from it
+    # like in OutputConnector.write
+    _set_telemetry(o_con, 'value', written.tolist())
+    state = (o_con.apportioning,
+             tuple((ep.connector, ep.bias) for ep in o_con._endpoints))
+    o_con._apportion_log = [(0, state)]
+    o_con.time = time
+    for i_con, _ in state[1]:
+        share = np.asarray(o_con.get_apportioned_telemetry(i_con))
+        values[i_con] = share
+        i_con.value = share[-1].item()
+        i_con.time = time
+        if not i_con._derived:
+            _set_telemetry(i_con, 'value', share.tolist())
+
+
+def _compute_output(
+        o: merlin.Output,
+        ticks: np.ndarray,
+        values: Dict[merlin.InputConnector, np.ndarray]) -> None:
+    if not o.inputs or not all(i in values for i in o.inputs):
+        return
+    total = 0.0
+    for i in o.inputs:
+        total = total + values[i]
+    o.result = total.tolist()
+    o._telemetry['value'] = o.result
+    o.current_time = int(ticks[-1])
+    o.updated = True
+    if o.minimum:
+        for t, v in zip(ticks.tolist(), o.result):
+            if v < o.minimum:
+                o.sim.log_message(
+                    merlin.MerlinMessage.MessageType.warn,
+                    o,
+                    "{0}_output_below_min".format(o.id),
+                    ("Output value {0} of type {1} has fallen " +
+                     "below the minimum of {2}").format(
+                        v,
+                        o.type,
+                        o.minimum),
+                    tick=t)
+
+
+def _set_telemetry(so: merlin.SimObject, prop: str, values: List[Any]) -> None:
+    if prop in so.compressed_telemetry:
+        so._telemetry[prop] = telemetry.RunLengthSeries(values)
+    else:
+        so._telemetry[prop] = list(values)
@@ -6,26 +6,79 @@ the system as well as some bootstrap and helper functions.
 
 .. moduleauthor:: Sam Win-Mason <sam@lemonadelabs.io>
 """
+import bisect
+import collections
 import itertools
 import logging
+import os
 import warnings
-import uuid
 import json
 import importlib
+import functools
+import contextlib
+import contextvars
 from datetime import datetime
 from enum import Enum
 from json.decoder import JSONDecodeError
 from typing import (Iterable, Set, Mapping, Any,
                     List, MutableSequence, Dict,  # @UnusedImports
-                    Union, MutableSet, MutableMapping)  # @UnusedImports
+                    Union, MutableSet, MutableMapping,  # @UnusedImports
+                    FrozenSet, Tuple, Iterator)  # @UnusedImports
+
+import numpy as np
+
+from pymerlin import telemetry
+
+
+# while set, new objects are numbered from it instead of getting a UUID; a
+# context variable, so objects created by other threads are not affected
+_placeholder_ids = contextvars.ContextVar(
+    '_placeholder_ids', default=None)  # type: contextvars.ContextVar
+
+
+@contextlib.contextmanager
+def _placeholder_id_scope():
+    """
+    For code which assigns the ids of the objects it creates, like
+    :py:func:`pymerlin.snapshot.from_dict`, generating UUIDs is wasted time.
+    """
+    token = _placeholder_ids.set(itertools.count(-1, -1))
+    try:
+        yield
+    finally:
+        _placeholder_ids.reset(token)
+
+
+# the version and variant bits of a random UUID
+_UUID4_CLEAR = ~((0xf000 << 64) | (0xc000 << 48))
+_UUID4_SET = (0x4000 << 64) | (0x8000 << 48)
+
+
+_UINT128 = (1 << 128) - 1
+
+
+def _new_id() -> int:
+    placeholder_ids = _placeholder_ids.get()
+    if placeholder_ids is None:
+        # int(uuid.uuid4()) without creating the UUID object
+        return (int.from_bytes(os.urandom(16), 'big') & _UUID4_CLEAR
+                | _UUID4_SET)
+    return next(placeholder_ids)
 
 
 class SimObject:
     """
     Basic properties of all sim objects.
     """
+
+    compressed_telemetry = frozenset()  # type: FrozenSet[str]
+    """
+    names of the telemetry channels stored as
+    :py:class:`pymerlin.telemetry.RunLengthSeries`
+    """
+
     def __init__(self, name: str=''):
-        self.id = int(uuid.uuid4())  # type: int
+        self.id = _new_id()  # type: int
         """auto-generated UUID"""
 
         self.name = name or str(self.id)
@@ -37,20 +90,80 @@ class SimObject:
         time series of values for that property
         """
 
+    undo_attributes = ()  # type: Tuple[str, ...]
+    """
+    names of the attributes actions may change, they are restored by
+    :py:meth:`Simulation.rollback`
+    """
+
+    value_undo_attributes = frozenset()  # type: FrozenSet[str]
+    """
+    the :py:attr:`undo_attributes` holding values, restoring them does not
+    change the structure of the model
+    """
+
     def reset_telemetry(self) -> None:
         self._telemetry = dict()
 
+    def _capture_state(self) -> Dict[str, Any]:
+        return {a: _copy_state(getattr(self, a))
+                for a in self.undo_attributes}
+
+    def _restore_state(self, state: Dict[str, Any]) -> bool:
+        """
+        :returns: whether an attribute other than the
+            :py:attr:`value_undo_attributes` was changed
+        """
+        structural = False
+        for a, value in state.items():
+            current = getattr(self, a)
+            if not structural and a not in self.value_undo_attributes:
+                structural = bool(current != value)
+            if isinstance(current, (set, dict)) and \
+                    type(current) is type(value):
+                # restore in place, the containers may be referenced
+                current.clear()
+                current.update(value)
+            else:
+                setattr(self, a, value)
+        return structural
+
     def set_telemetry_value(self, prop: str, value: Any) -> None:
 
         if prop not in self._telemetry:
-            self._telemetry[prop] = list()
+            if prop in self.compressed_telemetry:
+                self._telemetry[prop] = telemetry.RunLengthSeries()
+            else:
+                self._telemetry[prop] = list()
 
         self._telemetry[prop].append(value)
 
+    def set_telemetry_compression(self, prop: str, enabled: bool=True) -> None:
+        """
+        :param str prop: the telemetry channel, e.g. ``'value'``
+        :param bool enabled: store the channel run-length compressed
+
+        Worthwhile for series which are constant most of the time. Takes
+        effect with the next :py:meth:`reset_telemetry`.
+        """
+        if enabled:
+            self.compressed_telemetry = self.compressed_telemetry | {prop}
+        else:
+            self.compressed_telemetry = self.compressed_telemetry - {prop}
+
     def get_telemetry_data(self) -> Mapping[str, Iterable[Any]]:
         return self._telemetry
 
 
+def _copy_state(value):
+    # containers are copied, the objects in them are shared
+    if isinstance(value, dict):
+        return {k: _copy_state(v) for k, v in value.items()}
+    if isinstance(value, (set, list)):
+        return type(value)(value)
+    return value
+
+
 class Simulation(SimObject):
     """
     A representation of a network with its associated entities, ruleset,
@@ -60,32 +173,182 @@ class Simulation(SimObject):
     simulation with the :py:meth:`.add_entities` methods.
     """
 
+    undo_attributes = ('_entities', 'source_entities', 'outputs')
+
     def __init__(self, ruleset=None, config=None, outputs=None, name=''):
         super(Simulation, self).__init__(name)
         self._entities = set()  # type: MutableSet[Entity]
-        self._messages = list()  # type: List[MerlinMessage]
+        self._messages = MessageStore()  # type: MessageStore
+        self.message_threshold = MerlinMessage.MessageType.info
+        """messages less severe than this are dropped by log_message"""
         self.ruleset = ruleset  # type: Ruleset
         self.initial_state = config or []
         self.source_entities = set()  # type: MutableSet[Entity]
         self.outputs = outputs or set()  # type: MutableSet[Output]
         self.num_steps = 1  # type: int
         self.current_step = 1  # type: int
-        self.run_errors = list()  # type: List[MerlinException]
+        self.start_step = 1  # type: int
+        self.shortfalls = list()  # type: List[InputShortfall]
+        """the inputs of the last run which provided less than a process
+        required, see :py:meth:`Process.require_input`"""
+        self.seed = 0  # type: int
+        """the seed of the random streams of the processes, see
+        :py:meth:`Process.get_random_generator`, None for a new one every
+        run"""
+        self.run_seed = None  # type: int
+        """the seed of the last run, to repeat it with the same random
+        numbers"""
         self.verbose = True  # type: bool
+        self.structure_version = 0  # type: int
+        """incremented on every change of entities, connections or processes,
+        see :py:meth:`Action.bind`"""
+        # (object, state before an action) of the actions of the last run
+        self._undo_log = list()  # type: List[Tuple[SimObject, Dict[str, Any]]]
+        # only set within an edit session
+        self._index = None  # type: _SimIndex
+        self._unbalanced_connectors = None  # type: Set[OutputConnector]
+        # the structure part of pymerlin.runcache.model_fingerprint
+        self._fingerprint_cache = None  # type: Tuple[int, str, tuple]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickles the model as :py:mod:`pymerlin.snapshot`, without the state
+        of the last run.
+        """
+        from pymerlin import snapshot
+        return {
+            'snapshot': snapshot.to_dict(self),
+            'ruleset': self.ruleset,
+            'initial_state': self.initial_state,
+            'verbose': self.verbose,
+        }
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        from pymerlin import snapshot
+        Simulation.__init__(self, state['ruleset'], state['initial_state'])
+        self.verbose = state['verbose']
+        snapshot.from_dict(state['snapshot'], self)
+
+    def clone(self) -> 'Simulation':
+        """
+        :returns: an independent copy of the model with the same ids, so
+            scenarios apply to either. Like pickling, the copy is rebuilt
+            from a :py:mod:`pymerlin.snapshot` and has no run state. The
+            default params of the processes and the ruleset are shared.
+        """
+        from pymerlin import snapshot
+        copy = snapshot.from_dict(snapshot.to_dict(self))
+        copy.ruleset = self.ruleset
+        copy.initial_state = list(self.initial_state)
+        copy.verbose = self.verbose
+        return copy
+
+    def structure_changed(self) -> None:
+        """
+        Invalidates references resolved by :py:meth:`Action.bind`. The
+        methods adding or removing entities, connectors and processes call
+        this, code changing these collections directly has to call it, too.
+        """
+        self.structure_version += 1
 
     def _run_senario_events(self, scenarios: List['Scenario']) -> None:
-        for s in scenarios:
-            for e in s.events:
-                if (e.time + s.start_offset) == self.current_step:
-                    for a in e.actions:
-                        a.execute(self)
+        actions = [a for s in scenarios for e in s.events
+                   if (e.time + s.start_offset) == self.current_step
+                   for a in e.actions]
+        if not actions:
+            return
+        with self.edit_session():
+            for a in actions:
+                self._execute_action(a)
+
+    def _execute_action(self, action: 'Action') -> None:
+        """
+        Executes ``action`` and records the state of the objects it may
+        change for :py:meth:`rollback`.
+        """
+        for so in action._affected(self):
+            if so is not None:
+                self._undo_log.append((so, so._capture_state()))
+        action.execute(self)
+
+    def rollback(self) -> None:
+        """
+        Restores the model to its structure before the last run by undoing
+        the scenario actions executed in it, in reverse order. Telemetry is
+        not restored, it describes the run until the next one.
+        """
+        structural = False
+        while self._undo_log:
+            so, state = self._undo_log.pop()
+            structural |= so._restore_state(state)
+        if structural:
+            self.structure_changed()
+
+    @contextlib.contextmanager
+    def edit_session(self):
+        """
+        A context for applying many changes at once.
 
-    def _get_object_telemetry(self, so: SimObject) -> Mapping[str, Any]:
+        Within the session :py:meth:`find_sim_object` uses an index of the
+        model, which is only rebuilt when an object is not found after the
+        structure changed, and the biases of the output connectors are
+        rebalanced once when the session closes. Sessions may be nested,
+        the outermost one is in effect.
+        """
+        if self._index is not None:
+            yield self
+            return
+        self._index = _SimIndex(self)
+        self._unbalanced_connectors = set()
+        try:
+            yield self
+        finally:
+            for o_con in self._unbalanced_connectors:
+                if o_con._unbalanced:
+                    o_con._ballance_bias()
+            self._index = None
+            self._unbalanced_connectors = None
+
+    def apply_actions(
+            self,
+            actions: Iterable['Action'],
+            strict: bool=True) -> List['Action']:
+        """
+        Executes ``actions`` in order within one :py:meth:`edit_session`.
+
+        Actions referring to objects which do not exist when it is their
+        turn are skipped.
+
+        :param bool strict: raise if any action was skipped
+        :raises SimReferenceNotFoundException: listing all skipped actions,
+            after the others were executed
+        :returns: the skipped actions
+        """
+        unresolved = list()
+        with self.edit_session():
+            for a in actions:
+                if any(t is None for t in a._targets(self)):
+                    unresolved.append(a)
+                else:
+                    a.execute(self)
+        if unresolved and strict:
+            raise SimReferenceNotFoundException(
+                "unresolved references in {0} actions: {1}".format(
+                    len(unresolved), [a.serialize() for a in unresolved]))
+        return unresolved
+
+    def _get_object_telemetry(
+            self,
+            so: SimObject,
+            expand: bool=True) -> Mapping[str, Any]:
+        data = so.get_telemetry_data()
+        if expand and so.compressed_telemetry:
+            data = {k: telemetry.expand(v) for k, v in data.items()}
         return {
             'type': so.__class__.__name__,
             'id': so.id,
             'name': so.name,
-            'data': so.get_telemetry_data()}
+            'data': data}
 
     def find_sim_object(
             self,
@@ -101,6 +364,8 @@ class Simulation(SimObject):
         :param so_type: the type of the object to find
         :return: the SimObject or None if it could not be found
         """
+        if self._index is not None:
+            return self._index.find(so_id, so_type)
 
         search_dict = None
 
@@ -179,6 +444,7 @@ class Simulation(SimObject):
 
         child_entity.parent = parent_entity
         parent_entity.add_child(child_entity)
+        self.structure_changed()
 
     def disconnect_entities(
             self,
@@ -198,6 +464,7 @@ class Simulation(SimObject):
         if i_con and o_con:
             o_con.remove_input(i_con)
             to_entity.inputs.remove(i_con)
+            self.structure_changed()
 
     def connect_entities(
             self,
@@ -238,6 +505,7 @@ class Simulation(SimObject):
         o_con.add_input(i_con)
         from_entity.add_output(o_con)
         to_entity.add_input(i_con)
+        self.structure_changed()
 
     def connect_output(
             self,
@@ -372,6 +640,7 @@ class Simulation(SimObject):
         if o not in self.outputs:
             self.outputs.add(o)
             o.sim = self
+            self.structure_changed()
 
     def add_entity(self, e, is_source_entity=False, parent=None):
         """
@@ -390,6 +659,7 @@ class Simulation(SimObject):
             e.sim = self
             if is_source_entity:
                 self.source_entities.add(e)
+            self.structure_changed()
 
     def remove_entity(self, e):
         """
@@ -399,6 +669,7 @@ class Simulation(SimObject):
         """
         if e in self._entities:
             self._entities.remove(e)
+            self.structure_changed()
 
     def get_entity_by_name(self, name) -> 'Entity':
         for e in self._entities:
@@ -431,41 +702,128 @@ class Simulation(SimObject):
         return None
 
     def init_state(self):
-        for action in self.initial_state:
-            action.execute(self)
+        self.apply_actions(self.initial_state)
 
     def get_last_run_errors(self):
-        return list(self.run_errors)
+        """
+        :returns: the :py:attr:`shortfalls` of the last run, which processes
+            record instead of raising errors
+        """
+        warnings.warn("Simulation.get_last_run_errors to be phased out, "
+                      "use Simulation.shortfalls", DeprecationWarning)
+        return list(self.shortfalls)
+
+    def _seed_run(self, seed: int=None) -> None:
+        if seed is None:
+            seed = self.seed
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        self.run_seed = seed
+
+    def record_shortfall(
+            self,
+            process: 'Process',
+            name: str,
+            available: float,
+            required: float,
+            tick: int=None) -> None:
+        """
+        Records that the input ``name`` of ``process`` provided ``available``
+        but ``required`` was needed, in the current step or ``tick``, see
+        :py:attr:`shortfalls`.
+        """
+        self.shortfalls.append(InputShortfall(
+            self.current_step if tick is None else tick,
+            process.id,
+            name,
+            available,
+            required))
 
     def validate(self):
         # TODO: Write basic validation function for sim
         return True
 
+    def wants_message(self, message_type: 'MerlinMessage.MessageType') -> bool:
+        """
+        :returns: True if a message of this type would be logged, so callers
+           can skip formatting messages which are dropped anyway.
+        """
+        return message_type.value >= self.message_threshold.value
+
     def log_message(
             self,
             message_type: 'MerlinMessage.MessageType',
             sender: SimObject,
             msg_id: str="",
             msg: str="",
-            context: List[SimObject]=list()):
+            context: List[SimObject]=list(),
+            tick: int=None):
+        """
+        Records a message for the current step, or ``tick`` if given.
+        Repeats of a message with the same ``msg_id`` from the same sender
+        are folded into the first one, see :py:class:`MessageStore`.
+        Messages below :py:attr:`message_threshold` are dropped.
+        """
+        if message_type.value < self.message_threshold.value:
+            return
 
-        m = MerlinMessage(
+        self._messages.add(
             message_type,
-            self.current_step,
+            self.current_step if tick is None else tick,
             sender,
             msg_id,
             msg,
             context)
 
-        self._messages.append(m)
-
     def get_run_messages(self) -> List[Dict[str, Any]]:
-        return [m.serialize() for m in self._messages]
+        return self._messages.serialize()
 
-    def get_sim_telemetry(self) -> List[Dict[str, Any]]:
+    def query_messages(
+            self,
+            offset: int=0,
+            limit: int=None,
+            entity: 'Entity'=None,
+            **filters) -> Dict[str, Any]:
+        """
+        Serialises one page of the run messages, see
+        :py:meth:`MessageStore.query` for the available ``filters``.
+
+        :param .Entity entity: only messages sent by this entity, its
+            descendants or anything they contain
+        :returns: a dict with the number of matching messages ``total``,
+            ``offset`` and the serialised ``messages``.
+        """
+        if entity is not None:
+            subtree = entity.get_subtree_ids()
+            if filters.get('sender_ids') is not None:
+                subtree &= set(filters['sender_ids'])
+            filters['sender_ids'] = subtree
+        return self._messages.page(offset, limit, **filters)
+
+    def get_sim_telemetry(
+            self,
+            window: int=None,
+            how: str='sum',
+            align: int=1,
+            expand: bool=True) -> List[Dict[str, Any]]:
+        """
+        :param int window: if given, every series is reduced to one value
+            per ``window`` ticks, e.g. ``12`` for annual figures.
+        :param str how: the reduction for ``window``, one of
+            ``sum``, ``mean``, ``min``, ``max`` or ``last``.
+        :param int align: a tick at which a window starts, the default
+            ``1`` follows the financial year convention ``tick % 12 == 1``.
+        :param bool expand: return compressed channels as plain lists, if
+            False they are returned as
+            :py:class:`pymerlin.telemetry.RunLengthSeries`.
+        :returns: the telemetry of all outputs, process properties and
+            connectors of the last run, followed by the run messages.
+
+        see :py:func:`pymerlin.telemetry.aggregate_telemetry`
+        """
         output = list()
         for o in self.outputs:
-            output.append(self._get_object_telemetry(o))
+            output.append(self._get_object_telemetry(o, expand))
 
         for e in self.get_entities():
 
@@ -473,7 +831,7 @@ class Simulation(SimObject):
 
             for p in e.get_processes():
                 for pprop in p.get_properties():
-                    output.append(self._get_object_telemetry(pprop))
+                    output.append(self._get_object_telemetry(pprop, expand))
 
                 for pinput in p.inputs.values():
                     if pinput.connector.id not in connector_to_pinput:
@@ -499,41 +857,55 @@ class Simulation(SimObject):
                         i.set_telemetry_value('consume', x)
 
                 # logging.info("id: {0}, name: {1}".format(i.id, i.name))
-                output.append(self._get_object_telemetry(i))
+                output.append(self._get_object_telemetry(i, expand))
 
             for o in e.outputs:
-                output.append(self._get_object_telemetry(o))
+                output.append(self._get_object_telemetry(o, expand))
 
         # Append run messages
         ms = dict()
         ms['messages'] = self.get_run_messages()
         output.append(ms)
 
+        if window:
+            output = telemetry.aggregate_telemetry(
+                output, window, how, start_tick=self.start_step, align=align)
+
         return output
 
     def run(
             self,
             start: int=1,
             end: int=-1,
-            scenarios: List['Scenario']=list()) -> None:
+            scenarios: List['Scenario']=list(),
+            rollback: bool=False,
+            seed: int=None) -> None:
         """
         :param int start:
         :param int end:
         :param List[Scenario] scenarios:
+        :param bool rollback: undo the changes of the scenario actions when
+            the run finishes, see :py:meth:`rollback`. Otherwise they are
+            kept until :py:meth:`rollback` is called or the next run starts.
+        :param int seed: the seed of the run, :py:attr:`seed` by default,
+            see :py:meth:`Process.get_random_generator`
 
         runs the simulation in end-start+1 steps, where the end defaults to
         and is limited to ``self.num_steps``. Start is 1 or higher.
         """
         start_time = datetime.now()
         logging.info("Merlin simulation {0} started".format(self.name))
-        self.run_errors.clear()
+        self.shortfalls.clear()
         self._messages.clear()
+        self._undo_log.clear()
+        self._seed_run(seed)
 
         if end > self.num_steps:
             self.num_steps = end
 
         sim_start = start if start > 1 else 1
         sim_end = end if (0 < end < self.num_steps) else self.num_steps
+        self.start_step = sim_start
 
         # clear data from the last run
         for o in self.outputs:
@@ -544,26 +916,115 @@ class Simulation(SimObject):
             e.reset()
 
         # run all the steps in the sim
-        for t in range(sim_start, sim_end+1):
-            logging.info('Simulation step {0}'.format(t))
-            self.current_step = t
-            self._run_senario_events(scenarios)
-            # get sim outputs
-            for se in self.source_entities:
-                try:
+        try:
+            for t in range(sim_start, sim_end+1):
+                logging.info('Simulation step {0}'.format(t))
+                self.current_step = t
+                self._run_senario_events(scenarios)
+                # get sim outputs
+                for se in self.source_entities:
                     se.tick(t)
-                except InputRequirementException as e:
-                    self.run_errors.append(e)
+        finally:
+            if rollback:
+                self.rollback()
         logging.info(
             "pymerlin simulation {0} finished in {1}".format(
                 self.name,
                 datetime.now() - start_time))
 
 
+class _SimIndex:
+    """
+    The lookup tables of :py:meth:`Simulation.find_sim_object` within an
+    edit session. They are built in the same order as the searches, so
+    they return the same object, and are rebuilt when an object is missing
+    or no longer part of the simulation after the structure changed.
+    """
+
+    def __init__(self, sim: Simulation):
+        self.sim = sim
+        self.version = None  # type: int
+        self.by_id = dict()  # type: Dict[Tuple[str, int], SimObject]
+        self.by_name = dict()  # type: Dict[Tuple[str, str], SimObject]
+
+    def rebuild(self) -> None:
+        sim = self.sim
+        self.version = sim.structure_version
+        self.by_id = by_id = dict()
+        self.by_name = by_name = dict()
+
+        def add(so_type, objects):
+            for so in objects:
+                by_id.setdefault((so_type, so.id), so)
+                by_name.setdefault((so_type, so.name), so)
+
+        entities = list(sim.get_entities())
+        add('Entity', entities)
+        add('Output', sim.outputs)
+        processes = [p for e in entities for p in e.get_processes()]
+        add('Process', processes)
+        add('ProcessProperty',
+            [pp for p in processes for pp in p.get_properties()])
+        add('OutputConnector', [o for e in entities for o in e.outputs])
+        add('InputConnector', [i for e in entities for i in e.inputs])
+        add('Endpoint', [ep for e in entities for o in e.outputs
+                         for ep in o.get_endpoint_objects()])
+
+    def _is_live(self, so_type: str, so) -> bool:
+        entities = self.sim.get_entities()
+        if so_type == 'Entity':
+            return so in entities
+        if so_type == 'Output':
+            return so in self.sim.outputs
+        if so_type == 'Process':
+            return so.parent in entities and \
+                so in so.parent._processes.get(so.priority, ())
+        if so_type == 'ProcessProperty':
+            # the name is the display name, not necessarily the key
+            return so.parent is not None and \
+                any(pp is so for pp in so.parent.props.values()) and \
+                self._is_live('Process', so.parent)
+        if so_type == 'OutputConnector':
+            return so.parent in entities and so in so.parent.outputs
+        if so_type == 'InputConnector':
+            return so.parent in entities and so in so.parent.inputs
+        if so_type == 'Endpoint':
+            source = so.connector.source if so.connector else None
+            return source is not None and \
+                so in source._endpoints and \
+                self._is_live('OutputConnector', source)
+        return False
+
+    def find(self, so_id: Union[str, int], so_type: str):
+        if so_type == 'Connector':
+            return self.find(so_id, 'InputConnector') or \
+                self.find(so_id, 'OutputConnector')
+        if type(so_id) is int:
+            attribute = 'id'
+        elif type(so_id) is str:
+            attribute = 'name'
+        else:
+            return None
+
+        key = (so_type, so_id)
+        so = getattr(self, 'by_' + attribute).get(key)
+        if so is not None and getattr(so, attribute) == so_id and \
+                self._is_live(so_type, so):
+            return so
+        if self.version != self.sim.structure_version:
+            self.rebuild()
+            return getattr(self, 'by_' + attribute).get(key)
+        return None
+
+
 class Output(SimObject):
     """
     A network flow sink.
     """
+
+    undo_attributes = ('minimum', 'inputs')
+    value_undo_attributes = frozenset({'minimum'})
+
     def __init__(self, unit_type, name=''):
         """
         :param str unit_type: the string identifying the unit of the
@@ -590,7 +1051,8 @@ class Output(SimObject):
         self.updated = False
 
     def reset(self):
-        self.result.clear()
+        # a new list, telemetry handed out before refers to the old one
+        self.result = list()
         self.current_time = None
         self.reset_telemetry()
         self.updated = False
@@ -617,6 +1079,9 @@ class Output(SimObject):
                 for i in self.inputs:
                     o += i.value
                 self.result.append(o)
+                # the result doubles as the value telemetry
+                if 'value' not in self._telemetry:
+                    self._telemetry['value'] = self.result
                 if self.minimum and o < self.minimum:
                     self.sim.log_message(
                         MerlinMessage.MessageType.warn,
@@ -629,8 +1094,6 @@ class Output(SimObject):
                             self.minimum)
                     )
 
-                self.set_telemetry_value('value', o)
-
 
 class Entity(SimObject):
     """
@@ -642,6 +1105,9 @@ class Entity(SimObject):
     output connectors.
     """
 
+    undo_attributes = ('sim', 'parent', '_children', 'inputs', 'outputs',
+                       '_processes')
+
     def __init__(
             self,
             simulation: Simulation=None,
@@ -702,11 +1168,16 @@ class Entity(SimObject):
         self._add_process(new_proc)
         return new_proc
 
+    def _structure_changed(self):
+        if self.sim is not None:
+            self.sim.structure_changed()
+
     def add_child(self, entity):
         if entity not in self._children:
             self._children.add(entity)
             entity.parent = self
             entity.sim = self.sim
+            self._structure_changed()
 
     def remove_child(self, entity_id):
         child_to_remove = None
@@ -716,10 +1187,29 @@ class Entity(SimObject):
         if child_to_remove:
             child_to_remove.parent = None
             self._children.remove(child_to_remove)
+            self._structure_changed()
 
     def get_children(self):
         return self._children
 
+    def get_subtree_ids(self) -> Set[int]:
+        """
+        :returns: the ids of this entity, all its descendants and their
+            processes, process properties and connectors
+        """
+        ids = set()
+        pending = [self]
+        while pending:
+            e = pending.pop()
+            ids.add(e.id)
+            ids.update(c.id for c in e.inputs)
+            ids.update(c.id for c in e.outputs)
+            for p in e.get_processes():
+                ids.add(p.id)
+                ids.update(prop.id for prop in p.props.values())
+            pending.extend(e.get_children())
+        return ids
+
     def get_child_by_id(self, entity_id):
         for c in self.get_children():
             if c.id == entity_id:
@@ -736,11 +1226,13 @@ class Entity(SimObject):
         if input_con not in self.inputs:
             input_con.parent = self
             self.inputs.add(input_con)
+            self._structure_changed()
 
     def add_output(self, output_con):
         if output_con not in self.outputs:
             output_con.parent = self
             self.outputs.add(output_con)
+            self._structure_changed()
 
     def reset(self):
         """
@@ -763,7 +1255,9 @@ class Entity(SimObject):
         for ps in procs:
             for p in ps:
                 p.reset_telemetry()
+                p._random = None
                 p.reset()
+                p._memo = None
 
                 for p_inputs in p.inputs.values():
                     p_inputs.reset_telemetry()
@@ -784,6 +1278,7 @@ class Entity(SimObject):
             for pi in proc.outputs.values():
                 pi.connector = None
             self._processes[proc.priority].remove(proc)
+            self._structure_changed()
 
     def get_processes(self) -> List['Process']:
         procs = self._processes.values()
@@ -878,6 +1373,7 @@ class Entity(SimObject):
         else:
             self._processes[proc.priority] = {proc}
         proc.parent = self
+        self._structure_changed()
 
         # Connect process outputs to entity outputs.
         # Create entity outputs if they don't exist.
@@ -918,7 +1414,22 @@ class Entity(SimObject):
                 for proc in self._processes[i]:
                     logging.debug(
                         "Computing level {0} process {1}".format(i, proc.name))
-                    proc.compute(self.current_time)
+                    for pp in proc.get_properties():
+                        if pp.active_schedule is not None:
+                            pp.apply_schedule(self.current_time)
+                    try:
+                        if proc.pure:
+                            proc._compute_memoised(self.current_time)
+                        else:
+                            proc.compute(self.current_time)
+                    except InputRequirementException as e:
+                        # processes still raising instead of using
+                        # require_input, the entities downstream get zeros
+                        self.sim.record_shortfall(
+                            proc, e.input_name(), e.input_value, e.value)
+                        for po in proc.outputs.values():
+                            if po.connector.time != self.current_time:
+                                po.connector.write(0.0)
                     for pp in proc.get_properties():
                         pp.changed = False
         for o in self.outputs:
@@ -946,6 +1457,24 @@ class Process(SimObject):
     entities are connected to each other.
     """
 
+    undo_attributes = ('parent',)
+
+    schema = None  # type: ProcessSchema
+    """the declared inputs, outputs and properties, see
+    :py:meth:`apply_schema`"""
+
+    pure = False
+    """
+    Set to True by sub-classes whose :py:meth:`compute` only depends on the
+    values of the inputs and properties, not on the tick or state kept
+    between ticks, and which use :py:meth:`provide_output`,
+    :py:meth:`consume_input` and the methods based on them instead of
+    writing to the connectors directly. Ticks with the same input and
+    property values as the previous one then replay its writes and
+    consumption instead of calling :py:meth:`compute`. Ticks logging
+    messages, recording shortfalls or raising exceptions are not replayed.
+    """
+
     def __init__(self, name: str=''):
         super(Process, self).__init__(name)
         self.parent = None  # type: Entity
@@ -966,21 +1495,37 @@ class Process(SimObject):
         self.outputs = dict()  # type: Dict[str, 'ProcessOutput']
         self.props = dict()  # type: Dict[str, 'ProcessProperty']
         self.default_params = dict()  # type: Dict[str, Any]
+        # the properties found by get_prop, cleared when props change
+        self._prop_handles = dict()  # type: Dict[str, 'ProcessProperty']
+        # (input and property values, effects) of the last compute of a pure
+        # process, the effects being recorded in _effects during compute
+        self._memo = None  # type: Tuple[tuple, List[tuple]]
+        self._effects = None  # type: List[tuple]
+        # the random stream of the current run, see get_random_generator
+        self._random = None  # type: np.random.Generator
 
     def get_prop(self, name) -> 'ProcessProperty':
         """
-        :return: the property with this name, None otherwise
+        :return: the property with this name or display name, None
+            otherwise
         :rtype: :py:class:`pymerlin.merlin.ProcessProperty`
         """
+        pp = self._prop_handles.get(name)
+        if pp is not None:
+            return pp
 
         if name in self.props:
-            return self.props[name]
+            pp = self.props[name]
         else:
             # check SimObject name prop
-            for pp in self.get_properties():
-                if pp.name == name:
-                    return pp
-            return None
+            for p in self.get_properties():
+                if p.name == name:
+                    pp = p
+                    break
+            else:
+                return None
+        self._prop_handles[name] = pp
+        return pp
 
     def get_prop_value(self, name):
         """
@@ -988,10 +1533,13 @@ class Process(SimObject):
             None otherwise
         :rtype: the type as indicated by
            :py:attr:`pymerlin.merlin.ProcessProperty.type`.
+
+        :py:class:`PropertyValue` attributes are quicker to read in
+        :py:meth:`compute`.
         """
-        p = self.get_prop(name)
-        if p:
-            return p.get_value()
+        pp = self._prop_handles.get(name) or self.get_prop(name)
+        if pp is not None:
+            return pp._value
         else:
             return None
 
@@ -1001,6 +1549,16 @@ class Process(SimObject):
         """
         return self.props.values()
 
+    def apply_schema(self, defaults: Dict[str, Any]=None) -> None:
+        """
+        Adds the inputs, outputs and properties declared by the class's
+        :py:class:`ProcessSchema` :py:attr:`schema`.
+
+        :param defaults: ``{property name: default value}`` overriding the
+            defaults of the schema, e.g. from the constructor's arguments
+        """
+        self.schema.stamp(self, defaults or {})
+
     # create interface to self.inputs and self outputs to hide the
     # implementation details of the connectors
 
@@ -1048,17 +1606,23 @@ class Process(SimObject):
                     parent=self,
                     readonly=read_only)
         self.props[name] = prop
+        self._prop_handles.clear()
+        if self.parent is not None:
+            self.parent._structure_changed()
 
     def remove_property(self, name):
         self.props[name].parent = None
         del self.props[name]
+        self._prop_handles.clear()
+        if self.parent is not None:
+            self.parent._structure_changed()
 
     def write_zero_to_all(self):
         """
         Writes zero to all outputs
         """
         for k in self.outputs.keys():
-            self.outputs[k].connector.write(0.0)
+            self.provide_output(k, 0.0)
 
     def consume_all_inputs(self, absValue=float("inf"), relValue=1.0):
         """
@@ -1082,6 +1646,8 @@ class Process(SimObject):
              the actual tick
         :returns: None
         """
+        if self._effects is not None:
+            self._effects.append((Process.provide_output, name, value))
         self.outputs[name].connector.write(value)
 
     def get_input_available(self, name):
@@ -1099,11 +1665,71 @@ class Process(SimObject):
         """
         assert self.get_input_available(name) >= value, \
             "consuming more input than available"
+        if self._effects is not None:
+            self._effects.append((Process.consume_input, name, value))
         self.inputs[name].consume(value)
 
-    def notify_insufficient_input(self, name, available, required):
+    def get_random_generator(self) -> np.random.Generator:
+        """
+        :returns: the random number generator of this process for the
+            current run
+
+        The stream is derived from :py:attr:`Simulation.run_seed` and the
+        id of the process, so a run repeated with the same seed draws the
+        same numbers, regardless of other simulations, the other processes
+        and the order or thread the runs are executed in. Outside of runs,
+        e.g. without a simulation, the stream is seeded unpredictably.
+        """
+        if self._random is None:
+            sim = None if self.parent is None else self.parent.sim
+            if sim is None or sim.run_seed is None:
+                self._random = np.random.default_rng()
+            else:
+                # the ids are 128 bit UUIDs, negative while being loaded
+                self._random = np.random.default_rng(np.random.SeedSequence(
+                    [sim.run_seed, self.id & _UINT128]))
+        return self._random
+
+    def require_input(self, name: str, required: float,
+                      notify: bool=True) -> bool:
+        """
+        :param str name: the name of the input
+        :param float required: the value the process needs
+        :param bool notify: log the warning of
+            :py:meth:`notify_insufficient_input` if the input falls short,
+            False for processes logging their own messages
+        :returns: True if the input provides at least ``required``.
+            Otherwise the shortfall is recorded with
+            :py:meth:`Simulation.record_shortfall` and False is returned.
+
+        The way to check the inputs in :py:meth:`compute`, a process which
+        lacks inputs provides zeros, e.g. with :py:meth:`write_zero_to_all`,
+        so the entities downstream are computed:
+
+        .. code-block:: python3
+
+            if not self.require_input('$', funds_required):
+                self.write_zero_to_all()
+                return
+        """
+        available = self.inputs[name].connector.value
+        if available >= required:
+            return True
+        self.parent.sim.record_shortfall(self, name, available, required)
+        if notify:
+            self.notify_insufficient_input(name, available, required)
+        return False
+
+    def notify_insufficient_input(self, name, available, required, tick=None):
+        """
+        Logs a warning that the input ``name`` provides less than
+        ``required``, in the current step or ``tick``.
+        """
         assert name in self.inputs
 
+        if not self.parent.sim.wants_message(MerlinMessage.MessageType.warn):
+            return
+
         self.parent.sim.log_message(
             MerlinMessage.MessageType.warn,
             self,
@@ -1113,9 +1739,64 @@ class Process(SimObject):
                     self.inputs[name].type,
                     required,
                     available),
-            context=list([self.inputs[name].connector])
+            context=list([self.inputs[name].connector]),
+            tick=tick
         )
 
+    def _memo_key(self) -> tuple:
+        """
+        :returns: the values :py:meth:`compute` depends on, all input and
+            property values by default
+        """
+        return (tuple([pi.connector.value for pi in self.inputs.values()]),
+                tuple([pp._value for pp in self.props.values()]))
+
+    def _compute_memoised(self, tick):
+        key = self._memo_key()
+        memo = self._memo
+        if memo is not None and memo[0] == key:
+            for method, name, value in memo[1]:
+                method(self, name, value)
+            return
+
+        self._memo = None
+        sim = self.parent.sim
+        messages = sim._messages
+        logged = messages.count()
+        shortfalls = len(sim.shortfalls)
+        self._effects = effects = list()
+        try:
+            self.compute(tick)
+        finally:
+            self._effects = None
+        if messages.count() == logged and len(sim.shortfalls) == shortfalls:
+            self._memo = (key, effects)
+
+    def compute_horizon(
+            self,
+            ticks: np.ndarray,
+            inputs: Dict[str, np.ndarray],
+            props: Dict[str, np.ndarray]
+            ) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        :param ticks: the ticks of the run
+        :param inputs: ``{name: values}`` available at the inputs, one value
+            per tick
+        :param props: ``{name: values}`` of the properties, one value per
+            tick
+        :returns: ``(outputs, consumed)``, the values provided at the
+            outputs and consumed from the inputs as ``{name: values}``
+
+        Optional, computes all ticks of a run at once for
+        :py:func:`pymerlin.horizon.run`, which is only possible if the
+        results do not depend on other entities' results of earlier ticks.
+        Must provide every output and give the same results as
+        :py:meth:`compute`, messages are logged with the ``tick`` argument
+        of :py:meth:`Simulation.log_message`.
+        """
+        raise NotImplementedError(
+            "{0} has no compute_horizon".format(type(self).__name__))
+
     def compute(self, tick):
         """
         :param int tick: the actual tick from
@@ -1143,10 +1824,12 @@ class Process(SimObject):
             available = self.inputs['$'].connector.value
             self.inputs['$'].connector.consume(utilized)
 
-        If a processes input requirement isn't met, raise an
-        :py:exc:`pymerlin.merlin.InputRequirementException`.
-        To allow the processes "downstream" to be executed, use a ``write(0)``
-        before raising the exception
+        Check the input requirements with :py:meth:`require_input`. If they
+        aren't met, provide zeros, so the processes "downstream" are
+        executed. Raising an
+        :py:exc:`pymerlin.merlin.InputRequirementException` still works, the
+        entity then records the shortfall and writes zeros to the outputs
+        this process did not write.
 
         .. note::
             It is safe to assume that :py:meth:`reset`, is called before this
@@ -1166,6 +1849,133 @@ class Process(SimObject):
         pass
 
 
+class ProcessSchema:
+    """
+    The inputs, outputs and properties every instance of a :py:class:`Process`
+    sub-class has, declared once as its ``schema`` attribute instead of
+    calling :py:meth:`Process.add_input`, :py:meth:`Process.add_output` and
+    :py:meth:`Process.add_property` in each constructor::
+
+        class StaffFTE(merlin.Process):
+
+            schema = merlin.ProcessSchema(
+                inputs=[('staff_budget', 'staff$')],
+                outputs=[('line_staff_fte', 'LS_FTE')],
+                properties=[('Line Staff Number', 'ls_number',
+                             merlin.ProcessProperty.PropertyType.number_type,
+                             1000.0)])
+
+            def __init__(self, name='Staff FTE', ls_number=1000.0):
+                super(StaffFTE, self).__init__(name)
+                self.apply_schema({'ls_number': ls_number})
+
+    The objects of the first instance serve as prototypes, later instances
+    get shallow copies of them with new ids, which is several times faster
+    than constructing them. Further inputs, outputs and properties may
+    still be added with the ``add_`` methods.
+    """
+
+    def __init__(
+            self,
+            inputs: Iterable[Tuple[str, str]]=(),
+            outputs: Iterable[Tuple[str, str]]=(),
+            properties: Iterable[tuple]=()):
+        """
+        :param inputs: ``(name, unit)`` like :py:meth:`Process.add_input`
+        :param outputs: ``(name, unit)`` like :py:meth:`Process.add_output`
+        :param properties: ``(display_name, name, property_type,
+            default_value[, read_only])`` like
+            :py:meth:`Process.add_property`
+        """
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.properties = tuple(properties)
+        # name -> __dict__ of the prototype objects, created on first use
+        self._prototypes = None  # type: Tuple[Dict[str, Dict[str, Any]], ...]
+
+    def _get_prototypes(self) -> Tuple[Dict[str, Dict[str, Any]], ...]:
+        if self._prototypes is None:
+            inputs = {name: vars(ProcessInput(name, unit))
+                      for name, unit in self.inputs}
+            outputs = {name: vars(ProcessOutput(name, unit))
+                       for name, unit in self.outputs}
+            props = dict()
+            for p in self.properties:
+                display_name, name, property_type, default = p[:4]
+                read_only = p[4] if len(p) > 4 else False
+                if name in props:
+                    raise KeyError("property %s already exists" % (name,))
+                props[name] = vars(ProcessProperty(
+                    display_name,
+                    property_type=property_type,
+                    default=default,
+                    readonly=read_only))
+            self._prototypes = (inputs, outputs, props)
+        return self._prototypes
+
+    def stamp(self, process: 'Process', defaults: Dict[str, Any]) -> None:
+        """
+        Adds copies of the prototypes to ``process``, see
+        :py:meth:`Process.apply_schema`.
+        """
+        inputs, outputs, props = self._get_prototypes()
+        for name, proto in inputs.items():
+            process.inputs[name] = _stamp(ProcessInput, proto)
+        for name, proto in outputs.items():
+            process.outputs[name] = _stamp(ProcessOutput, proto)
+        for name, proto in props.items():
+            if name in process.props:
+                raise KeyError("property %s already exists" % (name,))
+            pp = _stamp(ProcessProperty, proto)
+            pp.parent = process
+            if name in defaults:
+                pp.default = pp._value = defaults[name]
+            process.props[name] = pp
+        process._prop_handles.clear()
+
+
+def _stamp(cls: type, prototype: Dict[str, Any]) -> SimObject:
+    # a copy of the prototype, without calling the constructors
+    so = cls.__new__(cls)
+    so.__dict__.update(prototype)
+    so.id = _new_id()
+    so._telemetry = dict()
+    return so
+
+
+class PropertyValue:
+    """
+    A read-only attribute of a :py:class:`Process` sub-class giving the
+    current value of one of its properties, like
+    :py:meth:`Process.get_prop_value`, but the property is looked up only
+    on the first read::
+
+        class CallCenterStaffProcess(merlin.Process):
+
+            staff_number = merlin.PropertyValue('staff number')
+
+            def compute(self, tick):
+                maximal_output = self.staff_number
+    """
+
+    def __init__(self, name: str):
+        """
+        :param str name: the name or display name of the property
+        """
+        self.name = name
+
+    def __get__(self, process: Process, owner: type=None) -> Any:
+        if process is None:
+            return self
+        pp = process._prop_handles.get(self.name) or \
+            process.get_prop(self.name)
+        if pp is None:
+            raise AttributeError(
+                "process {0} has no property {1}".format(
+                    process.name, self.name))
+        return pp._value
+
+
 class ProcessInput(SimObject):
     """
     :param str name: name for :py:attr:`pymerlin.merlin.SimObject.name`
@@ -1179,6 +1989,8 @@ class ProcessInput(SimObject):
     The name on the front-end is the :py:attr:`.InputConnector.name`.
     """
 
+    undo_attributes = ('connector',)
+
     def __init__(self, name, unit_type, connector=None):
         super(ProcessInput, self).__init__(name)
         self.type = unit_type  # type: str
@@ -1197,6 +2009,8 @@ class ProcessInput(SimObject):
 
 class ProcessOutput(SimObject):
 
+    undo_attributes = ('connector',)
+
     def __init__(self, name, unit_type, connector=None):
         """
         :param str name: name for :py:attr:`pymerlin.merlin.SimObject.name`
@@ -1232,14 +2046,24 @@ class ProcessProperty(SimObject):
     cost per piece.
 
     the :attr:`.name` appears in the front-end graphics.
+
+    The ``value`` telemetry is recorded every tick, but only changes on
+    scenario events, so it is stored run-length compressed.
     """
 
+    compressed_telemetry = frozenset({'value'})
+
     class PropertyType(Enum):
         bool_type = 1
         number_type = 2
         int_type = 3
         date_type = 4
 
+    undo_attributes = ('_value', 'changed', 'schedule', '_scenario_schedule',
+                       '_scenario_scheduled', 'active_schedule',
+                       '_schedule_applied')
+    value_undo_attributes = frozenset(undo_attributes)
+
     def __init__(
             self,
             name,
@@ -1265,6 +2089,15 @@ class ProcessProperty(SimObject):
         self._value = self.default
         self.readonly = readonly
         self.changed = False
+        self.schedule = None  # type: PropertySchedule
+        """values taken at given ticks, see :py:meth:`set_schedule`"""
+        # the schedule a scenario replaced the model's with until reset
+        self._scenario_schedule = None  # type: PropertySchedule
+        self._scenario_scheduled = False
+        self.active_schedule = None  # type: PropertySchedule
+        """the schedule applied, the scenario's or else the model's"""
+        # False until the schedule was applied after being set or reset
+        self._schedule_applied = False
 
     def set_value(self, value):
         self._value = value
@@ -1273,8 +2106,105 @@ class ProcessProperty(SimObject):
     def get_value(self) -> float:
         return self._value
 
+    def set_schedule(self, schedule: 'PropertySchedule') -> None:
+        """
+        :param PropertySchedule schedule: the values of this property at
+            given ticks, or None
+
+        The entity applies the schedule before its processes compute, like a
+        :py:class:`ModifyProcessPropertyAction` at each of its ticks. The
+        first tick processed after the schedule was set or the property was
+        reset takes the value of the latest scheduled tick before it.
+        """
+        self.schedule = schedule
+        self._activate_schedule()
+
+    def set_scenario_schedule(self, schedule: 'PropertySchedule') -> None:
+        """
+        :param PropertySchedule schedule: replaces the :py:attr:`schedule`
+            of the model until the property is reset, None removes it
+
+        For scenarios, which must not change the model beyond their run.
+        """
+        self._scenario_schedule = schedule
+        self._scenario_scheduled = True
+        self._activate_schedule()
+
+    def _activate_schedule(self):
+        self.active_schedule = (self._scenario_schedule
+                                if self._scenario_scheduled
+                                else self.schedule)
+        self._schedule_applied = False
+
+    def apply_schedule(self, tick: int) -> None:
+        if self._schedule_applied:
+            value = self.active_schedule.changes.get(tick, _unscheduled)
+        else:
+            self._schedule_applied = True
+            value = self.active_schedule.value_at(tick, _unscheduled)
+        if value is not _unscheduled and value != self._value:
+            self.set_value(value)
+
     def reset(self):
         self._value = self.default
+        self._scenario_schedule = None
+        self._scenario_scheduled = False
+        self._activate_schedule()
+
+
+_unscheduled = object()
+
+
+class PropertySchedule:
+    """
+    The values a :py:class:`ProcessProperty` takes at given ticks, e.g. a
+    staff number ramping up. The value is kept between these ticks, so the
+    property is piecewise constant, an explicit series is a schedule with
+    a value for every tick, see :py:meth:`from_series`.
+
+    Schedules are not changed once created.
+    """
+
+    def __init__(self, changes: Mapping[int, Any]):
+        """
+        :param changes: ``{tick: value}``
+        """
+        self.changes = dict(changes)  # type: Dict[int, Any]
+        self._ticks = sorted(self.changes)  # type: List[int]
+
+    @classmethod
+    def from_series(cls, values: Iterable[Any], start: int=1):
+        """
+        :param values: the values of the ticks ``start``, ``start + 1``, ...
+        """
+        return cls({start + i: v for i, v in enumerate(values)})
+
+    @classmethod
+    def create_from_dict(cls, data: Dict[str, List[Any]]):
+        """
+        :param data: as created by :py:meth:`serialize`
+        """
+        if len(data['ticks']) != len(data['values']):
+            raise MerlinException(
+                "a schedule needs one value for every tick")
+        return cls(zip(data['ticks'], data['values']))
+
+    def value_at(self, tick: int, default: Any=None) -> Any:
+        """
+        :returns: the value of the latest scheduled tick up to ``tick``,
+            ``default`` if there is none.
+        """
+        i = bisect.bisect_right(self._ticks, tick)
+        return self.changes[self._ticks[i - 1]] if i else default
+
+    def shifted(self, offset: int) -> 'PropertySchedule':
+        return PropertySchedule(
+            {t + offset: v for t, v in self.changes.items()})
+
+    def serialize(self) -> Dict[str, List[Any]]:
+        return {
+            'ticks': list(self._ticks),
+            'values': [self.changes[t] for t in self._ticks]}
 
 
 class Connector(SimObject):
@@ -1302,6 +2232,8 @@ class OutputConnector(Connector):
     :py:class:`.Endpoint`.
     """
 
+    undo_attributes = ('parent', '_endpoints')
+
     def __init__(
             self,
             unit_type,
@@ -1326,6 +2258,17 @@ class OutputConnector(Connector):
         self.apportioning = (self.ApportioningRules.weighted
                              if apportioning is None else apportioning)
         self._endpoints = endpoints or set()
+        # set while an edit session defers the rebalancing of the biases
+        self._unbalanced = False
+        self._apportion_log = list()  # type: List[tuple]
+        """
+        ``(write index, (rule, ((InputConnector, bias), ...)))`` entries,
+        appended whenever the apportioning changed since the last write
+        """
+
+    def reset_telemetry(self):
+        super(OutputConnector, self).reset_telemetry()
+        self._apportion_log = list()
 
     def __str__(self):
         return """
@@ -1355,6 +2298,9 @@ class OutputConnector(Connector):
         On connecting or removing end-points, the biases are recalculated to
         equal weight.
         """
+        undo_attributes = ('connector', 'bias')
+        value_undo_attributes = frozenset({'bias'})
+
         def __init__(self, connector=None, bias=0.0):
             super(OutputConnector.Endpoint, self).__init__(name='Endpoint')
             self.connector = connector
@@ -1417,16 +2363,23 @@ class OutputConnector(Connector):
             "WRITING to Output {1} value: {0} ***".format(value, self))
         self.time = self.parent.current_time
 
+        # the inputs fed by this connector derive their value telemetry
+        # from the written values and this log
+        state = (self.apportioning,
+                 tuple((ep.connector, ep.bias) for ep in self._endpoints))
+        if not self._apportion_log or self._apportion_log[-1][1] != state:
+            self._apportion_log.append(
+                (len(self._telemetry['value']) - 1, state))
+
         # pre-calculate the values to be written
         # and provide them in ep_output
+        eps = [ep for ep, _ in state[1]]
         if self.apportioning is self.ApportioningRules.copy_write:
             # very simple rule, just copy
-            ep_output = [(ep, value) for ep in self._endpoints]
+            ep_output = [(ep, value) for ep in eps]
 
         elif self.apportioning is self.ApportioningRules.weighted:
-            # get an ordered version of the end-points
-            eps = list(self._endpoints)
-            biases = [ep.bias for ep in eps]
+            biases = [b for _, b in state[1]]
             assert all(b >= 0 for b in biases), "biases must not be negative"
             bias_sum = sum(biases)
             if bias_sum == 0:
@@ -1437,13 +2390,13 @@ class OutputConnector(Connector):
 
         elif self.apportioning is self.ApportioningRules.absolute:
             # get sorted list of end-points, start with biggest one!
-            eps = list(sorted(self._endpoints,
-                              key=lambda ep: ep.bias,
+            eps = list(sorted(state[1],
+                              key=lambda ep: ep[1],
                               reverse=True))
             value_remaining = value+0.0
             ep_output = []
-            for ep in eps:
-                out_val = min(value_remaining, max(ep.bias, 0.0))
+            for ep, bias in eps:
+                out_val = min(value_remaining, max(bias, 0.0))
                 ep_output.append((ep, out_val))
                 value_remaining -= out_val
 
@@ -1454,8 +2407,64 @@ class OutputConnector(Connector):
         # now do the output writing
         for ep, dist_value in ep_output:
             logging.debug("dist_value: {0}".format(dist_value))
-            ep.connector.write(dist_value)
-            ep.connector.time = self.time
+            ep.write(dist_value, writer=self)
+            ep.time = self.time
+
+    def get_apportioned_telemetry(
+            self,
+            input_connector: 'InputConnector') -> List[float]:
+        """
+        :param InputConnector input_connector: an end-point of this
+           connector
+        :returns: the values this connector wrote to ``input_connector``,
+           one for every write while it was an end-point.
+
+        Reconstructs the series from the written values and the logged
+        apportioning with array operations, instead of storing a copy of
+        every apportioned value. Copied values are returned as written, e.g.
+        integers stay integers.
+        """
+        written = self._telemetry.get('value')
+        if not written or not self._apportion_log:
+            return list()
+        values = telemetry.as_array(written)
+        ends = [e[0] for e in self._apportion_log[1:]] + [len(values)]
+        copies = None  # type: List[Any]
+
+        output = list()
+        for (start, (rule, eps)), end in zip(self._apportion_log, ends):
+            connectors = [c for c, _ in eps]
+            if input_connector not in connectors:
+                continue
+            segment = values[start:end]
+
+            if rule is self.ApportioningRules.copy_write:
+                if copies is None:
+                    copies = list(telemetry.expand(written))
+                output.extend(copies[start:end])
+                continue
+
+            elif rule is self.ApportioningRules.weighted:
+                biases = [b for _, b in eps]
+                bias_sum = sum(biases)
+                if bias_sum == 0:
+                    biases = [1.0]*len(eps)
+                    bias_sum = sum(biases)
+                b = biases[connectors.index(input_connector)]
+                share = b/bias_sum*segment
+
+            else:
+                remaining = segment+0.0
+                for c, bias in sorted(eps, key=lambda ep: ep[1],
+                                      reverse=True):
+                    share = np.minimum(remaining, max(bias, 0.0))
+                    if c is input_connector:
+                        break
+                    remaining = remaining - share
+
+            output.extend(share.tolist())
+
+        return output
 
     def _get_endpoint(self, input_connector):
         result = None
@@ -1472,32 +2481,55 @@ class OutputConnector(Connector):
         :rtype: list
         :returns: list of (:py:class:`.InputConnector`, bias)
         """
+        if self._unbalanced:
+            self._ballance_bias()
         return [(e.connector, e.bias) for e in self._endpoints]
 
     def get_endpoint_objects(self) -> List['OutputConnector.Endpoint']:
+        if self._unbalanced:
+            self._ballance_bias()
         return list(self._endpoints)
 
     def _ballance_bias(self):
+        self._unbalanced = False
+        if not self._endpoints:
+            return
         val = 1.0 / float(len(self._endpoints))
         for ep in self._endpoints:
             ep.bias = val
 
+    def _request_balance(self):
+        # within an edit session the biases are balanced once when it
+        # closes or when they are accessed
+        sim = self.parent.sim if self.parent is not None else None
+        if sim is not None and sim._unbalanced_connectors is not None:
+            self._unbalanced = True
+            sim._unbalanced_connectors.add(self)
+        else:
+            self._ballance_bias()
+
     def add_input(self, input_connector):
         if not self._get_endpoint(input_connector):
             ep = self.Endpoint(input_connector, 0.0)
             self._endpoints.add(ep)
-            self._ballance_bias()
+            self._request_balance()
+            if self.parent is not None:
+                self.parent._structure_changed()
 
     def remove_input(self, input_connector):
         ep = self._get_endpoint(input_connector)
         if ep:
             self._endpoints.remove(ep)
             if self._endpoints:
-                self._ballance_bias()
-            else:
+                self._request_balance()
+            elif self.parent is not None:
                 self.parent.outputs.remove(self)
+            if self.parent is not None:
+                self.parent._structure_changed()
 
     def set_endpoint_bias(self, input_connector, bias):
+        if self._unbalanced:
+            self._ballance_bias()
         ep = self._get_endpoint(input_connector)
         if ep:
             old_bias = ep.bias
@@ -1513,6 +2545,8 @@ class OutputConnector(Connector):
         biases are in the form [(connector, bias)...n]
         where n is len(self._endpoints)
         """
+        if self._unbalanced:
+            self._ballance_bias()
         if len(biases) != len(self._endpoints):
             raise MerlinException(
                 "Biases parity must match number of endpoints")
@@ -1531,6 +2565,8 @@ class InputConnector(Connector):
     Represents an incoming entity connection.
     """
 
+    undo_attributes = ('parent', '_source')
+
     def __init__(
             self,
             unit_type,
@@ -1540,10 +2576,22 @@ class InputConnector(Connector):
             additive_write=False):
 
         super(InputConnector, self).__init__(unit_type, parent, name)
-        self.source = source
+        self._derived = False
+        self._source = source
         self.additive_write = additive_write
         self.value = 0.0
 
+    @property
+    def source(self) -> OutputConnector:
+        return self._source
+
+    @source.setter
+    def source(self, source: OutputConnector):
+        if self._derived and source is not self._source:
+            # the telemetry can't be derived from the new source
+            self._materialize_telemetry()
+        self._source = source
+
     def __str__(self):
         return """
         <InputConnector>
@@ -1561,8 +2609,36 @@ class InputConnector(Connector):
             self.additive_write,
             self.source)
 
-    def write(self, value):
+    def reset_telemetry(self):
+        super(InputConnector, self).reset_telemetry()
+        # a plain copy of the source's apportioned writes needs no storage
+        self._derived = (self._source is not None and
+                         not self.additive_write)
+
+    def get_telemetry_data(self) -> Mapping[str, Iterable[Any]]:
+        if not self._derived:
+            return self._telemetry
+        values = self._source.get_apportioned_telemetry(self)
+        if not values:
+            return self._telemetry
+        data = dict(self._telemetry)
+        data['value'] = values
+        return data
+
+    def _materialize_telemetry(self):
+        self._telemetry = dict(self.get_telemetry_data())
+        self._derived = False
+
+    def write(self, value, writer: OutputConnector=None):
+        """
+        :param float value: the value arriving at this connector
+        :param OutputConnector writer: the connector writing the value
+        """
         self.value = (self.value + value) if self.additive_write else value
+        if self._derived:
+            if writer is self._source:
+                return
+            self._materialize_telemetry()
         self.set_telemetry_value('value', self.value)
 
 
@@ -1594,25 +2670,43 @@ class Action(SimObject):
         Parses a MerlinScript string and returns a
         newly created list of action objects for the
         supplied merlin simulation.
+
+        Parsed scripts are cached by their content, so repeating a script
+        only creates new actions.
         """
-        output = list()
+        return [Action._generate_action(a) for a in Action.parse(script)]
+
+    @classmethod
+    def create_many(cls, scripts: Iterable[str]) -> 'List[List[Action]]':
+        """
+        Parses many MerlinScript strings, each distinct script is parsed
+        once regardless of the size of the parse cache.
 
-        script = script.strip()
-        lines = script.splitlines()
-        # break into tokens
-        for l in lines:
-            l = l.strip()
-            tokens = Action._lex_tokens(l)
-            # print("lexer result = {0}".format(tokens))
+        :returns: a list of actions for every script
+        """
+        parsed = dict()  # type: Dict[str, Tuple[Dict[str, Any], ...]]
+        output = list()
+        for script in scripts:
+            script = script.strip()
+            asts = parsed.get(script)
+            if asts is None:
+                asts = parsed[script] = _parse_script(script)
             output.append(
-                Action._generate_action(
-                    Action._parse_action(tokens)))
+                [Action._generate_action(_copy_ast(a)) for a in asts])
         return output
 
     @classmethod
-    def create_from_json(cls, json_string: str) -> 'List[Action]':
+    def parse(cls, script: str) -> List[Dict[str, Any]]:
         """
-        Parses a list of actions from a json serilaised string
+        :returns: the syntax tree of each line of a MerlinScript string, as
+            used by :py:meth:`create_from_dict`.
+        """
+        return [_copy_ast(a) for a in _parse_script(script.strip())]
+
+    @classmethod
+    def create_from_json(cls, json_string: str) -> 'List[Action]':
+        """
+        Parses a list of actions from a json serilaised string
         :param str json_string:
         """
         output = list()
@@ -1621,6 +2715,19 @@ class Action(SimObject):
             output.append(Action._generate_action(a))
         return output
 
+    # operators are searched for in this order, the first one found in
+    # a line splits it into its operands
+    script_operators = (':=', '+', '-', '^', '/', '>')
+    script_types = frozenset({
+        'Entity',
+        'Attribute',
+        'UnitType',
+        'Process',
+        'Property',
+        'Output',
+        'Endpoint'
+    })
+
     @classmethod
     def _lex_tokens(cls, line: str) -> List[str]:
         """
@@ -1628,43 +2735,31 @@ class Action(SimObject):
         :param line:
         :return: a list of tokens
         """
-
-        # Find operator and split
-        operators = [':=', '+', '-', '^', '/', '>']
-        parts = None
-        for o in operators:
-            parts = line.partition(o)
-            if parts[0] != line:
+        for o in Action.script_operators:
+            i = line.find(o)
+            if i >= 0:
                 break
-
-        if parts[0] == line:
+        else:
             raise MerlinScriptException(
                 "Parse error. Operator not found in line: {0}".format(line))
 
-        if not parts[0] and parts[1] and parts[2]:
-            # print("param part: {0}".format(parts[2]))
-            operand_1_tokens = Action._lex_operand(parts[2])
-            # print("lex result: {0}".format(operand_1_tokens))
-            return [parts[1]] + operand_1_tokens
-        else:
-            operand_1_tokens = Action._lex_operand(parts[0])
-            operand_2_tokens = Action._lex_operand(parts[2])
-            return operand_1_tokens + [parts[1]] + operand_2_tokens
+        before = line[:i]
+        after = line[i + len(o):]
+        if not before and after:
+            return [o] + Action._lex_operand(after)
+        return Action._lex_operand(before) + [o] + Action._lex_operand(after)
 
     @classmethod
     def _lex_operand(cls, op_string: str) -> List[str]:
-        output = list()
         if not op_string:
-            return output
+            return []
         op_string = op_string.strip()
-        output.append(op_string.partition(' ')[0])
-        arguments = op_string.partition(' ')[2]
-        if arguments == op_string:
+        if not op_string:
             raise MerlinScriptException(
                 "Parse error. Expected type in operand: {0}".format(op_string)
             )
-        output += [s.strip() for s in arguments.split(',')]
-        return output
+        type_name, _, arguments = op_string.partition(' ')
+        return [type_name] + [s.strip() for s in arguments.split(',')]
 
     @classmethod
     def _generate_action(cls, a: Dict[str, Any]) -> 'Action':
@@ -1753,6 +2848,17 @@ class Action(SimObject):
                     return ModifyEndpointBiasAction(
                         *(a['operand_1']['params'] + a['operand_2']['params']),
                         **a['operand_2']['props'])
+                elif a['operand_2']['type'] == 'Schedule':
+                    # schedule process property
+                    try:
+                        return ScheduleProcessPropertyAction(
+                            *(a['operand_1']['params'] +
+                              a['operand_2']['params']),
+                            schedule=a['operand_2']['props'])
+                    except (KeyError, TypeError, MerlinException):
+                        raise MerlinScriptException(
+                            "Invalid parameters for "
+                            "ScheduleProcessPropertyAction")
                 else:
                     # modify process property
                     if a['operand_2']['props'] is not None:
@@ -1783,156 +2889,162 @@ class Action(SimObject):
             raise MerlinScriptException("No Process match!")
 
     @classmethod
-    def _parse_action(cls, tokens) -> Dict[str, Any]:
-        op = Action._parse_op(tokens[0])
-        if op:
+    def _parse_action(cls, tokens: List[str]) -> Dict[str, Any]:
+        """
+        Parses the tokens of one line in a single pass.
+
+        :returns: the syntax tree of the line with the keys ``op``,
+            ``operand_1`` and ``operand_2``, the latter being None for unary
+            expressions.
+        """
+        if tokens[0] in Action.script_operators:
             # this is a single operand command
-            tokens = tokens[1:]
-            # now look for a type
-            type1 = Action._parse_type(tokens[0])
-
-            if type1:
-                # parse type 1 params
-                tokens = tokens[1:]
-                type1_params = Action._parse_params(tokens)
-                tokens = tokens[len(type1_params):]
-                print(tokens)
-                type1_props = Action._parse_props(tokens)
-                return {
-                    'op': op,
-                    'operand_1': {
-                        'type': type1,
-                        'params': type1_params,
-                        'props': type1_props
-                    },
-                    'operand_2': None}
-            else:
-                raise MerlinScriptException(
-                    "Syntax Error: {0} is not a valid type".format(tokens[0]))
-        else:
-            type1 = Action._parse_type(tokens[0])
-            if type1:
-                tokens = tokens[1:]
-                type1_params = Action._parse_params(tokens)
-                tokens = tokens[len(type1_params):]
-                type1_props = Action._parse_props(tokens)
-                tokens = tokens[len(type1_props):]
-                op = Action._parse_op(tokens[0])
-                if op:
-                    tokens = tokens[1:]
-                    type2 = Action._parse_type(tokens[0])
-                    if type2:
-                        tokens = tokens[1:]
-                        type2_params = Action._parse_params(tokens)
-                        tokens = tokens[len(type2_params):]
-                        type2_props = Action._parse_props(tokens)
-                        return \
-                            {
-                                'op': op,
-                                'operand_1':
-                                    {
-                                        'type': type1,
-                                        'params': type1_params,
-                                        'props': type1_props
-                                    },
-                                'operand_2':
-                                    {
-                                        'type': type2,
-                                        'params': type2_params,
-                                        'props': type2_props
-                                    }
-                            }
-                    else:
-                        raise MerlinScriptException(
-                            "Syntax Error: {0} is not a valid type".format(
-                                tokens[0]))
-                else:
-                    raise MerlinScriptException(
-                        "Syntax Error: Expected an operator, got {0}".format(
-                            tokens[0]))
-            else:
-                raise MerlinScriptException(
-                    "Syntax Error: {0} is not a valid type".format(
-                        tokens[0]))
+            operand_1, _ = Action._parse_operand(tokens, 1)
+            return {'op': tokens[0], 'operand_1': operand_1, 'operand_2': None}
+
+        operand_1, i = Action._parse_operand(tokens, 0)
+        if operand_1['props'] is None:
+            raise MerlinScriptException(
+                "Syntax Error: invalid properties before operator")
+        if tokens[i] not in Action.script_operators:
+            raise MerlinScriptException(
+                "Syntax Error: Expected an operator, got {0}".format(
+                    tokens[i]))
+        operand_2, _ = Action._parse_operand(tokens, i + 1)
+        return {'op': tokens[i], 'operand_1': operand_1, 'operand_2': operand_2}
 
     @classmethod
-    def _parse_params(cls, tokens: List[str]) -> List[str]:
+    def _parse_operand(cls, tokens: List[str], i: int):
+        """
+        Parses a type followed by its params and props starting at
+        ``tokens[i]``.
+
+        :returns: the operand and the index of the first token after it.
+            ``props`` is None when there are no tokens after the params or
+            the props are malformed.
+        """
+        type_name = tokens[i]
+        if type_name not in Action.script_types:
+            raise MerlinScriptException(
+                "Syntax Error: {0} is not a valid type".format(type_name))
+        i += 1
+        n = len(tokens)
+
         params = list()
-        for t in tokens:
+        while i < n:
+            t = tokens[i]
             if not t:
                 raise MerlinScriptException(
                     "Invalid param {0}".format(t))
-            tt = Action._parse_type(t)
-            to = Action._parse_op(t)
-            if ('=' in t) and (':' in t):
-                return params
-            if tt or to:
-                return params
-            else:
-                params.append(t)
-        return params
-
-    @classmethod
-    def _parse_props(cls, tokens: List[str]) -> Dict[str, Any]:
-        if not tokens:
-            return None
-        props = dict()
-        for t in tokens:
-            tt = Action._parse_type(t)
-            to = Action._parse_op(t)
-            if tt or to:
-                return props
-            else:
-                type_p = t.partition(':')
-                if type_p[0] == t:
-                    # print("type partition error {0}".format(t))
-                    return None
-                else:
-                    label = type_p[0].strip()
-                    value_p = type_p[2].partition('=')
-                    if value_p[0] == type_p[2]:
-                        print("equality partiton error")
-                        return None
-                    else:
-                        val_type = value_p[0].strip()
-                        val = None
-                        if val_type == 'bool':
-                            val = (value_p[2].strip() == 'True')
-                        elif val_type == 'float':
-                            val = float(value_p[2].strip())
-                        elif val_type == 'str':
-                            val = value_p[2].strip()
-
-                        if not val:
-                            raise MerlinScriptException(
-                                "invalid type {0}".format(val_type))
-                        props[label] = val
-        return props
+            if (('=' in t) and (':' in t)) or t in Action.script_types \
+                    or t in Action.script_operators:
+                break
+            params.append(t)
+            i += 1
+
+        props = None
+        if i < n:
+            props = dict()
+            while i < n:
+                t = tokens[i]
+                if t in Action.script_types or t in Action.script_operators:
+                    break
+                prop = Action._parse_prop(t)
+                if prop is None:
+                    props = None
+                    break
+                props[prop[0]] = prop[1]
+                i += 1
+        return {'type': type_name, 'params': params, 'props': props}, i
 
     @classmethod
-    def _parse_type(cls, token):
-        if token in [
-            'Entity',
-            'Attribute',
-            'UnitType',
-            'Process',
-            'Property',
-            'Output',
-            'Endpoint'
-        ]:
-            return token
-        else:
-            return None
+    def _parse_prop(cls, token: str):
+        """
+        Parses a ``label:type=value`` token.
 
-    @classmethod
-    def _parse_op(cls, token):
-        if token in ['+', '-', '>', '/', ':=', '^']:
-            return token
-        else:
+        :returns: a ``(label, value)`` tuple or None if ``token`` is not a
+            property
+        """
+        label, colon, typed_value = token.partition(':')
+        val_type, equals, value = typed_value.partition('=')
+        if not colon or not equals:
             return None
+        val_type = val_type.strip()
+        val = None
+        if val_type == 'bool':
+            val = (value.strip() == 'True')
+        elif val_type == 'float':
+            val = float(value.strip())
+        elif val_type == 'str':
+            val = value.strip()
+
+        if not val:
+            raise MerlinScriptException(
+                "invalid type {0}".format(val_type))
+        return label.strip(), val
 
     def __init__(self):
         super(Action, self).__init__(name='')
+        # (simulation, structure version, resolved targets)
+        self._binding = None  # type: Tuple[Simulation, int, tuple]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # the resolved targets refer into a simulation
+        state = dict(self.__dict__)
+        state['_binding'] = None
+        return state
+
+    def bind(self, simulation: Simulation) -> 'Action':
+        """
+        Resolves the objects this action refers to in ``simulation`` and
+        keeps the references for :py:meth:`execute`. They are resolved again
+        once the :py:attr:`Simulation.structure_version` changed.
+
+        :raises SimReferenceNotFoundException: if a referred object does not
+            exist in ``simulation``
+        :returns: this action
+        """
+        targets = self._resolve(simulation)
+        if any(t is None for t in targets):
+            raise SimReferenceNotFoundException(
+                "{0} refers to objects not in simulation {1}: {2}".format(
+                    self.__class__.__name__,
+                    simulation.name,
+                    self.serialize()))
+        self._binding = (simulation, simulation.structure_version, targets)
+        return self
+
+    def _targets(self, simulation: Simulation) -> tuple:
+        """
+        :returns: the objects this action refers to, None for those not
+            found. Resolved only on the first call and after structural
+            changes to ``simulation``.
+        """
+        binding = self._binding
+        if binding is None or binding[0] is not simulation \
+                or binding[1] != simulation.structure_version:
+            binding = self._binding = (
+                simulation,
+                simulation.structure_version,
+                self._resolve(simulation))
+        return binding[2]
+
+    def _resolve(self, simulation: Simulation) -> tuple:
+        """
+        To be overridden by actions referring to objects in the simulation.
+
+        :returns: a tuple of the referred objects, None for those not found
+        """
+        return ()
+
+    def _affected(self, simulation: Simulation) -> List[SimObject]:
+        """
+        To be overridden by actions changing the model.
+
+        :returns: the objects whose :py:attr:`SimObject.undo_attributes`
+            :py:meth:`execute` may change, may contain None
+        """
+        return []
 
     def execute(self, simulation: Simulation):
         pass
@@ -1941,6 +3053,30 @@ class Action(SimObject):
         return dict()
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_script(script: str) -> Tuple[Dict[str, Any], ...]:
+    return tuple(
+        Action._parse_action(Action._lex_tokens(line.strip()))
+        for line in script.splitlines())
+
+
+def _copy_ast(a: Dict[str, Any]) -> Dict[str, Any]:
+    # the cached trees are shared, actions get their own params and props
+    def copy_operand(o):
+        if o is None:
+            return None
+        return {
+            'type': o['type'],
+            'params': list(o['params']),
+            'props': None if o['props'] is None else dict(o['props'])
+        }
+    return {
+        'op': a['op'],
+        'operand_1': copy_operand(a['operand_1']),
+        'operand_2': copy_operand(a['operand_2'])
+    }
+
+
 class Event(SimObject):
     """
     An event is a pairing of a time and a list of actions
@@ -1960,16 +3096,46 @@ class Event(SimObject):
 
     @classmethod
     def create(cls, time: int, script: str) -> 'Event':
-        try:
-            json.loads(script)
-            instance = cls(
-                Action.create_from_json(script),
-                time)
-        except JSONDecodeError:
-            instance = cls(
-                Action.create(script),
-                time)
-        return instance
+        """
+        :param str script: MerlinScript or a json list of serialised actions
+        """
+        return cls(Event._create_actions(script), time)
+
+    @classmethod
+    def create_many(
+            cls,
+            events: Iterable[Tuple[int, str]]) -> 'List[Event]':
+        """
+        Creates events from ``(time, script)`` pairs, parsing each distinct
+        MerlinScript only once, see :py:meth:`Action.create_many`.
+        """
+        events = list(events)
+        scripts = [
+            script for _, script in events if not Event._may_be_json(script)]
+        actions = iter(Action.create_many(scripts))
+        output = list()
+        for time, script in events:
+            if Event._may_be_json(script):
+                output.append(cls(Event._create_actions(script), time))
+            else:
+                output.append(cls(next(actions), time))
+        return output
+
+    @staticmethod
+    def _may_be_json(script: str) -> bool:
+        # serialised actions are a json list, MerlinScript starts with an
+        # operator or a type
+        return script.lstrip()[:1] in ('[', '{')
+
+    @staticmethod
+    def _create_actions(script: str) -> List[Action]:
+        if Event._may_be_json(script):
+            try:
+                json.loads(script)
+                return Action.create_from_json(script)
+            except JSONDecodeError:
+                pass
+        return Action.create(script)
 
     @classmethod
     def create_from_dict(
@@ -1999,8 +3165,28 @@ class Scenario(SimObject):
         self.sim = sim   # type: Simulation
         self.start_offset = start_offset or 0  # type: int
 
+    def bind(self, simulation: Simulation) -> 'Scenario':
+        """
+        Binds all actions to ``simulation``, see :py:meth:`Action.bind`.
+        Only possible if the objects the actions refer to exist before the
+        scenario runs.
+        """
+        for e in self.events:
+            for a in e.actions:
+                a.bind(simulation)
+        return self
+
 
 class MerlinMessage:
+    """
+    A message logged during a run, e.g. a warning about insufficient
+    funding.
+
+    A message sent repeatedly, typically once per tick, is stored once with
+    all the ticks it occurred in, see :py:class:`MessageStore`. The
+    :py:attr:`message` and :py:attr:`context` of the first occurrence are
+    kept.
+    """
 
     class MessageType(Enum):
         info = 0
@@ -2021,16 +3207,29 @@ class MerlinMessage:
         self.sender = sender  # type: SimObject
         self.message_id = message_id  # type: str
         self.message = message  # type: str
+        self.ticks = [time]  # type: List[int]
+        # serialised on demand
+        self._context = context  # type: List[SimObject]
+
+    @property
+    def context(self) -> List[Dict[str, Any]]:
         context_data = list()
-        for so in context:
+        for so in _flatten(self._context):
             d = dict()
             d['id'] = so.id
             d['type'] = so.__class__.__name__
             context_data.append(d)
-        self.context = context_data  # type: List[Dict[str, Any]
+        return context_data
+
+    @property
+    def count(self) -> int:
+        return len(self.ticks)
+
+    def add_occurrence(self, time: int) -> None:
+        self.ticks.append(time)
 
     def __str__(self):
-        return self.serialize()
+        return str(self.serialize())
 
     def serialize(self) -> Dict[str, Any]:
         output = dict()
@@ -2044,9 +3243,171 @@ class MerlinMessage:
         output['message_id'] = self.message_id
         output['message'] = self.message
         output['context'] = self.context
+        output['count'] = self.count
+        output['first_time'] = self.ticks[0]
+        output['last_time'] = self.ticks[-1]
+        output['ticks'] = list(self.ticks)
         return output
 
 
+def _flatten(objects):
+    for o in objects:
+        if isinstance(o, (list, tuple)):
+            yield from _flatten(o)
+        else:
+            yield o
+
+
+class MessageStore:
+    """
+    The messages of a run, with repeats folded and indexed.
+
+    Messages are identified by ``(message_id, sender)``, messages without
+    id by their text and sender. A repeat only appends its tick to the
+    existing :py:class:`MerlinMessage`.
+
+    Records are indexed by message type, sender id, tick and the ids of
+    their context objects, so :py:meth:`query` and :py:meth:`page` touch
+    and serialise only the matching records.
+    """
+
+    def __init__(self):
+        self._records = dict()  # type: Dict[tuple, int]
+        self._ordered = list()  # type: List[MerlinMessage]
+        self._by_type = dict()  # type: Dict[MerlinMessage.MessageType, List[int]]
+        self._by_sender = dict()  # type: Dict[int, List[int]]
+        self._by_tick = dict()  # type: Dict[int, List[int]]
+        self._by_context = dict()  # type: Dict[int, List[int]]
+        self._count = 0
+
+    def add(
+            self,
+            message_type: 'MerlinMessage.MessageType',
+            time: int,
+            sender: SimObject,
+            message_id: str="",
+            message: str="",
+            context: List[SimObject]=list()) -> MerlinMessage:
+        self._count += 1
+        key = (message_id or message, sender.id)
+        index = self._records.get(key)
+        if index is None:
+            record = MerlinMessage(
+                message_type, time, sender, message_id, message, context)
+            index = len(self._ordered)
+            self._records[key] = index
+            self._ordered.append(record)
+            self._by_type.setdefault(message_type, []).append(index)
+            self._by_sender.setdefault(sender.id, []).append(index)
+            for so_id in set(so.id for so in _flatten(context)):
+                self._by_context.setdefault(so_id, []).append(index)
+        else:
+            record = self._ordered[index]
+            new_tick = record.ticks[-1] != time
+            record.add_occurrence(time)
+            if not new_tick:
+                return record
+        self._by_tick.setdefault(time, []).append(index)
+        return record
+
+    def clear(self) -> None:
+        self._records.clear()
+        self._ordered.clear()
+        self._by_type.clear()
+        self._by_sender.clear()
+        self._by_tick.clear()
+        self._by_context.clear()
+        self._count = 0
+
+    def count(self) -> int:
+        """
+        :returns: the number of logged messages including repeats
+        """
+        return self._count
+
+    def __len__(self) -> int:
+        return len(self._ordered)
+
+    def __iter__(self):
+        return iter(self._ordered)
+
+    def serialize(self) -> List[Dict[str, Any]]:
+        return [r.serialize() for r in self._ordered]
+
+    @staticmethod
+    def _lookup(index: Dict[Any, List[int]], keys) -> Set[int]:
+        found = set()
+        for k in keys:
+            found.update(index.get(k, ()))
+        return found
+
+    def query(
+            self,
+            message_type=None,
+            min_type: 'MerlinMessage.MessageType'=None,
+            sender_ids=None,
+            context_ids=None,
+            start: int=None,
+            end: int=None) -> List[MerlinMessage]:
+        """
+        :param message_type: a :py:class:`MerlinMessage.MessageType` or a
+            collection of them
+        :param min_type: only messages at least this severe
+        :param sender_ids: ids of the senders to include
+        :param context_ids: only messages referring to one of these objects
+        :param int start: only messages occurring at or after this tick
+        :param int end: only messages occurring at or before this tick
+        :returns: the matching records in the order they were first logged
+
+        Filters left as None are not applied, the given ones are combined.
+        """
+        selected = None  # type: Set[int]
+
+        def restrict(found):
+            nonlocal selected
+            selected = found if selected is None else selected & found
+
+        if message_type is not None:
+            if isinstance(message_type, MerlinMessage.MessageType):
+                message_type = [message_type]
+            restrict(self._lookup(self._by_type, message_type))
+        if min_type is not None:
+            restrict(self._lookup(
+                self._by_type,
+                [t for t in self._by_type if t.value >= min_type.value]))
+        if sender_ids is not None:
+            restrict(self._lookup(self._by_sender, sender_ids))
+        if context_ids is not None:
+            restrict(self._lookup(self._by_context, context_ids))
+        if start is not None or end is not None:
+            ticks = [t for t in self._by_tick
+                     if (start is None or t >= start) and
+                     (end is None or t <= end)]
+            restrict(self._lookup(self._by_tick, ticks))
+
+        if selected is None:
+            return list(self._ordered)
+        return [self._ordered[i] for i in sorted(selected)]
+
+    def page(self, offset: int=0, limit: int=None, **filters) -> Dict[str, Any]:
+        """
+        Serialises one page of the records selected by :py:meth:`query`.
+
+        :param int offset: the number of matching records to skip
+        :param int limit: the maximum number of records to serialise, all
+            remaining ones if None
+        :returns: a dict with ``total``, the number of matching records,
+            ``offset`` and ``messages``, the serialised page.
+        """
+        matching = self.query(**filters)
+        stop = None if limit is None else offset + limit
+        return {
+            'total': len(matching),
+            'offset': offset,
+            'messages': [r.serialize() for r in matching[offset:stop]]
+        }
+
+
 class Ruleset:
     """
     A validation class that checks the integrity of a particular
@@ -2064,6 +3425,111 @@ class Ruleset:
     pass
 
 
+class ProcessRegistry:
+    """
+    Maps qualified names like ``pymerlin.processes.BudgetProcess`` to
+    :py:class:`Process` classes and back, used when creating and serialising
+    :py:class:`AddProcessAction`.
+
+    Classes are registered explicitly with :py:meth:`register`, by a
+    ``pymerlin.processes`` entry point of an installed package or found by
+    importing their module. Either way a name is resolved only once.
+    """
+
+    entry_point_group = 'pymerlin.processes'
+
+    def __init__(self):
+        self._classes = dict()  # type: Dict[str, type]
+        self._names = dict()  # type: Dict[type, str]
+        self._entry_points = None  # type: Dict[str, Any]
+
+    def register(self, process_class: type, name: str=None) -> type:
+        """
+        :param process_class: a subclass of :py:class:`Process`
+        :param str name: the name to register the class under, its qualified
+            name ``module.class`` by default.
+        :returns: ``process_class``, so this may be used as decorator
+        """
+        if not (isinstance(process_class, type) and
+                issubclass(process_class, Process)):
+            raise TypeError("expecting sub class of pymerlin.merlin.Process")
+        name = name or _qualified_name(process_class)
+        self._classes[name] = process_class
+        self._names.setdefault(process_class, name)
+        return process_class
+
+    def get_class(self, name: str) -> type:
+        """
+        :raises ValueError: if no process class of this name can be found
+        """
+        process_class = self._classes.get(name)
+        if process_class is None:
+            process_class = self._load(name)
+            self._classes[name] = process_class
+            # other names, e.g. without the module, are not written
+            if name == _qualified_name(process_class):
+                self._names.setdefault(process_class, name)
+        return process_class
+
+    def get_name(self, process_class: type) -> str:
+        """
+        :returns: the name ``process_class`` was registered with or its
+            qualified name.
+        """
+        name = self._names.get(process_class)
+        if name is None:
+            self.register(process_class)
+            name = self._names[process_class]
+        return name
+
+    def _load(self, name: str) -> type:
+        entry_point = self._get_entry_points().get(name)
+        if entry_point is not None:
+            return entry_point.load()
+
+        # split name into parts
+        mod_path = name.split(".")[:-1]
+        if len(mod_path):
+            try:
+                namespace = importlib.import_module(
+                    ".".join(mod_path)).__dict__
+            except ImportError:
+                raise ValueError(
+                    """module containing process class {0}
+                    could not be imported""".format(name))
+        else:
+            # don't like this!
+            namespace = globals()
+        class_def = name.split(".")[-1]
+        if class_def not in namespace:
+            raise ValueError('process class %s not found' % name)
+        return namespace[class_def]
+
+    def _get_entry_points(self) -> Dict[str, Any]:
+        if self._entry_points is None:
+            self._entry_points = dict()
+            try:
+                from importlib.metadata import entry_points
+            except ImportError:  # Python < 3.8
+                return self._entry_points
+            eps = entry_points()
+            if hasattr(eps, 'select'):
+                group = eps.select(group=self.entry_point_group)
+            else:
+                group = eps.get(self.entry_point_group, [])
+            for ep in group:
+                self._entry_points[ep.name] = ep
+        return self._entry_points
+
+
+def _qualified_name(cls: type) -> str:
+    return "{0}.{1}".format(cls.__module__, cls.__name__)
+
+
+process_registry = ProcessRegistry()
+"""the registry used by :py:class:`AddProcessAction`"""
+
+
 # Core package exceptions
 
 
@@ -2079,11 +3545,25 @@ class MerlinException(Exception):
         return repr(self.value)
 
 
+InputShortfall = collections.namedtuple(
+    'InputShortfall', ['tick', 'process_id', 'input', 'available', 'required'])
+"""
+An input of the process with ``process_id``, named ``input``, which provided
+``available`` at ``tick`` but ``required`` was needed, see
+:py:attr:`Simulation.shortfalls`.
+"""
+
+
 class InputRequirementException(MerlinException):
     """
-    Should be thrown by a process if an input quantity produces a zero
+    Can be thrown by a process if an input quantity produces a zero
     output by the compute function. Is used to indicate what input was
     deficient to make debugging the model easier.
+
+    Superseded by :py:meth:`Process.require_input`, which avoids the cost of
+    the exception. The entity catches it, records an
+    :py:class:`InputShortfall` and writes zeros to the outputs of the
+    process.
     """
 
     def __init__(self, process, process_input, input_value, required_input):
@@ -2096,8 +3576,9 @@ class InputRequirementException(MerlinException):
         :param number required_input: the (minimum) value expected
 
         often used in :py:meth:`pymerlin.merlin.Process.compute`, the
-        simulation does not stop, but the exceptions are caught and collected
-        for reporting/introspection purposes.
+        simulation does not stop, but the exceptions are caught and recorded
+        in :py:attr:`Simulation.shortfalls` for reporting/introspection
+        purposes.
 
         todo: what if two inputs are insufficient?
         """
@@ -2115,6 +3596,16 @@ class InputRequirementException(MerlinException):
                 self.input_value,
                 self.value))
 
+    def input_name(self) -> str:
+        """
+        :returns: the name of :py:attr:`process_input` in the
+            :py:attr:`Process.inputs` of :py:attr:`process`
+        """
+        for k, pi in self.process.inputs.items():
+            if pi is self.process_input:
+                return k
+        return self.process_input.name
+
 
 class SimReferenceNotFoundException(MerlinException):
 
@@ -2134,6 +3625,24 @@ class MerlinScriptException(MerlinException):
         super(MerlinException, self).__init__(value)
 
 
+def _connection_objects(entity: Entity) -> List[SimObject]:
+    """
+    :returns: the entity, its connectors and everything connected to them,
+        i.e. the objects changed by connecting or removing the entity
+    """
+    objects = [entity]
+    for o in entity.outputs:
+        objects.append(o)
+        for ep in o.get_endpoint_objects():
+            objects += [ep, ep.connector, ep.connector.parent]
+    for i in entity.inputs:
+        objects.append(i)
+        if i.source is not None:
+            objects += [i.source, i.source.parent]
+            objects += i.source.get_endpoint_objects()
+    return objects
+
+
 class AddAttributesAction(Action):
     """
     Adds global attributes to the sim
@@ -2194,8 +3703,24 @@ class RemoveEntityAction(Action):
         self.entity_id = self.convert_to_id(entity_id) or entity_id
 
 
+    def _resolve(self, simulation):
+        return (simulation.find_sim_object(self.entity_id, 'Entity'),)
+
+    def _affected(self, simulation):
+        entity_to_remove, = self._targets(simulation)
+        if not entity_to_remove:
+            return []
+        objects = [simulation]
+        pending = [entity_to_remove]
+        while pending:
+            e = pending.pop()
+            objects += _connection_objects(e)
+            objects.append(e.parent)
+            pending.extend(e.get_children())
+        return objects
+
     def execute(self, simulation):
-        entity_to_remove = simulation.find_sim_object(self.entity_id, 'Entity')
+        entity_to_remove, = self._targets(simulation)
         if entity_to_remove:
             self._remove_entity(entity_to_remove)
 
@@ -2215,7 +3740,7 @@ class RemoveEntityAction(Action):
         else:
             ent.parent.remove_child(ent.id)
 
-        for child in ent.get_children():
+        for child in list(ent.get_children()):
             self._remove_entity(child)
         ent.sim.remove_entity(ent)
 
@@ -2245,6 +3770,9 @@ class AddEntityAction(Action):
         self.entity_name = entity_name
         self.parent = parent
 
+    def _affected(self, simulation):
+        return [simulation, self.parent]
+
     def execute(self, simulation):
         e = Entity(simulation, self.entity_name, set(self.attributes))
         if self.parent == simulation or self.parent is None:
@@ -2284,10 +3812,20 @@ class RemoveConnectionAction(Action):
         self.to_entity_id = self.convert_to_id(to_entity_id) or to_entity_id
         self.unit_type = self.convert_to_id(unit_type) or unit_type
 
+    def _resolve(self, simulation: Simulation):
+        return (simulation.find_sim_object(self.from_entity_id, 'Entity'),
+                simulation.find_sim_object(self.to_entity_id, 'Entity'))
+
+    def _affected(self, simulation: Simulation):
+        objects = [simulation]
+        for e in self._targets(simulation):
+            if e is not None:
+                objects += _connection_objects(e)
+        return objects
+
     def execute(self, simulation: Simulation):
 
-        from_entity = simulation.find_sim_object(self.from_entity_id, 'Entity')
-        to_entity = simulation.find_sim_object(self.to_entity_id, 'Entity')
+        from_entity, to_entity = self._targets(simulation)
 
         if from_entity and to_entity:
             simulation.disconnect_entities(
@@ -2335,11 +3873,19 @@ class AddConnectionAction(Action):
             OutputConnector.ApportioningRules(int(apportioning))
         self.additive_write = bool(additive_write)
 
+    def _resolve(self, simulation: Simulation):
+        return (simulation.find_sim_object(self.output_entity_id, 'Entity'),
+                simulation.find_sim_object(self.input_entity_id, 'Entity'))
+
+    def _affected(self, simulation: Simulation):
+        objects = [simulation]
+        for e in self._targets(simulation):
+            if e is not None:
+                objects += _connection_objects(e)
+        return objects
+
     def execute(self, simulation: Simulation):
-        from_entity = simulation.find_sim_object(
-            self.output_entity_id, 'Entity')
-        to_entity = simulation.find_sim_object(
-            self.input_entity_id, 'Entity')
+        from_entity, to_entity = self._targets(simulation)
         simulation.connect_entities(
             from_entity,
             to_entity,
@@ -2380,9 +3926,18 @@ class RemoveProcessAction(Action):
         self.process_id = self.convert_to_id(process_id) or process_id
         self.entity_id = self.convert_to_id(entity_id) or entity_id
 
+    def _resolve(self, simulation: Simulation):
+        return (simulation.find_sim_object(self.entity_id, 'Entity'),
+                simulation.find_sim_object(self.process_id, 'Process'))
+
+    def _affected(self, simulation: Simulation):
+        e, p = self._targets(simulation)
+        if p is None:
+            return [e]
+        return [e, p] + list(p.inputs.values()) + list(p.outputs.values())
+
     def execute(self, simulation: Simulation):
-        e = simulation.find_sim_object(self.entity_id, 'Entity')
-        p = simulation.find_sim_object(self.process_id, 'Process')
+        e, p = self._targets(simulation)
         e.remove_process(p.id)
 
     def serialize(self) -> Dict[str, Any]:
@@ -2417,8 +3972,11 @@ class AddProcessAction(Action):
 
         super(AddProcessAction, self).__init__()
         self.entity_id = self.convert_to_id(entity_id) or entity_id
-        self.process_class = \
-            self.get_process_class_from_fullname(process_class)
+        if isinstance(process_class, type):
+            self.process_class = process_class
+        else:
+            self.process_class = \
+                self.get_process_class_from_fullname(process_class)
         self.process_params = process_params
         if priority:
             self.priority = int(priority)
@@ -2432,36 +3990,22 @@ class AddProcessAction(Action):
         :returns: the class (not the object!)
 
         This is the inverse of the :py:func:`.get_process_class_from_fullname`.
+        The lookup is cached by :py:data:`process_registry`.
         """
-        # split name into parts
-        mod_path = the_name.split(".")[:-1]
-        if len(mod_path):
-            try:
-                namespace = importlib.import_module(
-                    ".".join(mod_path)).__dict__
-            except ImportError:
-                raise ValueError(
-                    """module containing process class {0}
-                    could not be imported""".format(the_name))
-        else:
-            # don't like this!
-            namespace = globals()
-        class_def = the_name.split(".")[-1]
-        if class_def not in namespace:
-            raise ValueError('process class %s not found' % the_name)
-
-        # execute this function
-        return namespace[class_def]
+        return process_registry.get_class(the_name)
 
     def _get_fullname_from_process_class(self, the_class: type) -> str:
-        if not issubclass(the_class, Process):
-            raise TypeError("expecting sub class of pymerlin.merlin.Process")
-        proc_classname = the_class.__name__
-        proc_module = the_class.__module__
-        return "{0}.{1}".format(proc_module, proc_classname)
+        return process_registry.get_name(the_class)
+
+    def _resolve(self, simulation):
+        return (simulation.find_sim_object(self.entity_id, 'Entity'),)
+
+    def _affected(self, simulation):
+        entity, = self._targets(simulation)
+        return [entity]
 
     def execute(self, simulation):
-        entity = simulation.find_sim_object(self.entity_id, 'Entity')
+        entity, = self._targets(simulation)
         if entity:
             entity.create_process(
                 self.process_class,
@@ -2506,17 +4050,29 @@ class ModifyProcessPropertyAction(Action):
         self.value = float(value)
         self.additive = additive
 
-    def execute(self, simulation: Simulation):
+    def _resolve(self, simulation: Simulation):
         e = simulation.find_sim_object(self.entity_id, 'Entity')
         found_prop = simulation.find_sim_object(
             self.property_id, 'ProcessProperty')
-        for p in e.get_processes():
-            for prop in p.get_properties():
-                if prop.id == found_prop.id:
-                    if self.additive:
-                        prop.set_value(prop.get_value() + self.value)
-                    else:
-                        prop.set_value(self.value)
+        if e is not None and found_prop is not None:
+            for p in e.get_processes():
+                if found_prop in p.get_properties():
+                    return (e, found_prop)
+        # the property may belong to a process of another entity
+        return (e, None)
+
+    def _affected(self, simulation: Simulation):
+        return [self._targets(simulation)[1]]
+
+    def execute(self, simulation: Simulation):
+        e, prop = self._targets(simulation)
+        if e is None:
+            raise EntityNotFoundException(self.entity_id)
+        if prop is not None:
+            if self.additive:
+                prop.set_value(prop.get_value() + self.value)
+            else:
+                prop.set_value(self.value)
 
     def serialize(self) -> Dict[str, Any]:
         return {
@@ -2538,6 +4094,77 @@ class ModifyProcessPropertyAction(Action):
         }
 
 
+class ScheduleProcessPropertyAction(Action):
+    """
+    Sets the :py:class:`PropertySchedule` of a process property for the
+    run, replacing one action per tick and the schedule of the model until
+    the next run. The ticks of the schedule count from the tick
+    the action is executed in, ``0`` being that tick, so the schedule
+    moves with the scenario's start offset.
+
+    Only available as dictionary or JSON, e.g. ``{'op': ':=', 'operand_1':
+    {'type': 'Entity', 'params': [entity_id], 'props': None}, 'operand_2':
+    {'type': 'Schedule', 'params': [property_id], 'props': {'ticks': [0,
+    12], 'values': [100, 120]}}}``.
+    """
+
+    def __init__(
+            self,
+            entity_id,
+            property_id,
+            schedule):
+        """
+        :param schedule: a :py:class:`PropertySchedule` or its
+            serialisation, None to remove the schedule
+        """
+        super(ScheduleProcessPropertyAction, self).__init__()
+        self.entity_id = self.convert_to_id(entity_id) or entity_id
+        self.property_id = self.convert_to_id(property_id) or property_id
+        if isinstance(schedule, dict):
+            schedule = PropertySchedule.create_from_dict(schedule)
+        self.schedule = schedule  # type: PropertySchedule
+
+    def _resolve(self, simulation: Simulation):
+        e = simulation.find_sim_object(self.entity_id, 'Entity')
+        found_prop = simulation.find_sim_object(
+            self.property_id, 'ProcessProperty')
+        if e is not None and found_prop is not None:
+            for p in e.get_processes():
+                if found_prop in p.get_properties():
+                    return (e, found_prop)
+        return (e, None)
+
+    def _affected(self, simulation: Simulation):
+        return [self._targets(simulation)[1]]
+
+    def execute(self, simulation: Simulation):
+        e, prop = self._targets(simulation)
+        if e is None:
+            raise EntityNotFoundException(self.entity_id)
+        if prop is not None:
+            prop.set_scenario_schedule(
+                None if self.schedule is None
+                else self.schedule.shifted(simulation.current_step))
+
+    def serialize(self) -> Dict[str, Any]:
+        return {
+            'op': ':=',
+            'operand_1':
+                {
+                    'type': 'Entity',
+                    'params': [self.entity_id],
+                    'props': None
+                },
+            'operand_2':
+                {
+                    'type': 'Schedule',
+                    'params': [self.property_id],
+                    'props': (None if self.schedule is None
+                              else self.schedule.serialize())
+                }
+        }
+
+
 class ParentEntityAction(Action):
 
     def __init__(
@@ -2566,11 +4193,15 @@ class ParentEntityAction(Action):
                 }
         }
 
+    def _resolve(self, simulation: Simulation):
+        return (simulation.find_sim_object(self.parent_entity_id, 'Entity'),
+                simulation.find_sim_object(self.child_entity_id, 'Entity'))
+
+    def _affected(self, simulation: Simulation):
+        return list(self._targets(simulation))
+
     def execute(self, simulation: Simulation):
-        parent_entity = simulation.find_sim_object(
-            self.parent_entity_id, 'Entity')
-        child_entity = simulation.find_sim_object(
-            self.child_entity_id, 'Entity')
+        parent_entity, child_entity = self._targets(simulation)
         if parent_entity and child_entity:
             simulation.parent_entity(parent_entity, child_entity)
 
@@ -2602,8 +4233,14 @@ class ModifyOutputMinimumAction(Action):
             'operand_2': None
         }
 
+    def _resolve(self, simulation: Simulation):
+        return (simulation.find_sim_object(self.output_id, 'Output'),)
+
+    def _affected(self, simulation: Simulation):
+        return list(self._targets(simulation))
+
     def execute(self, simulation: Simulation):
-        output = simulation.find_sim_object(self.output_id, 'Output')
+        output, = self._targets(simulation)
         if output:
             if self.additive:
                 output.minimum += self.minimum
@@ -2638,14 +4275,25 @@ class ModifyEndpointBiasAction(Action):
             }
         }
 
-    def execute(self, simulation: Simulation):
+    def _resolve(self, simulation: Simulation):
         e = simulation.find_sim_object(self.entity_id, 'Entity')
         found_ep = simulation.find_sim_object(self.endpoint_id, 'Endpoint')
-        for o in e.outputs:
-            for ep in o.get_endpoint_objects():
-                if ep.id == found_ep.id:
-                    if self.additive:
-                        ep.bias += self.bias
-                    else:
-                        ep.bias = self.bias
-                    break
+        if e is not None and found_ep is not None:
+            for o in e.outputs:
+                if found_ep in o.get_endpoint_objects():
+                    return (e, found_ep)
+        # the endpoint may belong to an output of another entity
+        return (e, None)
+
+    def _affected(self, simulation: Simulation):
+        return [self._targets(simulation)[1]]
+
+    def execute(self, simulation: Simulation):
+        e, ep = self._targets(simulation)
+        if e is None:
+            raise EntityNotFoundException(self.entity_id)
+        if ep is not None:
+            if self.additive:
+                ep.bias += self.bias
+            else:
+                ep.bias = self.bias
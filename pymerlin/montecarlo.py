@@ -0,0 +1,316 @@
+"""
+.. module:: montecarlo
+
+Uncertainty bands of the outputs from many runs of a model.
+
+:py:func:`run` repeats a run of a simulation ``runs`` times. Every run draws
+the values of some process properties from distributions and has its own
+seed, so the random streams of the processes differ, see
+:py:meth:`pymerlin.merlin.Process.get_random_generator`::
+
+    result = montecarlo.run(
+        sim, 500,
+        distributions={staff_number.id: ('normal', 100.0, 10.0)},
+        quantiles=(0.05, 0.5, 0.95),
+        workers=4)
+    band = result['outputs'][output.id]
+    band['mean'], band['quantiles'][0.05], band['quantiles'][0.95]
+
+A distribution is the name of a :py:class:`numpy.random.Generator` method and
+its arguments, e.g. ``('uniform', 0.8, 1.2)``. The values drawn are applied
+by a :py:func:`property_overlay`, which is rolled back after the run, so the
+model is not changed. A property with a schedule keeps the value drawn for
+the whole run.
+
+The output series are aggregated per tick as the runs finish, the mean and
+variance by :py:class:`RunningMoments`, the quantiles by
+:py:class:`P2Quantile`, which keeps five markers per tick instead of the
+values of all runs. Only these aggregates are returned.
+
+The values drawn and the seed of the ``i``-th run only depend on ``seed`` and
+``i``, and the runs are aggregated in order, so the results do not depend on
+the number of ``workers``.
+"""
+import pickle
+from concurrent import futures
+from typing import (Any, Callable, Dict, Iterable, Iterator,  # @UnusedImports
+                    List, Mapping, Sequence, Tuple)  # @UnusedImports
+
+import numpy as np
+
+from pymerlin import merlin
+
+
+def run(
+        sim: merlin.Simulation,
+        runs: int,
+        distributions: Mapping[int, Sequence[Any]]=None,
+        quantiles: Iterable[float]=(0.05, 0.5, 0.95),
+        start: int=1,
+        end: int=-1,
+        scenarios: List[merlin.Scenario]=(),
+        seed: int=None,
+        workers: int=1) -> Dict[str, Any]:
+    """
+    :param runs: the number of runs
+    :param distributions: ``{property id: (method, arguments...)}``
+    :param quantiles: the quantiles to estimate, between 0 and 1
+    :param start: see :py:meth:`pymerlin.merlin.Simulation.run`
+    :param end: see :py:meth:`pymerlin.merlin.Simulation.run`
+    :param scenarios: executed in every run, after the overlay
+    :param seed: the seed of all runs, a new one if None
+    :param workers: the number of worker processes, with 1 the runs are
+        executed by ``sim`` itself
+    :returns: ``{'runs': runs, 'seed': seed, 'outputs': {output id: band}}``
+        with the bands ``{'name', 'mean', 'variance', 'quantiles'}`` of the
+        outputs, ``quantiles`` being ``{quantile: values}``, with a value
+        per tick
+    :raises pymerlin.merlin.MerlinException: if a property is not found or a
+        distribution is unknown
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    quantiles = list(quantiles)
+    targets = list()
+    for prop_id in sorted(distributions or {}):
+        if sim.find_sim_object(prop_id, 'ProcessProperty') is None:
+            raise merlin.MerlinException(
+                "property {0} not found".format(prop_id))
+        distribution = tuple(distributions[prop_id])
+        method = distribution[0] if distribution else None
+        if not (isinstance(method, str) and not method.startswith('_') and
+                callable(getattr(np.random.Generator, method, None))):
+            raise merlin.MerlinException(
+                "unknown distribution {0}".format(distribution))
+        targets.append((prop_id, distribution))
+    outputs = sorted(sim.outputs, key=lambda o: o.id)
+    plan = (targets, list(scenarios), start, end, seed,
+            [o.id for o in outputs])
+
+    moments = [RunningMoments() for _ in outputs]
+    estimators = [[P2Quantile(q) for q in quantiles] for _ in outputs]
+
+    def aggregate(results):
+        for result, m, qs in zip(results, moments, estimators):
+            m.add(result)
+            for q in qs:
+                q.add(result)
+
+    for results in map_runs(
+            sim, _simulate, plan, range(runs), workers,
+            chunksize=max(1, runs // (4 * workers))):
+        aggregate(results)
+
+    return {
+        'runs': runs,
+        'seed': seed,
+        'outputs': {
+            o.id: {
+                'name': o.name,
+                'mean': _values(m.mean),
+                'variance': _values(m.variance),
+                'quantiles': {q.p: _values(q.estimate) for q in qs}}
+            for o, m, qs in zip(outputs, moments, estimators)}}
+
+
+def map_runs(
+        sim: merlin.Simulation,
+        simulate: Callable[[merlin.Simulation, Any, Any], Any],
+        plan: Any,
+        args: Iterable[Any],
+        workers: int=1,
+        chunksize: int=1) -> Iterator[Any]:
+    """
+    :param simulate: a module level function, called as
+        ``simulate(sim, plan, arg)``
+    :param workers: the number of worker processes, each with a copy of
+        ``sim``, with 1 ``simulate`` is called with ``sim`` itself
+    :param chunksize: the number of ``args`` sent to a worker at once
+    :returns: the results of ``simulate`` for every one of ``args``, in
+        their order
+    """
+    if workers > 1:
+        with futures.ProcessPoolExecutor(
+                workers,
+                initializer=_init_worker,
+                initargs=(pickle.dumps(sim), simulate, plan)) as pool:
+            yield from pool.map(_run_in_worker, args, chunksize=chunksize)
+    else:
+        for arg in args:
+            yield simulate(sim, plan, arg)
+
+
+def property_overlay(
+        sim: merlin.Simulation,
+        values: Mapping[int, Any],
+        tick: int=1) -> merlin.Scenario:
+    """
+    :param values: ``{property id: value}``, the values being numbers or
+        :py:class:`pymerlin.merlin.PropertySchedule` with the ticks of the
+        run
+    :param tick: the first tick of the run
+    :returns: a scenario setting the properties to ``values`` at ``tick``,
+        for a run with ``rollback=True``, which leaves the model as it was.
+        A number replaces the schedule of a property having one for the run,
+        which would override it otherwise.
+    :raises pymerlin.merlin.MerlinException: if a property is not found
+    """
+    actions = list()
+    for prop_id, value in values.items():
+        prop = sim.find_sim_object(prop_id, 'ProcessProperty')
+        if prop is None:
+            raise merlin.MerlinException(
+                "property {0} not found".format(prop_id))
+        entity_id = prop.parent.parent.id
+        if isinstance(value, merlin.PropertySchedule):
+            # the action counts the ticks from the one it is executed in
+            actions.append(merlin.ScheduleProcessPropertyAction(
+                entity_id, prop_id, value.shifted(-tick)))
+        elif prop.schedule is not None:
+            constant = merlin.PropertySchedule({0: float(value)})
+            actions.append(merlin.ScheduleProcessPropertyAction(
+                entity_id, prop_id, constant))
+        else:
+            actions.append(merlin.ModifyProcessPropertyAction(
+                entity_id, prop_id, value))
+    return merlin.Scenario({merlin.Event(actions, tick)})
+
+
+class RunningMoments:
+    """
+    The mean and variance of series of equal length, element by element,
+    updated with every series by Welford's algorithm.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = None  # type: np.ndarray
+        # the sums of squared differences from the mean
+        self._m2 = None  # type: np.ndarray
+
+    def add(self, values: Sequence[float]) -> None:
+        x = np.array(values, dtype=float)
+        self.count += 1
+        if self.mean is None:
+            self.mean = x
+            self._m2 = np.zeros_like(x)
+            return
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """the sample variance, zero for a single series"""
+        if self._m2 is None or self.count < 2:
+            return self._m2
+        return self._m2 / (self.count - 1)
+
+
+class P2Quantile:
+    """
+    Estimates the quantile ``p`` of series of equal length, element by
+    element, with the P² algorithm of Jain and Chlamtac, which adjusts five
+    markers with every series instead of keeping the series.
+    """
+
+    def __init__(self, p: float):
+        if not 0.0 < p < 1.0:
+            raise merlin.MerlinException(
+                "quantile {0} is not between 0 and 1".format(p))
+        self.p = p
+        self.count = 0
+        # the first five series, until the markers are set up
+        self._first = list()  # type: List[np.ndarray]
+        # heights and positions of the markers, a row per marker
+        self._heights = None  # type: np.ndarray
+        self._positions = None  # type: np.ndarray
+        self._desired = np.array([1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0])
+        self._increments = np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+    def add(self, values: Sequence[float]) -> None:
+        x = np.array(values, dtype=float)
+        self.count += 1
+        if self._heights is None:
+            self._first.append(x)
+            if len(self._first) == 5:
+                self._heights = np.sort(np.array(self._first), axis=0)
+                self._positions = np.repeat(
+                    np.arange(1.0, 6.0)[:, np.newaxis], x.size, axis=1)
+                self._first = None
+            return
+
+        q, n = self._heights, self._positions
+        q[0] = np.minimum(q[0], x)
+        q[4] = np.maximum(q[4], x)
+        # the cell q[k] <= x < q[k + 1] of x, the markers above it move up
+        k = (x >= q[1:4]).sum(axis=0)
+        n += np.arange(5)[:, np.newaxis] > k
+        self._desired += self._increments
+
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            move = (((d >= 1) & (n[i + 1] - n[i] > 1)) |
+                    ((d <= -1) & (n[i - 1] - n[i] < -1)))
+            if not move.any():
+                continue
+            s = np.where(d < 0, -1.0, 1.0)
+            parabolic = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) /
+                (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) /
+                (n[i] - n[i - 1]))
+            neighbour = np.where(d < 0, i - 1, i + 1)
+            columns = np.arange(x.size)
+            linear = q[i] + s * (q[neighbour, columns] - q[i]) / (
+                n[neighbour, columns] - n[i])
+            height = np.where(
+                (q[i - 1] < parabolic) & (parabolic < q[i + 1]),
+                parabolic, linear)
+            q[i] = np.where(move, height, q[i])
+            n[i] = np.where(move, n[i] + s, n[i])
+
+    @property
+    def estimate(self) -> np.ndarray:
+        """the estimated quantile, exact for up to five series"""
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._first:
+            return None
+        return np.quantile(np.array(self._first), self.p, axis=0)
+
+
+def _values(a: np.ndarray) -> List[float]:
+    return None if a is None else a.tolist()
+
+
+def _simulate(
+        sim: merlin.Simulation,
+        plan: tuple,
+        i: int) -> List[List[float]]:
+    # the results of the outputs in the i-th run
+    targets, scenarios, start, end, seed, output_ids = plan
+    values_seed, run_seed = np.random.SeedSequence([seed, i]).spawn(2)
+    rng = np.random.default_rng(values_seed)
+    values = {prop_id: getattr(rng, d[0])(*d[1:])
+              for prop_id, d in targets}
+    overlay = property_overlay(sim, values, start if start > 1 else 1)
+    sim.run(
+        start, end, [overlay] + scenarios, rollback=True,
+        seed=int(run_seed.generate_state(1, np.uint64)[0]))
+    outputs = {o.id: o for o in sim.outputs}
+    return [outputs[o_id].result for o_id in output_ids]
+
+
+# the model, function and plan of a worker process of map_runs
+_worker_state = None  # type: Tuple[merlin.Simulation, Callable, Any]
+
+
+def _init_worker(model: bytes, simulate: Callable, plan: Any) -> None:
+    global _worker_state
+    _worker_state = (pickle.loads(model), simulate, plan)
+
+
+def _run_in_worker(arg: Any) -> Any:
+    sim, simulate, plan = _worker_state
+    return simulate(sim, plan, arg)
@@ -1,3 +1,5 @@
+import numpy as np
+
 from pymerlin import merlin
 
 
@@ -6,6 +8,10 @@ class ConstantProvider(merlin.Process):
     always return the same number
     """
 
+    pure = True
+
+    amount = merlin.PropertyValue('amount')
+
     def __init__(self, name='resource', unit='', amount=1.0):
 
         super(ConstantProvider, self).__init__(name)
@@ -21,8 +27,10 @@ class ConstantProvider(merlin.Process):
                           amount)
 
     def compute(self, tick):
-        a = self.get_prop_value("amount")
-        self.provide_output("amount", a)
+        self.provide_output("amount", self.amount)
+
+    def compute_horizon(self, ticks, inputs, props):
+        return {"amount": props["amount"]}, {}
 
 
 class BudgetProcess(merlin.Process):
@@ -35,6 +43,8 @@ class BudgetProcess(merlin.Process):
     An updated budget value is in effect immediately.
     """
 
+    amount = merlin.PropertyValue('amount')
+
     def __init__(self, name='Budget', start_amount=10000.00, budget_type="$"):
         """
         :param str name:
@@ -58,7 +68,7 @@ class BudgetProcess(merlin.Process):
 
     def reset(self):
         # define internal instance variables on init
-        self.current_budget_amount = self.get_prop_value("amount")
+        self.current_budget_amount = self.amount
 
     def compute(self, tick):
         # Check to see that the start amount has changed, and if so
@@ -66,14 +76,34 @@ class BudgetProcess(merlin.Process):
 
         # reset the current budget value
         if tick % 12 == 1 or self.instantaneous_update:
-            self.current_budget_amount = self.get_prop_value("amount")
+            self.current_budget_amount = self.amount
 
         self.provide_output('$', max(0.0,
                                      self.current_budget_amount/12.0))
 
+    def compute_horizon(self, ticks, inputs, props):
+        amount = props['amount']
+        if self.instantaneous_update:
+            current = amount
+        else:
+            # the amount of the last start of a year, the amount at reset
+            # before the first one
+            index = np.where(ticks % 12 == 1, np.arange(len(ticks)), -1)
+            index = np.maximum.accumulate(index)
+            current = np.where(index >= 0, amount[np.maximum(index, 0)],
+                               self.current_budget_amount)
+        self.current_budget_amount = current[-1].item()
+
+        return {'$': np.maximum(0.0, current/12.0)}, {}
+
 
 class CallCenterStaffProcess(merlin.Process):
 
+    staff_number = merlin.PropertyValue('staff number')
+    staff_salary = merlin.PropertyValue('staff salary')
+    staff_per_desk = merlin.PropertyValue('staff per desk')
+    months_to_train = merlin.PropertyValue('months to train')
+
     def __init__(self, name='Call Center Staff'):
         super(CallCenterStaffProcess, self).__init__(name)
 
@@ -119,47 +149,45 @@ class CallCenterStaffProcess(merlin.Process):
 
     def compute(self, tick):
 
-        desks_required = (self.get_prop_value('staff number') /
-                               self.get_prop_value('staff per desk'))
-
-        funds_required = (self.get_prop_value('staff number') *
-                           self.get_prop_value('staff salary'))
-        maximal_output = self.get_prop_value('staff number')
+        staff_number = self.staff_number
+        desks_required = staff_number / self.staff_per_desk
+        funds_required = staff_number * self.staff_salary
+        maximal_output = staff_number
 
         # check requirements
 
-        if self.get_input_available('desks') < desks_required:
-
-            self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
-                self,
-                msg="There are not enough {{desks provided}}, "
-                    "call center currently needs {0} desks".format(
-                    desks_required),
-                msg_id="call_center_required_desks",
-                context=[self.inputs['desks']]
-            )
-            raise merlin.InputRequirementException(
-                self,
-                self.inputs['desks'],
-                self.inputs['desks'].connector.value,
-                desks_required)
-        if self.get_input_available('$') < funds_required:
-            self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
-                self,
-                msg="There is not enough {{budget}} to pay staff, "
-                    "call center currently needs ${0}".format(
-                    funds_required),
-                msg_id="call_center_required_salary",
-                context=[self.inputs['$']]
-            )
-
-            raise merlin.InputRequirementException(
-                self,
-                self.inputs['$'],
-                self.inputs['$'].connector.value,
-                funds_required)
+        sim = self.parent.sim
+        warn = merlin.MerlinMessage.MessageType.warn
+
+        desks_provided = self.require_input(
+            'desks', desks_required, notify=False)
+        if not desks_provided:
+            if sim.wants_message(warn):
+                sim.log_message(
+                    warn,
+                    self,
+                    msg="There are not enough {{desks provided}}, "
+                        "call center currently needs {0} desks".format(
+                        desks_required),
+                    msg_id="call_center_required_desks",
+                    context=[self.inputs['desks']]
+                )
+        funds_provided = self.require_input(
+            '$', funds_required, notify=False)
+        if not funds_provided:
+            if sim.wants_message(warn):
+                sim.log_message(
+                    warn,
+                    self,
+                    msg="There is not enough {{budget}} to pay staff, "
+                        "call center currently needs ${0}".format(
+                        funds_required),
+                    msg_id="call_center_required_salary",
+                    context=[self.inputs['$']]
+                )
+        if not (desks_provided and funds_provided):
+            self.write_zero_to_all()
+            return
 
         # compute outputs
         output = maximal_output * self._train_modifier(tick)
@@ -170,7 +198,7 @@ class CallCenterStaffProcess(merlin.Process):
     def _train_modifier(self, tick):
         # This is just a linear function with the
         # slope steepness = months to train
-        mtt = self.get_prop_value('months to train')
+        mtt = self.months_to_train
         train_slope = 1.0 / float(mtt)
         if tick < mtt:
             return tick * train_slope
@@ -180,6 +208,43 @@ class CallCenterStaffProcess(merlin.Process):
 
 class StaffFTE(merlin.Process):
 
+    pure = True
+
+    schema = merlin.ProcessSchema(
+        inputs=[
+            ("staff_budget", "staff$"),
+            ("staff_accom", "staff_accomodated")],
+        outputs=[
+            ("overhead_staff_fte", "OH_FTE"),
+            ("line_staff_fte", "LS_FTE"),
+            ("used_expenses", "used_staff_expenses")],
+        properties=[
+            ('Line Staff Number', 'ls_number',
+             merlin.ProcessProperty.PropertyType.number_type, 1000.0),
+            ('Overhead Staff Number', 'oh_number',
+             merlin.ProcessProperty.PropertyType.number_type, 100),
+            ('Weekly Working Hours', 'working_hours',
+             merlin.ProcessProperty.PropertyType.number_type, 40),
+            ('Working Weeks', 'working_weeks',
+             merlin.ProcessProperty.PropertyType.number_type, 52),
+            ('Training Modifier', 'training',
+             merlin.ProcessProperty.PropertyType.number_type, 0.8),
+            ('Leave Modifier', 'leave',
+             merlin.ProcessProperty.PropertyType.number_type, 0.8),
+            ('Average Overhead Salary', 'avg_oh_salary',
+             merlin.ProcessProperty.PropertyType.number_type, 50000),
+            ('Average Line Staff Salary', 'avg_ls_salary',
+             merlin.ProcessProperty.PropertyType.number_type, 90000)])
+
+    ls_number = merlin.PropertyValue('ls_number')
+    oh_number = merlin.PropertyValue('oh_number')
+    working_hours = merlin.PropertyValue('working_hours')
+    working_weeks = merlin.PropertyValue('working_weeks')
+    training = merlin.PropertyValue('training')
+    leave = merlin.PropertyValue('leave')
+    avg_oh_salary = merlin.PropertyValue('avg_oh_salary')
+    avg_ls_salary = merlin.PropertyValue('avg_ls_salary')
+
     def __init__(
             self,
             name="Staff FTE",
@@ -193,72 +258,15 @@ class StaffFTE(merlin.Process):
             avg_ls_salary=90000
             ):
         super(StaffFTE, self).__init__(name)
-
-        # Define inputs
-        self.add_input("staff_budget", "staff$")
-        self.add_input("staff_accom", "staff_accomodated")
-
-        # Define outputs
-        self.add_output("overhead_staff_fte", "OH_FTE")
-        self.add_output("line_staff_fte", "LS_FTE")
-        self.add_output("used_expenses", "used_staff_expenses")
-
-        # Define properties
-        self.add_property(
-            'Line Staff Number',
-            'ls_number',
-            merlin.ProcessProperty.PropertyType.number_type,
-            ls_number
-        )
-
-        self.add_property(
-            'Overhead Staff Number',
-            'oh_number',
-            merlin.ProcessProperty.PropertyType.number_type,
-            oh_number
-        )
-
-        self.add_property(
-            'Weekly Working Hours',
-            'working_hours',
-            merlin.ProcessProperty.PropertyType.number_type,
-            work_hours
-        )
-
-        self.add_property(
-            'Working Weeks',
-            'working_weeks',
-            merlin.ProcessProperty.PropertyType.number_type,
-            work_weeks
-        )
-
-        self.add_property(
-            'Training Modifier',
-            'training',
-            merlin.ProcessProperty.PropertyType.number_type,
-            training
-        )
-
-        self.add_property(
-            'Leave Modifier',
-            'leave',
-            merlin.ProcessProperty.PropertyType.number_type,
-            leave
-        )
-
-        self.add_property(
-            'Average Overhead Salary',
-            'avg_oh_salary',
-            merlin.ProcessProperty.PropertyType.number_type,
-            avg_oh_salary
-        )
-
-        self.add_property(
-            'Average Line Staff Salary',
-            'avg_ls_salary',
-            merlin.ProcessProperty.PropertyType.number_type,
-            avg_ls_salary
-        )
+        self.apply_schema({
+            'ls_number': ls_number,
+            'oh_number': oh_number,
+            'working_hours': work_hours,
+            'working_weeks': work_weeks,
+            'training': training,
+            'leave': leave,
+            'avg_oh_salary': avg_oh_salary,
+            'avg_ls_salary': avg_ls_salary})
 
     def reset(self):
         pass
@@ -266,19 +274,25 @@ class StaffFTE(merlin.Process):
     def compute(self, tick):
 
         # Salary Calculations
-        total_staff = self.get_prop_value('ls_number') + self.get_prop_value('oh_number')
-        total_ls_salary = self.get_prop_value('ls_number') * self.get_prop_value('avg_ls_salary')
-        total_oh_salary = self.get_prop_value('oh_number') * self.get_prop_value('avg_oh_salary')
+        ls_number = self.ls_number
+        oh_number = self.oh_number
+        total_staff = ls_number + oh_number
+        total_ls_salary = ls_number * self.avg_ls_salary
+        total_oh_salary = oh_number * self.avg_oh_salary
         total_salary = total_ls_salary + total_oh_salary
         salary_per_month = total_salary / 12.0
 
         # Check Constraints
-        staff_accomodated = (total_staff <= self.get_input_available('staff_accom'))
-        staff_paid = (salary_per_month <= self.get_input_available('staff_budget'))
-
-        if not staff_accomodated:
-            self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
+        staff_accomodated = self.require_input(
+            'staff_accom', total_staff, notify=False)
+        staff_paid = self.require_input(
+            'staff_budget', salary_per_month, notify=False)
+
+        sim = self.parent.sim
+        warn = merlin.MerlinMessage.MessageType.warn
+        if not staff_accomodated and sim.wants_message(warn):
+            sim.log_message(
+                warn,
                 self,
                 "{0}_staff_not_accomodated".format(self.id),
                 "There is {{{{insufficent accomodation}}}} for the {{{{number of staff}}}}",
@@ -287,9 +301,9 @@ class StaffFTE(merlin.Process):
                     [self.get_prop('ls_number'), self.get_prop('oh_number')]]
             )
 
-        if not staff_paid:
-            self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
+        if not staff_paid and sim.wants_message(warn):
+            sim.log_message(
+                warn,
                 self,
                 "{0}_staff_not_paid".format(self.id),
                 "There is {{{{insufficent funds}}}} to pay the {{{{monthly staff salary of {0}}}}}".format(salary_per_month),
@@ -301,20 +315,16 @@ class StaffFTE(merlin.Process):
 
         if staff_paid and staff_accomodated:
             # Do normal fte per month outputs
+            working_hours = self.working_hours
+            working_weeks = self.working_weeks
+            training = self.training
+            leave = self.leave
             oh_fte = (
-                self.get_prop_value('oh_number') *
-                self.get_prop_value('working_hours') *
-                self.get_prop_value('working_weeks') *
-                self.get_prop_value('training') *
-                self.get_prop_value('leave')
+                oh_number * working_hours * working_weeks * training * leave
             ) / 12
 
             ls_fte = (
-                self.get_prop_value('ls_number') *
-                self.get_prop_value('working_hours') *
-                self.get_prop_value('working_weeks') *
-                self.get_prop_value('training') *
-                self.get_prop_value('leave')
+                ls_number * working_hours * working_weeks * training * leave
             ) / 12
 
             self.consume_input('staff_budget', salary_per_month)
@@ -326,6 +336,72 @@ class StaffFTE(merlin.Process):
         else:
             self.write_zero_to_all()
 
+    def compute_horizon(self, ticks, inputs, props):
+        ls_number = props['ls_number']
+        oh_number = props['oh_number']
+        total_staff = ls_number + oh_number
+        total_ls_salary = ls_number * props['avg_ls_salary']
+        total_oh_salary = oh_number * props['avg_oh_salary']
+        total_salary = total_ls_salary + total_oh_salary
+        salary_per_month = total_salary / 12.0
+
+        staff_accomodated = (total_staff <= inputs['staff_accom'])
+        staff_paid = (salary_per_month <= inputs['staff_budget'])
+        ok = staff_accomodated & staff_paid
+
+        sim = self.parent.sim
+        warn = merlin.MerlinMessage.MessageType.warn
+        wants_message = sim.wants_message(warn)
+        for i in np.flatnonzero(~ok).tolist():
+            tick = ticks[i].item()
+            if not staff_accomodated[i]:
+                sim.record_shortfall(
+                    self, 'staff_accom', inputs['staff_accom'][i].item(),
+                    total_staff[i].item(), tick=tick)
+                if wants_message:
+                    sim.log_message(
+                        warn,
+                        self,
+                        "{0}_staff_not_accomodated".format(self.id),
+                        "There is {{{{insufficent accomodation}}}} for the {{{{number of staff}}}}",
+                        context=[
+                            self.inputs['staff_accom'].connector,
+                            [self.get_prop('ls_number'), self.get_prop('oh_number')]],
+                        tick=tick)
+            if not staff_paid[i]:
+                sim.record_shortfall(
+                    self, 'staff_budget', inputs['staff_budget'][i].item(),
+                    salary_per_month[i].item(), tick=tick)
+                if wants_message:
+                    sim.log_message(
+                        warn,
+                        self,
+                        "{0}_staff_not_paid".format(self.id),
+                        "There is {{{{insufficent funds}}}} to pay the {{{{monthly staff salary of {0}}}}}".format(
+                            salary_per_month[i].item()),
+                        context=[
+                            self.inputs['staff_budget'].connector,
+                            [self.get_prop('avg_oh_salary'), self.get_prop('avg_ls_salary')]],
+                        tick=tick)
+
+        oh_fte = (
+            oh_number * props['working_hours'] * props['working_weeks'] *
+            props['training'] * props['leave']
+        ) / 12
+        ls_fte = (
+            ls_number * props['working_hours'] * props['working_weeks'] *
+            props['training'] * props['leave']
+        ) / 12
+
+        outputs = {
+            'overhead_staff_fte': np.where(ok, ls_fte, 0.0),
+            'line_staff_fte': np.where(ok, oh_fte, 0.0),
+            'used_expenses': np.where(ok, salary_per_month, 0.0)}
+        consumed = {
+            'staff_budget': np.where(ok, salary_per_month, 0.0),
+            'staff_accom': np.where(ok, total_staff, 0.0)}
+        return outputs, consumed
+
 
 class LeasedAccomodationProvider(merlin.Process):
     """
@@ -335,6 +411,25 @@ class LeasedAccomodationProvider(merlin.Process):
     as servers.
     """
 
+    cost_per_area = merlin.PropertyValue('cost_per_area')
+    area = merlin.PropertyValue('area')
+    accom_type_per_area = merlin.PropertyValue('accom_type_per_area')
+    lease_duration = merlin.PropertyValue('lease duration')
+
+    # the unit of the accomodation output depends on the constructor's
+    # arguments, so the outputs are added by the constructor
+    schema = merlin.ProcessSchema(
+        inputs=[('i_rent$', 'rent$')],
+        properties=[
+            ('cost / area (m2)', 'cost_per_area',
+             merlin.ProcessProperty.PropertyType.number_type, 0),
+            ('area', 'area',
+             merlin.ProcessProperty.PropertyType.number_type, 1.0),
+            ('staff / area (m2)', 'accom_type_per_area',
+             merlin.ProcessProperty.PropertyType.number_type, 1.0),
+            ('lease duration', 'lease duration',
+             merlin.ProcessProperty.PropertyType.date_type, 24)])
+
     def __init__(
             self,
             provided_unit_type="staff_accomodated",
@@ -346,76 +441,39 @@ class LeasedAccomodationProvider(merlin.Process):
             lease_duration=24
             ):
         super(LeasedAccomodationProvider, self).__init__(name)
-
-        # Define inputs
-        self.add_input('i_rent$', 'rent$')
+        self.apply_schema({
+            'cost_per_area': cost_per_area,
+            'area': area,
+            'accom_type_per_area': accom_type_per_area,
+            'lease duration': lease_duration})
+        self.get_prop('accom_type_per_area').name = \
+            '{0} / area (m2)'.format(accom_type)
 
         # Define ouputs
         self.add_output('o_accomodated', provided_unit_type)
         self.add_output('used_expenses', 'used_rent_expenses')
 
-        # Define properties
-        self.add_property(
-            'cost / area (m2)',
-            'cost_per_area',
-            merlin.ProcessProperty.PropertyType.number_type,
-            cost_per_area
-        )
-
-        self.add_property(
-            'area',
-            'area',
-            merlin.ProcessProperty.PropertyType.number_type,
-            area
-        )
-
-        self.add_property(
-            '{0} / area (m2)'.format(accom_type),
-            'accom_type_per_area'.format(accom_type),
-            merlin.ProcessProperty.PropertyType.number_type,
-            accom_type_per_area
-        )
-
-        self.add_property(
-            'lease duration',
-            'lease duration',
-            merlin.ProcessProperty.PropertyType.date_type,
-            lease_duration
-        )
-
     def reset(self):
         pass
 
     def compute(self, tick):
-        total_cost = (
-            self.get_prop_value('cost_per_area') * self.get_prop_value('area')
-        )
-
-        sufficient_rent = (total_cost <= self.get_input_available('i_rent$'))
-        sufficient_lease = (tick <= self.get_prop_value('lease duration'))
+        total_cost = self.cost_per_area * self.area
 
         # check to see if we have enough rent
-        if not sufficient_rent:
-            self.notify_insufficient_input(
-                'rent$',
-                self.get_input_available('i_rent$'),
-                total_cost)
-            self.provide_output('o_accomodated', 0.0)
-
+        sufficient_rent = self.require_input('i_rent$', total_cost)
+        sufficient_lease = (tick <= self.lease_duration)
 
-        if not sufficient_lease:
+        warn = merlin.MerlinMessage.MessageType.warn
+        if not sufficient_lease and self.parent.sim.wants_message(warn):
             self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
+                warn,
                 self,
                 "{0}_lease_expired".format(self.id),
                 "The lease has expired", context=list()
             )
 
         if sufficient_lease and sufficient_rent:
-            accom_provided = (
-                self.get_prop_value('accom_type_per_area') *
-                self.get_prop_value('area')
-            )
+            accom_provided = self.accom_type_per_area * self.area
 
             # consume rent
             self.consume_input('i_rent$', total_cost)
@@ -427,6 +485,12 @@ class LeasedAccomodationProvider(merlin.Process):
 
 
 class BuildingMaintainenceProcess(merlin.Process):
+
+    pure = True
+
+    maintenance_cost = merlin.PropertyValue('monthly maintenance cost')
+    desks_provided = merlin.PropertyValue('desks provided')
+
     def __init__(self, name='Building Maintenance'):
         super(BuildingMaintainenceProcess, self).__init__(name)
 
@@ -458,31 +522,27 @@ class BuildingMaintainenceProcess(merlin.Process):
         # Check requirements
         # logging.debug(self.inputs['$'].connector)
         # logging.debug(self.inputs['$'].connector.value)
-        if (self.get_input_available('$') <
-                self.get_prop_value('monthly maintenance cost')):
-
-            self.parent.sim.log_message(
-                merlin.MerlinMessage.MessageType.warn,
-                self,
-                msg_id="building_maint_underfund",
-                msg=("Building maint is underfunded. {{{{It needs {0}}}}} but" +
-                     " is {{{{receiving only {1}}}}}".format(
-                         self.props['monthly maintenance cost'].get_value(),
-                         self.inputs['$'].connector.value
-                     )),
-                context = [
-                    self.props['monthly maintenance cost'],
-                    self.inputs['$'].connector ]
-                )
-
-            raise merlin.InputRequirementException(
-                self,
-                self.inputs['$'],
-                self.inputs['$'].connector.value,
-                self.props['monthly maintenance cost'].get_value())
+        warn = merlin.MerlinMessage.MessageType.warn
+        maintenance_cost = self.maintenance_cost
+        if not self.require_input('$', maintenance_cost, notify=False):
+
+            if self.parent.sim.wants_message(warn):
+                self.parent.sim.log_message(
+                    warn,
+                    self,
+                    msg_id="building_maint_underfund",
+                    msg=("Building maint is underfunded. {{{{It needs {0}}}}} but" +
+                         " is {{{{receiving only {1}}}}}".format(
+                             self.props['monthly maintenance cost'].get_value(),
+                             self.inputs['$'].connector.value
+                         )),
+                    context = [
+                        self.props['monthly maintenance cost'],
+                        self.inputs['$'].connector ]
+                    )
+            self.write_zero_to_all()
+            return
 
         # Compute outputs
-        self.consume_input('$',
-                           self.get_prop_value('monthly maintenance cost'))
-        self.provide_output('desks',
-                            self.get_prop_value('desks provided'))
+        self.consume_input('$', maintenance_cost)
+        self.provide_output('desks', self.desks_provided)
@@ -0,0 +1,269 @@
+"""
+.. module:: runcache
+
+Caching the results of simulation runs.
+
+A run is determined by the model, the scenarios and the ticks it covers.
+:py:func:`run_key` condenses these into a fingerprint:
+
+* the model's structure, i.e. the :py:mod:`pymerlin.snapshot` without the
+  values below, is only hashed again after
+  :py:attr:`pymerlin.merlin.Simulation.structure_version` changed,
+* the property defaults and schedules, endpoint biases and output minimums
+  are hashed on every call, which is cheap compared to a run,
+* the scenarios are compiled into the schedule of the actions executed in
+  the run, so e.g. events after the last tick do not matter.
+
+Changes which do not go through the methods updating the structure version,
+like renaming an entity or editing the parameters of a process, need a call
+of :py:meth:`pymerlin.merlin.Simulation.structure_changed`.
+
+:py:func:`cached_run` looks the key up in a cache, i.e. any object with
+``get(key)`` and ``put(key, result)`` methods like :py:class:`MemoryCache`
+and :py:class:`DirectoryCache`, and only runs the simulation on a miss::
+
+    cache = runcache.MemoryCache()
+    result = runcache.cached_run(sim, cache, scenarios=scenarios)
+    result['telemetry'], result['shortfalls']
+"""
+import collections
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Tuple  # @UnusedImports
+
+from pymerlin import merlin
+from pymerlin import snapshot
+
+
+KEY_VERSION = 2
+"""part of every key, incremented when the results of a run change"""
+
+
+def model_fingerprint(sim: merlin.Simulation) -> str:
+    """
+    :returns: a hex digest, equal for models which produce the same runs,
+        e.g. a model and its :py:meth:`pymerlin.merlin.Simulation.clone`
+    """
+    version, digest, (props, endpoints, outputs) = _structure(sim)
+    values = (
+        sim.message_threshold.name,
+        sim.seed,
+        # a run starts from the defaults
+        [(pp.default, pp.schedule and pp.schedule.serialize())
+         for pp in props],
+        [ep.bias for ep in endpoints],
+        [o.minimum for o in outputs])
+    return _hash(digest, repr(values))
+
+
+def scenario_fingerprint(
+        scenarios: Iterable[merlin.Scenario],
+        start: int=1,
+        end: int=None) -> str:
+    """
+    :returns: a hex digest of the actions the scenarios execute in the ticks
+        ``start`` to ``end`` (inclusive, no limit if None), in the order of
+        execution.
+    """
+    schedule = list()
+    for i, s in enumerate(scenarios):
+        for e in s.events:
+            tick = e.time + s.start_offset
+            if tick < start or (end is not None and tick > end):
+                continue
+            # events of a scenario at the same tick run in no given order
+            schedule.append(
+                (tick, i, repr([_canonical_action(a) for a in e.actions])))
+    schedule.sort()
+    return _hash(repr(schedule))
+
+
+def run_key(
+        sim: merlin.Simulation,
+        start: int=1,
+        end: int=-1,
+        scenarios: Iterable[merlin.Scenario]=()) -> str:
+    """
+    :returns: the cache key of ``sim.run(start, end, scenarios)``
+    """
+    # the same tick range as Simulation.run
+    sim_start = start if start > 1 else 1
+    sim_end = end if end > 0 else sim.num_steps
+    return _hash(
+        str(KEY_VERSION),
+        model_fingerprint(sim),
+        scenario_fingerprint(scenarios, sim_start, sim_end),
+        str(sim_start),
+        str(sim_end))
+
+
+def cached_run(
+        sim: merlin.Simulation,
+        cache,
+        start: int=1,
+        end: int=-1,
+        scenarios: List[merlin.Scenario]=()) -> Dict[str, Any]:
+    """
+    :param cache: e.g. a :py:class:`MemoryCache`
+    :returns: ``{'telemetry': ..., 'shortfalls': ...}``, the
+        :py:meth:`pymerlin.merlin.Simulation.get_sim_telemetry` of the run,
+        including its messages, and its
+        :py:attr:`pymerlin.merlin.Simulation.shortfalls`. Shared with the
+        cache, so not to be modified.
+
+    On a miss ``sim`` is run and rolled back afterwards, on a hit it is
+    left alone. Models without a :py:attr:`pymerlin.merlin.Simulation.seed`
+    draw new random numbers in every run, so they are always run and their
+    results are not cached.
+    """
+    key = None if sim.seed is None else run_key(sim, start, end, scenarios)
+    result = None if key is None else cache.get(key)
+    if result is None:
+        try:
+            sim.run(start=start, end=end, scenarios=list(scenarios))
+            result = {
+                'telemetry': sim.get_sim_telemetry(),
+                'shortfalls': list(sim.shortfalls)}
+        finally:
+            sim.rollback()
+        if key is not None:
+            cache.put(key, result)
+    return result
+
+
+class MemoryCache:
+    """
+    Keeps the results of the last ``max_entries`` runs looked up.
+    """
+
+    def __init__(self, max_entries: int=128):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # type: Dict[str, Any]
+
+    def get(self, key: str) -> Any:
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: Any) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DirectoryCache:
+    """
+    Keeps results pickled in a directory, one file per key, so they are
+    shared between processes and survive restarts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.pickle')
+
+    def get(self, key: str) -> Any:
+        try:
+            with open(self._file(key), 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, result: Any) -> None:
+        # written to a temporary file first, readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+def _hash(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def _canonical(value: Any) -> Any:
+    if isinstance(value, merlin.SimObject):
+        return (value.__class__.__name__, value.id)
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, merlin.PropertySchedule):
+        return _canonical(value.serialize())
+    if isinstance(value, type):
+        if issubclass(value, merlin.Process):
+            return merlin.process_registry.get_name(value)
+        return value.__qualname__
+    if isinstance(value, dict):
+        return sorted((repr(k), _canonical(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return sorted(repr(_canonical(v)) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def _canonical_action(action: merlin.Action) -> Any:
+    state = {k: v for k, v in vars(action).items()
+             if k not in ('id', 'name', '_telemetry', '_binding')}
+    return (action.__class__.__name__, _canonical(state))
+
+
+def _structure(sim: merlin.Simulation) -> Tuple[int, str, tuple]:
+    # (structure version, structure digest, objects with values)
+    cached = sim._fingerprint_cache
+    if cached is not None and cached[0] == sim.structure_version:
+        return cached
+
+    data = snapshot.to_dict(sim)
+    entities = snapshot._collect_entities(sim)
+    props, endpoints = list(), list()
+    for e_rec in data['entities']:
+        e = entities[e_rec['id']]
+        procs = {p.id: p for p in e.get_processes()}
+        for p_rec in e_rec['processes']:
+            p = procs[p_rec['id']]
+            for k in sorted(p_rec['props']):
+                pp_rec = p_rec['props'][k]
+                del pp_rec['default'], pp_rec['value'], pp_rec['schedule']
+                props.append(p.props[k])
+        o_cons = {o.id: o for o in e.outputs}
+        for c_rec in e_rec['outputs']:
+            eps = {ep.id: ep
+                   for ep in o_cons[c_rec['id']].get_endpoint_objects()}
+            for ep_rec in c_rec['endpoints']:
+                del ep_rec['bias']
+                endpoints.append(eps[ep_rec['id']])
+    by_id = {o.id: o for o in sim.outputs}
+    outputs = list()
+    for o_rec in data['outputs']:
+        del o_rec['minimum']
+        outputs.append(by_id[o_rec['id']])
+    # the run length is part of the key, the simulation's id is not used
+    # and the message threshold is hashed with the values
+    del data['simulation']
+
+    digest = _hash(json.dumps(data, sort_keys=True, default=repr))
+    cached = (sim.structure_version, digest, (props, endpoints, outputs))
+    sim._fingerprint_cache = cached
+    return cached
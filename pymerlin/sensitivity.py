@@ -0,0 +1,172 @@
+"""
+.. module:: sensitivity
+
+Which properties matter most for an output.
+
+:py:func:`analyse` runs the model once as it is and twice for every
+property, with the property's values lowered and raised by ``step``, a
+fraction of them::
+
+    result = sensitivity.analyse(
+        sim, [staff_number.id, salary.id], [output.id], step=0.1)
+    result['elasticities'][output.id][staff_number.id]
+    for bar in result['rankings'][output.id]:
+        bar['name'], bar['low'], bar['high']
+
+An output is measured by the sum of its results over the ticks run. The
+elasticity of an output to a property is the relative change of the output
+divided by the relative change of the property, from the central difference
+of the two variants, None if the property or the baseline output is zero.
+The rankings of an output list the properties by the width of the range the
+output spans between the two variants, widest first, which is the order of
+the bars of a tornado chart.
+
+The values of a property are its default, the value runs start with, or
+the values of its schedule, which are all lowered and raised alike.
+
+The variants are applied by :py:func:`pymerlin.montecarlo.property_overlay`
+and rolled back, so the model is not changed. All runs use the same seed,
+returned with the results, so stochastic processes draw the same numbers in
+every variant. With ``workers`` > 1 the runs are spread over worker
+processes by :py:func:`pymerlin.montecarlo.map_runs`.
+"""
+from typing import (Any, Dict, Iterable, List, Mapping,  # @UnusedImports
+                    Tuple)  # @UnusedImports
+
+import numpy as np
+
+from pymerlin import merlin
+from pymerlin import montecarlo
+
+
+_NUMBER_TYPES = (merlin.ProcessProperty.PropertyType.number_type,
+                 merlin.ProcessProperty.PropertyType.int_type)
+
+
+def analyse(
+        sim: merlin.Simulation,
+        property_ids: Iterable[int],
+        output_ids: Iterable[int]=None,
+        step: float=0.1,
+        start: int=1,
+        end: int=-1,
+        scenarios: List[merlin.Scenario]=(),
+        seed: int=None,
+        workers: int=1) -> Dict[str, Any]:
+    """
+    :param property_ids: the number properties to vary
+    :param output_ids: the outputs measured, all by default
+    :param step: the fraction of a property's values they are lowered and
+        raised by
+    :param start: see :py:meth:`pymerlin.merlin.Simulation.run`
+    :param end: see :py:meth:`pymerlin.merlin.Simulation.run`
+    :param scenarios: executed in every run, after the variant
+    :param seed: the seed of all runs, :py:attr:`.Simulation.seed` if None
+        and a new one if that is None too
+    :param workers: the number of worker processes, with 1 the runs are
+        executed by ``sim`` itself
+    :returns: ``{'seed': seed, 'baseline': {output id: total},
+        'elasticities': {output id: {property id: elasticity}},
+        'rankings': {output id: bars}}``, the bars being
+        ``{'property', 'name', 'low', 'high', 'elasticity'}``, with the
+        output totals at the lowered and raised value
+    :raises pymerlin.merlin.MerlinException: if a property or output is not
+        found, a property is not a number or ``step`` not between 0 and 1
+    """
+    if not 0.0 < step < 1.0:
+        raise merlin.MerlinException(
+            "step {0} is not between 0 and 1".format(step))
+    props = list()
+    for prop_id in property_ids:
+        prop = sim.find_sim_object(prop_id, 'ProcessProperty')
+        if prop is None:
+            raise merlin.MerlinException(
+                "property {0} not found".format(prop_id))
+        if prop.type not in _NUMBER_TYPES:
+            raise merlin.MerlinException(
+                "property {0} is not a number".format(prop_id))
+        props.append(prop)
+    outputs = {o.id: o for o in sim.outputs}
+    if output_ids is None:
+        output_ids = sorted(outputs)
+    output_ids = list(output_ids)
+    for o_id in output_ids:
+        if o_id not in outputs:
+            raise merlin.MerlinException(
+                "output {0} not found".format(o_id))
+
+    if seed is None:
+        seed = sim.seed
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+
+    # the baseline, then every property lowered and raised
+    variants = [{}]  # type: List[Dict[int, Any]]
+    for prop in props:
+        variants.append({prop.id: _scaled(prop, 1.0 - step, start)})
+        variants.append({prop.id: _scaled(prop, 1.0 + step, start)})
+    plan = (start, end, list(scenarios), seed, output_ids)
+
+    totals = np.array(list(montecarlo.map_runs(
+        sim, _simulate, plan, variants, workers)))
+    baseline = totals[0]
+    low, high = totals[1::2], totals[2::2]
+    elasticities = dict()  # type: Dict[int, Dict[int, float]]
+    rankings = dict()  # type: Dict[int, List[Dict[str, Any]]]
+    for j, o_id in enumerate(output_ids):
+        elasticities[o_id] = dict()
+        bars = list()
+        for i, prop in enumerate(props):
+            elasticity = None
+            if baseline[j] != 0.0 and _nonzero(_scaled(prop, 1.0, start)):
+                elasticity = ((high[i, j] - low[i, j]) / baseline[j] /
+                              (2.0 * step)).item()
+            elasticities[o_id][prop.id] = elasticity
+            bars.append({
+                'property': prop.id,
+                'name': prop.name,
+                'low': low[i, j].item(),
+                'high': high[i, j].item(),
+                'elasticity': elasticity})
+        bars.sort(key=lambda b: abs(b['high'] - b['low']), reverse=True)
+        rankings[o_id] = bars
+
+    return {
+        'seed': seed,
+        'baseline': dict(zip(output_ids, baseline.tolist())),
+        'elasticities': elasticities,
+        'rankings': rankings}
+
+
+def _scaled(
+        prop: merlin.ProcessProperty,
+        factor: float,
+        start: int) -> Any:
+    # the values of the property in a run from start, multiplied by factor
+    if prop.schedule is None:
+        return float(prop.default) * factor
+    first = start if start > 1 else 1
+    changes = {t: float(v) * factor for t, v in prop.schedule.changes.items()}
+    if not any(t <= first for t in changes):
+        changes[first] = float(prop.default) * factor
+    return merlin.PropertySchedule(changes)
+
+
+def _nonzero(values: Any) -> bool:
+    if isinstance(values, merlin.PropertySchedule):
+        return any(v != 0.0 for v in values.changes.values())
+    return values != 0.0
+
+
+def _simulate(
+        sim: merlin.Simulation,
+        plan: tuple,
+        variant: Mapping[int, Any]) -> List[float]:
+    # the totals of the outputs in a run of the variant
+    start, end, scenarios, seed, output_ids = plan
+    overlay = montecarlo.property_overlay(
+        sim, variant, start if start > 1 else 1)
+    sim.run(start, end, [overlay] + scenarios, rollback=True, seed=seed)
+    outputs = {o.id: o for o in sim.outputs}
+    return [float(sum(outputs[o_id].result)) for o_id in output_ids]
+
@@ -0,0 +1,353 @@
+"""
+.. module:: snapshot
+
+Saving and loading a built :py:class:`pymerlin.merlin.Simulation`.
+
+A snapshot holds the model, i.e. the entities with their hierarchy,
+connectors, endpoint biases and processes (their class, constructor
+parameters and property values) and the outputs, all with their ids. Run
+state, i.e. telemetry, messages and errors, is not included, neither are the
+:py:attr:`pymerlin.merlin.Simulation.ruleset` and
+:py:attr:`pymerlin.merlin.Simulation.initial_state` the model was built from.
+
+Processes are rebuilt by calling their class with the parameters they were
+created with by :py:meth:`pymerlin.merlin.Entity.create_process`, the class
+is found through :py:data:`pymerlin.merlin.process_registry`.
+
+All objects are listed in the order of their ids, so saving a loaded
+snapshot produces the same bytes again::
+
+    data = snapshot.dumps(sim)
+    assert snapshot.dumps(snapshot.loads(data)) == data
+"""
+import json
+import operator
+from typing import Any, Dict, List, Tuple  # @UnusedImports
+
+from pymerlin import merlin
+
+
+FORMAT_VERSION = 1
+"""incremented on incompatible changes of the snapshot layout"""
+
+_id = operator.attrgetter('id')
+
+
+def to_dict(sim: merlin.Simulation) -> Dict[str, Any]:
+    """
+    :returns: the snapshot of ``sim`` as JSON compatible dictionary
+    """
+    entities = _collect_entities(sim)
+    top_level = {e.id for e in sim.get_entities()}
+    sources = {e.id for e in sim.source_entities}
+    return {
+        'format': FORMAT_VERSION,
+        'simulation': {
+            'id': sim.id,
+            'name': sim.name,
+            'num_steps': sim.num_steps,
+            'message_threshold': sim.message_threshold.name,
+            'seed': sim.seed,
+        },
+        'entities': [
+            _entity_to_dict(entities[e_id], e_id in top_level,
+                            e_id in sources)
+            for e_id in sorted(entities)],
+        'outputs': [_output_to_dict(o)
+                    for o in sorted(sim.outputs, key=_id)],
+    }
+
+
+def from_dict(
+        data: Dict[str, Any],
+        sim: merlin.Simulation=None) -> merlin.Simulation:
+    """
+    :param data: a snapshot created by :py:func:`to_dict`
+    :param sim: an empty simulation to load the model into, a new one by
+        default
+    :raises ValueError: if ``data`` has an unknown format
+    :returns: the simulation
+    """
+    if data.get('format') != FORMAT_VERSION:
+        raise ValueError(
+            "unsupported snapshot format {0}".format(data.get('format')))
+    # the ids are taken from the snapshot
+    with merlin._placeholder_id_scope():
+        return _load(data, sim or merlin.Simulation())
+
+
+def _load(data: Dict[str, Any], sim: merlin.Simulation) -> merlin.Simulation:
+    s = data['simulation']
+    sim.id = s['id']
+    sim.name = s['name']
+    sim.num_steps = s['num_steps']
+    sim.message_threshold = merlin.MerlinMessage.MessageType[
+        s['message_threshold']]
+    sim.seed = s.get('seed', 0)
+
+    # the connectors are created first, the references between them and
+    # the entities are set up in a second pass
+    connectors = dict()  # type: Dict[int, merlin.Connector]
+    entities = dict()  # type: Dict[int, merlin.Entity]
+    for rec in data['entities']:
+        e = merlin.Entity(sim, rec['name'], rec['attributes'])
+        e.id = rec['id']
+        entities[e.id] = e
+        e.inputs.update(_load_input(c, e, connectors) for c in rec['inputs'])
+        e.outputs.update(
+            _load_output(c, e, connectors) for c in rec['outputs'])
+
+    for rec in data['outputs']:
+        o = merlin.Output(rec['type'], rec['name'])
+        o.id = rec['id']
+        o.minimum = rec['minimum']
+        o.attributes = set(rec['attributes'])
+        o.sim = sim
+        o.inputs.update(_load_input(c, o, connectors) for c in rec['inputs'])
+        sim.outputs.add(o)
+
+    for rec in data['entities']:
+        e = entities[rec['id']]
+        if rec['parent'] is not None:
+            e.parent = entities[rec['parent']]
+        e._children.update(entities[c] for c in rec['children'])
+        if rec['top_level']:
+            sim._entities.add(e)
+        if rec['source']:
+            sim.source_entities.add(e)
+        for c in rec['outputs']:
+            o_con = connectors[c['id']]
+            for ep_rec in c['endpoints']:
+                ep = merlin.OutputConnector.Endpoint(
+                    connectors[ep_rec['connector']], ep_rec['bias'])
+                ep.id = ep_rec['id']
+                o_con._endpoints.add(ep)
+        for p in rec['processes']:
+            _load_process(p, e, connectors)
+
+    for c in connectors.values():
+        if isinstance(c, merlin.InputConnector) and c._source is not None:
+            c._source = connectors[c._source]
+
+    sim.structure_changed()
+    return sim
+
+
+def dumps(sim: merlin.Simulation) -> str:
+    """
+    :returns: the snapshot of ``sim`` as JSON string
+    """
+    return json.dumps(to_dict(sim), sort_keys=True, separators=(',', ':'))
+
+
+def loads(data: str) -> merlin.Simulation:
+    """
+    :param str data: a snapshot created by :py:func:`dumps`
+    """
+    return from_dict(json.loads(data))
+
+
+def save(sim: merlin.Simulation, path: str) -> None:
+    """
+    Writes the snapshot of ``sim`` to the file ``path``.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(dumps(sim))
+
+
+def load(path: str) -> merlin.Simulation:
+    """
+    :returns: the simulation saved to ``path`` by :py:func:`save`
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return loads(f.read())
+
+
+def _collect_entities(sim: merlin.Simulation) -> Dict[int, merlin.Entity]:
+    # child entities are not necessarily in the simulation's entity set
+    entities = dict()  # type: Dict[int, merlin.Entity]
+    pending = list(sim.get_entities())
+    while pending:
+        e = pending.pop()
+        if e.id not in entities:
+            entities[e.id] = e
+            pending.extend(e.get_children())
+    return entities
+
+
+def _input_to_dict(i_con: merlin.InputConnector) -> Dict[str, Any]:
+    return {
+        'id': i_con.id,
+        'name': i_con.name,
+        'type': i_con.type,
+        'additive_write': i_con.additive_write,
+        'source': None if i_con.source is None else i_con.source.id,
+    }
+
+
+def _output_connector_to_dict(
+        o_con: merlin.OutputConnector) -> Dict[str, Any]:
+    return {
+        'id': o_con.id,
+        'name': o_con.name,
+        'type': o_con.type,
+        'apportioning': o_con.apportioning.name,
+        'endpoints': [
+            {'id': ep.id, 'connector': ep.connector.id, 'bias': ep.bias}
+            for ep in sorted(o_con.get_endpoint_objects(), key=_id)],
+    }
+
+
+def _process_to_dict(proc: merlin.Process) -> Dict[str, Any]:
+    return {
+        'id': proc.id,
+        'name': proc.name,
+        'class': merlin.process_registry.get_name(type(proc)),
+        'priority': proc.priority,
+        'params': proc.default_params,
+        'inputs': {k: {'id': pi.id,
+                       'name': pi.name,
+                       'type': pi.type,
+                       'connector': _connector_id(pi.connector)}
+                   for k, pi in proc.inputs.items()},
+        'outputs': {k: {'id': po.id,
+                        'name': po.name,
+                        'type': po.type,
+                        'connector': _connector_id(po.connector)}
+                    for k, po in proc.outputs.items()},
+        'props': {k: {'id': pp.id,
+                      'name': pp.name,
+                      'type': pp.type.name,
+                      'default': pp.default,
+                      'value': pp.get_value(),
+                      'readonly': pp.readonly,
+                      'min_val': pp.min_val,
+                      'max_val': pp.max_val,
+                      'schedule': (None if pp.schedule is None
+                                   else pp.schedule.serialize())}
+                  for k, pp in proc.props.items()},
+    }
+
+
+def _connector_id(connector: merlin.Connector) -> int:
+    return None if connector is None else connector.id
+
+
+def _entity_to_dict(
+        e: merlin.Entity,
+        top_level: bool,
+        source: bool) -> Dict[str, Any]:
+    return {
+        'id': e.id,
+        'name': e.name,
+        'attributes': sorted(e.attributes),
+        'parent': None if e.parent is None else e.parent.id,
+        'children': sorted(c.id for c in e.get_children()),
+        'top_level': top_level,
+        'source': source,
+        'inputs': [_input_to_dict(c) for c in sorted(e.inputs, key=_id)],
+        'outputs': [_output_connector_to_dict(c)
+                    for c in sorted(e.outputs, key=_id)],
+        'processes': [_process_to_dict(p)
+                      for p in sorted(e.get_processes(), key=_id)],
+    }
+
+
+def _output_to_dict(o: merlin.Output) -> Dict[str, Any]:
+    return {
+        'id': o.id,
+        'name': o.name,
+        'type': o.type,
+        'minimum': o.minimum,
+        'attributes': sorted(o.attributes),
+        'inputs': [_input_to_dict(c) for c in sorted(o.inputs, key=_id)],
+    }
+
+
+def _load_input(
+        rec: Dict[str, Any],
+        parent: merlin.SimObject,
+        connectors: Dict[int, merlin.Connector]) -> merlin.InputConnector:
+    # the source is an id until all connectors exist
+    i_con = merlin.InputConnector(
+        rec['type'], parent, rec['name'], source=rec['source'],
+        additive_write=rec['additive_write'])
+    i_con.id = rec['id']
+    connectors[i_con.id] = i_con
+    return i_con
+
+
+def _load_output(
+        rec: Dict[str, Any],
+        parent: merlin.Entity,
+        connectors: Dict[int, merlin.Connector]) -> merlin.OutputConnector:
+    o_con = merlin.OutputConnector(
+        rec['type'], parent, rec['name'],
+        apportioning=merlin.OutputConnector.ApportioningRules[
+            rec['apportioning']])
+    o_con.id = rec['id']
+    connectors[o_con.id] = o_con
+    return o_con
+
+
+def _load_process(
+        rec: Dict[str, Any],
+        parent: merlin.Entity,
+        connectors: Dict[int, merlin.Connector]) -> merlin.Process:
+    process_class = merlin.process_registry.get_class(rec['class'])
+    proc = process_class(**rec['params'])  # type: merlin.Process
+    proc.default_params = rec['params']
+    proc.id = rec['id']
+    proc.name = rec['name']
+    proc.priority = rec['priority']
+    proc.parent = parent
+    parent._processes.setdefault(proc.priority, set()).add(proc)
+
+    # the constructor creates the inputs, outputs and properties, they only
+    # differ if they were changed after the process was created
+    for k in proc.inputs.keys() - rec['inputs'].keys():
+        del proc.inputs[k]
+    for k, io in rec['inputs'].items():
+        if k not in proc.inputs:
+            proc.add_input(io['name'], io['type'])
+        _load_process_io(proc.inputs[k], io, connectors)
+    for k in proc.outputs.keys() - rec['outputs'].keys():
+        del proc.outputs[k]
+    for k, io in rec['outputs'].items():
+        if k not in proc.outputs:
+            proc.add_output(io['name'], io['type'])
+        _load_process_io(proc.outputs[k], io, connectors)
+
+    for k in proc.props.keys() - rec['props'].keys():
+        proc.remove_property(k)
+    for k, pp_rec in rec['props'].items():
+        property_type = merlin.ProcessProperty.PropertyType[pp_rec['type']]
+        if k not in proc.props:
+            proc.add_property(pp_rec['name'], k, property_type,
+                              pp_rec['default'])
+        pp = proc.props[k]
+        pp.id = pp_rec['id']
+        pp.name = pp_rec['name']
+        pp.type = property_type
+        pp.default = pp_rec['default']
+        pp._value = pp_rec['value']
+        pp.readonly = pp_rec['readonly']
+        pp.min_val = pp_rec['min_val']
+        pp.max_val = pp_rec['max_val']
+        schedule = pp_rec.get('schedule')
+        if schedule is not None:
+            pp.set_schedule(merlin.PropertySchedule.create_from_dict(schedule))
+    # names may have changed since the constructor looked properties up
+    proc._prop_handles.clear()
+    return proc
+
+
+def _load_process_io(
+        io: merlin.SimObject,
+        rec: Dict[str, Any],
+        connectors: Dict[int, merlin.Connector]) -> None:
+    io.id = rec['id']
+    io.name = rec['name']
+    io.type = rec['type']
+    io.connector = (None if rec['connector'] is None
+                    else connectors[rec['connector']])
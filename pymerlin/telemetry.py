@@ -0,0 +1,518 @@
+"""
+.. module:: telemetry
+
+Array-backed views and queries on the telemetry produced by
+:py:meth:`pymerlin.merlin.Simulation.get_sim_telemetry`.
+
+The telemetry of a run is a list of ``{'type', 'id', 'name', 'data'}``
+dictionaries, where ``data`` maps a channel name (e.g. ``'value'``) to a
+time series. A :py:class:`TelemetryFrame` packs all channels of one run into
+a single two-dimensional array so that questions about a whole run, like
+"what changed versus baseline?", are answered with a few vectorised
+operations instead of nested dictionary walks.
+"""
+import bisect
+from typing import (Any, Dict, Iterable, Iterator, List,  # @UnusedImports
+                    Mapping, Tuple, Union)  # @UnusedImports
+
+import numpy as np
+
+
+ChannelKey = Tuple[int, str]
+
+
+class RunLengthSeries:
+    """
+    A telemetry series stored as runs of equal values.
+
+    Behaves like the ``list`` normally used for a telemetry channel
+    (``append``, ``len``, indexing, slicing, iteration and comparison with
+    lists), but only stores a ``(start index, value)`` pair for each run of
+    equal consecutive values. Series which are constant or only change at
+    scenario events, like process property values, shrink to a few entries.
+    """
+
+    __slots__ = ('_starts', '_values', '_length')
+
+    def __init__(self, values: Iterable[Any]=()):
+        self._starts = list()  # type: List[int]
+        self._values = list()  # type: List[Any]
+        self._length = 0
+        for v in values:
+            self.append(v)
+
+    def append(self, value: Any) -> None:
+        if self._length == 0 or not _same(self._values[-1], value):
+            self._starts.append(self._length)
+            self._values.append(value)
+        self._length += 1
+
+    def runs(self) -> List[Tuple[int, Any]]:
+        """
+        :returns: ``(start index, value)`` of every run
+        """
+        return list(zip(self._starts, self._values))
+
+    def to_list(self) -> List[Any]:
+        output = list()
+        ends = self._starts[1:] + [self._length]
+        for start, end, value in zip(self._starts, ends, self._values):
+            output += [value] * (end - start)
+        return output
+
+    def to_array(self) -> np.ndarray:
+        if self._length == 0:
+            return np.zeros(0)
+        counts = np.diff(np.append(self._starts, self._length))
+        return np.repeat(np.array(self._values, dtype=float), counts)
+
+    def _value_at(self, index: int) -> Any:
+        return self._values[bisect.bisect_right(self._starts, index) - 1]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._value_at(i)
+                    for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("telemetry index out of range")
+        return self._value_at(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        ends = self._starts[1:] + [self._length]
+        for start, end, value in zip(self._starts, ends, self._values):
+            for _ in range(end - start):
+                yield value
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RunLengthSeries):
+            return (self._length == other._length and
+                    self._starts == other._starts and
+                    self._values == other._values)
+        try:
+            return len(other) == self._length and list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return "RunLengthSeries({0})".format(self.runs())
+
+
+def _same(a: Any, b: Any) -> bool:
+    # 1 == 1.0 == True, but the recorded type should survive the compression
+    return type(a) is type(b) and a == b
+
+
+def expand(series: Iterable[Any]) -> List[Any]:
+    """
+    :returns: the series as plain list, e.g. for a json serialisation
+    """
+    if isinstance(series, RunLengthSeries):
+        return series.to_list()
+    return series
+
+
+class TelemetryFrame:
+    """
+    All numeric telemetry channels of one simulation run.
+
+    Row ``i`` of :py:attr:`values` holds the series of channel
+    ``keys[i] == (object id, channel name)``. Series shorter than the longest
+    one are padded with ``nan``.
+    """
+
+    def __init__(
+            self,
+            keys: List[ChannelKey],
+            objects: Dict[int, Dict[str, Any]],
+            values: np.ndarray,
+            lengths: np.ndarray,
+            start_tick: int=1):
+        """
+        :param keys: ``(object id, channel name)`` for every row of values
+        :param objects: ``{id: {'type': ..., 'name': ...}}`` of all objects
+            found in the run, including those without numeric channels
+        :param values: float array of shape ``(len(keys), ticks)``
+        :param lengths: the unpadded length of every series
+        :param int start_tick: the tick of the first column
+        """
+        self.keys = keys
+        self.objects = objects
+        self.values = values
+        self.lengths = lengths
+        self.start_tick = start_tick
+        self.index = {k: i for i, k in enumerate(keys)}  # type: Dict[ChannelKey, int]
+
+    @classmethod
+    def from_telemetry(
+            cls,
+            telemetry: Iterable[Mapping[str, Any]],
+            start_tick: int=1) -> 'TelemetryFrame':
+        """
+        :param telemetry: the result of
+            :py:meth:`pymerlin.merlin.Simulation.get_sim_telemetry`
+        :param int start_tick: the tick of the first recorded value
+        """
+        keys = list()  # type: List[ChannelKey]
+        series = list()
+        objects = dict()  # type: Dict[int, Dict[str, Any]]
+
+        for to in telemetry:
+            if 'data' not in to:
+                # run messages
+                continue
+            objects[to['id']] = {'type': to['type'], 'name': to['name']}
+            for channel, data in to['data'].items():
+                keys.append((to['id'], channel))
+                series.append(data)
+
+        lengths = np.fromiter(
+            (len(s) for s in series), dtype=np.int64, count=len(series))
+        width = int(lengths.max()) if len(series) else 0
+        values = np.full((len(series), width), np.nan)
+        for row, s in enumerate(series):
+            if len(s):
+                values[row, :len(s)] = as_array(s)
+
+        return cls(keys, objects, values, lengths, start_tick)
+
+    @classmethod
+    def from_simulation(cls, sim) -> 'TelemetryFrame':
+        """
+        :param pymerlin.merlin.Simulation sim: a simulation after a run
+        """
+        return cls.from_telemetry(sim.get_sim_telemetry())
+
+    def get(self, so_id: int, channel: str='value') -> Union[np.ndarray, None]:
+        """
+        :returns: the unpadded series of the channel or None
+        """
+        row = self.index.get((so_id, channel))
+        if row is None:
+            return None
+        return self.values[row, :self.lengths[row]]
+
+
+def as_array(series: Iterable[Any]) -> np.ndarray:
+    """
+    converts a telemetry series to a float array, ``None`` becomes ``nan``.
+
+    Series objects providing a ``to_array`` method are asked directly.
+    """
+    if hasattr(series, 'to_array'):
+        return series.to_array()
+    return np.array(list(series), dtype=float)
+
+
+AGGREGATIONS = ('sum', 'mean', 'min', 'max', 'last')
+"""the reductions supported by :py:func:`aggregate`"""
+
+
+def window_bounds(
+        length: int,
+        window: int,
+        start_tick: int=1,
+        align: int=1) -> np.ndarray:
+    """
+    :param int length: the number of ticks of the series
+    :param int window: the number of ticks per window, e.g. 12 for years
+    :param int start_tick: the tick of the first value
+    :param int align: a tick at which a window starts. The default ``1``
+        matches the financial year convention ``tick % 12 == 1`` of
+        :py:class:`pymerlin.processes.BudgetProcess`.
+    :returns: the column index at which each window starts
+
+    The first and last window may be partial, if ``start_tick`` is not
+    aligned or the series ends in the middle of a window.
+    """
+    if window < 1:
+        raise ValueError("window needs to be a positive number of ticks")
+    if length == 0:
+        return np.zeros(0, dtype=np.int64)
+    first = (align - start_tick) % window
+    bounds = np.arange(first, length, window, dtype=np.int64)
+    if first != 0:
+        bounds = np.concatenate(([0], bounds))
+    return bounds
+
+
+def window_ticks(
+        length: int,
+        window: int,
+        start_tick: int=1,
+        align: int=1) -> List[int]:
+    """
+    :returns: the first tick of each window, see :py:func:`window_bounds`
+    """
+    return [int(b) + start_tick
+            for b in window_bounds(length, window, start_tick, align)]
+
+
+def aggregate(
+        values: Union[np.ndarray, Iterable[Any]],
+        window: int,
+        how: str='sum',
+        start_tick: int=1,
+        align: int=1) -> np.ndarray:
+    """
+    :param values: a series or a two-dimensional array with one series
+        per row, ``nan`` values are ignored.
+    :param int window: the number of ticks per window
+    :param str how: one of :py:data:`AGGREGATIONS`
+    :param int start_tick: the tick of the first column
+    :param int align: a tick at which a window starts
+    :returns: the reduced values, one column per window, ``nan`` for
+        windows without any value.
+
+    e.g. the yearly totals of 48 monthly values starting at tick 1 are
+    ``aggregate(monthly, 12)``, four numbers.
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError("unknown aggregation {0}".format(how))
+
+    values = np.asarray(values, dtype=float)
+    one_dimensional = (values.ndim == 1)
+    if one_dimensional:
+        values = values.reshape(1, -1)
+
+    bounds = window_bounds(values.shape[1], window, start_tick, align)
+    if len(bounds) == 0:
+        result = np.zeros((values.shape[0], 0))
+        return result[0] if one_dimensional else result
+
+    valid = ~np.isnan(values)
+    count = np.add.reduceat(valid, bounds, axis=1)
+
+    if how in ('sum', 'mean'):
+        result = np.add.reduceat(np.where(valid, values, 0.0), bounds, axis=1)
+        if how == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                result = result / count
+    elif how == 'min':
+        result = np.minimum.reduceat(
+            np.where(valid, values, np.inf), bounds, axis=1)
+    elif how == 'max':
+        result = np.maximum.reduceat(
+            np.where(valid, values, -np.inf), bounds, axis=1)
+    else:
+        # index of the last valid value at or before each column
+        columns = np.arange(values.shape[1])
+        last_valid = np.maximum.accumulate(
+            np.where(valid, columns, -1), axis=1)
+        ends = np.append(bounds[1:], values.shape[1]) - 1
+        picked = last_valid[:, ends]
+        result = np.take_along_axis(values, np.maximum(picked, 0), axis=1)
+
+    result = np.where(count > 0, result, np.nan)
+    return result[0] if one_dimensional else result
+
+
+def aggregate_telemetry(
+        telemetry: Iterable[Mapping[str, Any]],
+        window: int,
+        how: str='sum',
+        start_tick: int=1,
+        align: int=1) -> List[Dict[str, Any]]:
+    """
+    :param telemetry: the result of
+        :py:meth:`pymerlin.merlin.Simulation.get_sim_telemetry`
+    :returns: a copy of the telemetry with every series reduced to one
+        value per window (see :py:func:`aggregate`), ``nan`` is reported as
+        ``None``. Entries without series, e.g. the run messages, are passed
+        on unchanged.
+
+    All series of the telemetry are reduced in one vectorised operation.
+    """
+    telemetry = list(telemetry)
+    frame = TelemetryFrame.from_telemetry(telemetry, start_tick)
+    reduced = aggregate(frame.values, window, how, start_tick, align)
+    bounds = window_bounds(frame.values.shape[1], window, start_tick, align)
+    # a series covers all windows starting before its end
+    windows = np.searchsorted(bounds, frame.lengths, side='left')
+
+    output = list()
+    for to in telemetry:
+        if 'data' not in to:
+            output.append(to)
+            continue
+        data = dict()
+        for channel in to['data']:
+            row = frame.index[(to['id'], channel)]
+            data[channel] = [None if np.isnan(x) else float(x)
+                             for x in reduced[row, :windows[row]]]
+        aggregated = dict(to)
+        aggregated['data'] = data
+        output.append(aggregated)
+    return output
+
+
+def _pad(values: np.ndarray, width: int) -> np.ndarray:
+    if values.shape[1] == width:
+        return values
+    padded = np.full((values.shape[0], width), np.nan)
+    padded[:, :values.shape[1]] = values
+    return padded
+
+
+class TelemetryDiff:
+    """
+    The per-channel difference ``variant - baseline`` of two runs of the
+    same model, see :py:func:`compare_runs`.
+    """
+
+    def __init__(
+            self,
+            baseline: TelemetryFrame,
+            variant: TelemetryFrame,
+            rtol: float=0.0,
+            atol: float=0.0):
+        self.baseline = baseline
+        self.variant = variant
+
+        common = [k for k in baseline.keys if k in variant.index]
+        self.keys = common  # type: List[ChannelKey]
+        """channels present in both runs"""
+
+        self.only_in_baseline = sorted(
+            set(baseline.objects) - set(variant.objects))  # type: List[int]
+        """ids of objects, e.g. removed entities, missing in the variant"""
+
+        self.only_in_variant = sorted(
+            set(variant.objects) - set(baseline.objects))  # type: List[int]
+        """ids of objects, e.g. added entities, missing in the baseline"""
+
+        width = max(baseline.values.shape[1], variant.values.shape[1])
+        a = _pad(baseline.values[[baseline.index[k] for k in common]]
+                 if common else np.empty((0, baseline.values.shape[1])),
+                 width)
+        b = _pad(variant.values[[variant.index[k] for k in common]]
+                 if common else np.empty((0, variant.values.shape[1])),
+                 width)
+
+        self.delta = b - a  # type: np.ndarray
+        """``variant - baseline`` per channel and tick"""
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.relative = np.where(
+                a != 0, self.delta / np.abs(a),
+                np.where(self.delta == 0, 0.0, np.nan))  # type: np.ndarray
+        """``delta / |baseline|``, nan where undefined"""
+
+        diverged = (np.isnan(a) != np.isnan(b))
+        with np.errstate(invalid='ignore'):
+            diverged |= np.abs(self.delta) > (atol + rtol * np.abs(a))
+        has_diverged = diverged.any(axis=1)
+        first = np.argmax(diverged, axis=1) + baseline.start_tick
+        self.first_divergence = np.where(
+            has_diverged, first, -1)  # type: np.ndarray
+        """the first tick of every channel that differs, -1 if none"""
+
+        self._abs_delta = np.nan_to_num(np.abs(self.delta))
+
+    def changed_channels(self) -> List[ChannelKey]:
+        return [k for k, t in zip(self.keys, self.first_divergence) if t >= 0]
+
+    def top_changed(self, k: int=10) -> List[Dict[str, Any]]:
+        """
+        :param int k: the maximal number of objects to return
+        :returns: the ``k`` objects with the largest summed absolute change
+            over all their channels and ticks, biggest first.
+        """
+        if not self.keys:
+            return list()
+        groups = dict()  # type: Dict[int, int]
+        inverse = np.fromiter(
+            (groups.setdefault(so_id, len(groups))
+             for so_id, _ in self.keys),
+            dtype=np.int64, count=len(self.keys))
+        ids = list(groups)
+        per_channel = self._abs_delta.sum(axis=1)
+        total = np.bincount(inverse, weights=per_channel)
+        peak = np.zeros(len(ids))
+        np.maximum.at(peak, inverse, self._abs_delta.max(axis=1, initial=0.0))
+
+        order = np.argsort(-total, kind='stable')[:k]
+        output = list()
+        for u in order:
+            if total[u] == 0:
+                break
+            rows = np.nonzero(inverse == u)[0]
+            so_id = ids[u]
+            divergence = [t for t in self.first_divergence[rows] if t >= 0]
+            output.append({
+                'id': so_id,
+                'type': self.baseline.objects[so_id]['type'],
+                'name': self.baseline.objects[so_id]['name'],
+                'total_abs_delta': float(total[u]),
+                'max_abs_delta': float(peak[u]),
+                'first_divergence': int(min(divergence)) if divergence else -1,
+                'channels': [self.keys[r][1] for r in rows
+                             if self.first_divergence[r] >= 0]
+            })
+        return output
+
+    def serialize(self, top_k: int=10, changed_only: bool=True) \
+            -> Dict[str, Any]:
+        """
+        :returns: a json compatible summary of the difference, ``nan``
+            values are reported as ``None``.
+        """
+        def to_list(row):
+            return [None if np.isnan(x) else float(x) for x in row]
+
+        channels = list()
+        for i, (so_id, channel) in enumerate(self.keys):
+            if changed_only and self.first_divergence[i] < 0:
+                continue
+            channels.append({
+                'id': so_id,
+                'type': self.baseline.objects[so_id]['type'],
+                'name': self.baseline.objects[so_id]['name'],
+                'channel': channel,
+                'delta': to_list(self.delta[i]),
+                'relative': to_list(self.relative[i]),
+                'first_divergence': int(self.first_divergence[i])
+            })
+
+        def describe(frame, ids):
+            return [dict(id=i, **frame.objects[i]) for i in ids]
+
+        return {
+            'channels': channels,
+            'top_changed': self.top_changed(top_k),
+            'only_in_baseline': describe(self.baseline,
+                                         self.only_in_baseline),
+            'only_in_variant': describe(self.variant, self.only_in_variant)
+        }
+
+
+def compare_runs(
+        baseline: Union[TelemetryFrame, Iterable[Mapping[str, Any]]],
+        variant: Union[TelemetryFrame, Iterable[Mapping[str, Any]]],
+        rtol: float=0.0,
+        atol: float=0.0) -> TelemetryDiff:
+    """
+    :param baseline: telemetry of the reference run, either as returned by
+        :py:meth:`pymerlin.merlin.Simulation.get_sim_telemetry` or as
+        :py:class:`TelemetryFrame`
+    :param variant: telemetry of the run to compare with
+    :param float rtol: relative tolerance for a tick to count as changed
+    :param float atol: absolute tolerance for a tick to count as changed
+    :returns: the :py:class:`TelemetryDiff`
+
+    Objects are matched by id, so both runs need to be from the same model
+    (e.g. the same :py:class:`pymerlin.merlin.Simulation` run twice with
+    different scenarios). Objects existing in one run only, for example
+    entities created by an :py:class:`pymerlin.merlin.AddEntityAction`, are
+    listed in :py:attr:`TelemetryDiff.only_in_baseline` and
+    :py:attr:`TelemetryDiff.only_in_variant`.
+    """
+    if not isinstance(baseline, TelemetryFrame):
+        baseline = TelemetryFrame.from_telemetry(baseline)
+    if not isinstance(variant, TelemetryFrame):
+        variant = TelemetryFrame.from_telemetry(variant)
+    return TelemetryDiff(baseline, variant, rtol=rtol, atol=atol)
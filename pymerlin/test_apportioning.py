@@ -184,3 +184,90 @@ class TestApportioning:
                         [sum(values)],
                         [out_value],
                         err_msg="sum of endpoints expected the same as output")
+
+
+@pytest.fixture()
+def sourced_OutputConnector(OutputConnector_with_Endpoints):
+    out = OutputConnector_with_Endpoints
+    for ep, _ in out.get_endpoints():
+        ep.source = out
+        ep.reset_telemetry()
+    out.reset_telemetry()
+    return out
+
+
+class TestDerivedTelemetry:
+
+    def _write_and_record(self, out, values, changes):
+        # the value telemetry a connector storing its own writes would have
+        expected = {ep: [] for ep, _ in out.get_endpoints()}
+        for i, v in enumerate(values):
+            if i in changes:
+                changes[i](out)
+            out.write(v)
+            for ep, _ in out.get_endpoints():
+                expected[ep].append(ep.value)
+        return expected
+
+    @pytest.mark.parametrize('rule', list(
+        merlin.OutputConnector.ApportioningRules))
+    def test_reconstruction(self, sourced_OutputConnector, rule):
+        out = sourced_OutputConnector
+        out.apportioning = rule
+        endpoints = sorted((ep for ep, _ in out.get_endpoints()),
+                           key=lambda e: e.name)
+
+        def change_biases(o):
+            o.set_endpoint_biases(list(zip(endpoints, (0.5, 0.3, 0.1, 0.2))))
+
+        expected = self._write_and_record(
+            out, [1.0, 2.0, 0.5, 0.5, 3.0, -1.0], {3: change_biases})
+
+        assert len(out._apportion_log) == 2
+        for ep in endpoints:
+            assert 'value' not in ep._telemetry
+            npt.assert_allclose(ep.get_telemetry_data()['value'],
+                                expected[ep])
+
+    def test_removed_endpoint(self, sourced_OutputConnector):
+        out = sourced_OutputConnector
+        removed = sorted((ep for ep, _ in out.get_endpoints()),
+                         key=lambda e: e.name)[0]
+        expected = self._write_and_record(
+            out, [4.0, 4.0, 4.0], {2: lambda o: o.remove_input(removed)})
+        assert removed.get_telemetry_data()['value'] == [1.0, 1.0]
+        for ep, _ in out.get_endpoints():
+            npt.assert_allclose(ep.get_telemetry_data()['value'],
+                                expected[ep])
+
+    def test_additive_inputs_are_stored(self, sourced_OutputConnector):
+        out = sourced_OutputConnector
+        for ep, _ in out.get_endpoints():
+            ep.additive_write = True
+            ep.reset_telemetry()
+        out.write(4.0)
+        out.write(4.0)
+        for ep, _ in out.get_endpoints():
+            assert ep._telemetry['value'] == [1.0, 2.0]
+
+    def test_new_source(self, sourced_OutputConnector):
+        out = sourced_OutputConnector
+        ep = next(iter(out.get_endpoints()))[0]
+        out.write(4.0)
+        other = merlin.OutputConnector("$", out.parent, "otherOut")
+        other.add_input(ep)
+        ep.source = other
+        other.write(2.0)
+        # a foreign write keeps the telemetry stored from then on
+        out.write(8.0)
+        assert ep.get_telemetry_data()['value'] == [1.0, 2.0, 2.0]
+
+    def test_copied_types(self, sourced_OutputConnector):
+        out = sourced_OutputConnector
+        out.apportioning = merlin.OutputConnector.ApportioningRules.copy_write
+        out.write(4)
+        out.write(2)
+        for ep, _ in out.get_endpoints():
+            values = ep.get_telemetry_data()['value']
+            assert values == [4, 2]
+            assert all(type(v) is int for v in values)
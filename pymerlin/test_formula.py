@@ -0,0 +1,170 @@
+import pytest
+from pymerlin import merlin
+from pymerlin import formula
+from pymerlin import horizon
+from pymerlin import snapshot
+from pymerlin.processes import BudgetProcess
+from pymerlin.test_merlin import sim  # @UnusedImport
+
+
+STAFF_PARAMS = {
+    'name': 'Staff',
+    'inputs': {'budget': '$'},
+    'properties': {'staff': 100, 'salary': 5.0},
+    'requirements': {'budget': 'staff * salary'},
+    'outputs': {
+        'handled': ['requests_handled', 'staff * 0.9'],
+        'surplus': ['surplus$', 'max(budget - staff * salary, 0)']},
+}
+
+
+@pytest.fixture()
+def formula_model(sim) -> merlin.Simulation:
+    """a budget paying the staff of a formula process"""
+    sim.set_time_span(12)
+    sim.add_unit_types(['$', 'requests_handled', 'surplus$'])
+    output = merlin.Output('requests_handled', name='requests handled')
+    sim.add_output(output)
+    e_budget = merlin.Entity(name='budget')
+    e_staff = merlin.Entity(name='staff')
+    sim.add_entities([e_budget, e_staff])
+    sim.set_source_entities([e_budget])
+    sim.connect_entities(e_budget, e_staff, '$')
+    sim.connect_output(e_staff, output)
+    e_budget.create_process(
+        BudgetProcess, {'name': 'budget', 'start_amount': 7200.0})
+    e_staff.create_process(formula.FormulaProcess, STAFF_PARAMS)
+    return sim
+
+
+def _results(sim):
+    return [list(o.result) for o in sim.outputs]
+
+
+class TestFormulaProcess:
+
+    def test_compute(self, formula_model):
+        sim = formula_model  # type: merlin.Simulation
+        sim.run()
+        assert _results(sim) == [[90.0] * 12]
+        staff = sim.get_process_by_name('Staff')
+        assert staff.outputs['surplus'].connector.get_telemetry_data()[
+            'value'] == [100.0] * 12
+        assert staff.inputs['budget'].get_telemetry_data()['consume'] == \
+            [500.0] * 12
+        assert sim.get_run_messages() == []
+
+    def test_insufficient_input(self, formula_model):
+        sim = formula_model  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Staff')
+        e = staff.parent
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.ModifyProcessPropertyAction(
+                e.id, staff.get_prop('staff').id, 150.0)], 7)})
+        sim.run(scenarios=[scenario])
+        assert _results(sim) == [[90.0] * 6 + [0.0] * 6]
+        messages = sim.get_run_messages()
+        assert len(messages) == 1
+        assert messages[0]['ticks'] == list(range(7, 13))
+
+    def test_horizon(self, formula_model):
+        sim = formula_model  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Staff')
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.ModifyProcessPropertyAction(
+                staff.parent.id, staff.get_prop('staff').id, 150.0)], 7)})
+        sim.run(scenarios=[scenario], rollback=True)
+        expected = sim.get_sim_telemetry()
+        assert horizon.supported(sim)
+        horizon.run(sim, scenarios=[scenario], rollback=True)
+        assert sim.get_sim_telemetry() == expected
+
+    def test_horizon_operators(self, sim):
+        # and, or and not give the same values on arrays
+        sim.set_time_span(6)
+        sim.add_unit_types(['a', 'b', 'c', 'd'])
+        e = merlin.Entity(name='logic')
+        sim.add_entities([e])
+        sim.set_source_entities([e])
+        p = e.create_process(formula.FormulaProcess, {
+            'name': 'Logic',
+            'properties': {'x': 0.0, 'y': 2.0},
+            'outputs': {
+                'a': ['a', 'x or 5'],
+                'b': ['b', 'x and y and 3'],
+                'c': ['c', 'not x'],
+                'd': ['d', 'x or y and 0 or -1']}})
+        p.get_prop('x').set_schedule(
+            merlin.PropertySchedule({3: 2.0, 5: 0.0}))
+        sim.run()
+        expected = sim.get_sim_telemetry()
+        assert p.outputs['a'].connector.get_telemetry_data()['value'] == \
+            [5, 5, 2, 2, 5, 5]
+        assert p.outputs['b'].connector.get_telemetry_data()['value'] == \
+            [0, 0, 3, 3, 0, 0]
+        assert horizon.supported(sim)
+        horizon.run(sim)
+        assert sim.get_sim_telemetry() == expected
+
+    def test_snapshot(self, formula_model):
+        sim = formula_model  # type: merlin.Simulation
+        loaded = snapshot.loads(snapshot.dumps(sim))
+        sim.run()
+        loaded.run()
+        assert _results(loaded) == _results(sim)
+
+    def test_dependencies(self):
+        p = formula.FormulaProcess(**STAFF_PARAMS)
+        assert p.dependencies() == {
+            'handled': {'staff', 'salary', 'budget'},
+            'surplus': {'staff', 'salary', 'budget'}}
+        p = formula.FormulaProcess(
+            inputs={'a': 'x'},
+            properties={'f': 1.0, 'g': 2.0},
+            outputs={'b': ['y', 'a * f if f > 0 else 0'], 'c': ['z', 'g']})
+        assert p.dependencies() == {'b': {'a', 'f'}, 'c': {'g'}}
+
+    def test_memo_key(self, formula_model, monkeypatch):
+        # changes of properties no expression uses replay the last compute
+        sim = formula_model  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Staff')
+        staff.add_property('notes', 'notes',
+                           merlin.ProcessProperty.PropertyType.number_type,
+                           0.0)
+        computed = []
+        compute = formula.FormulaProcess.compute
+        monkeypatch.setattr(
+            formula.FormulaProcess, 'compute',
+            lambda self, tick: computed.append(tick) or compute(self, tick))
+
+        def scenario(name, tick, value):
+            return merlin.Scenario({merlin.Event(
+                [merlin.ModifyProcessPropertyAction(
+                    staff.parent.id, staff.get_prop(name).id, value)],
+                tick)})
+
+        sim.run(scenarios=[scenario('notes', 4, 1.0)], rollback=True)
+        assert computed == [1]
+        assert _results(sim) == [[90.0] * 12]
+        computed.clear()
+        sim.run(scenarios=[scenario('salary', 4, 4.0)], rollback=True)
+        assert computed == [1, 4]
+
+    def test_compiled_once(self):
+        p1 = formula.FormulaProcess(**STAFF_PARAMS)
+        p2 = formula.FormulaProcess(**STAFF_PARAMS)
+        assert p1._results is p2._results
+
+    @pytest.mark.parametrize('expression', [
+        'staff * unknown',
+        'staff.__class__',
+        'open(staff)',
+        '"staff"',
+        '0 < staff < 10',
+        'staff *',
+    ])
+    def test_invalid_expression(self, expression):
+        with pytest.raises(merlin.MerlinException):
+            formula.FormulaProcess(
+                properties={'staff': 1.0},
+                outputs={'out': ['x', expression]})
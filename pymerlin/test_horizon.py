@@ -0,0 +1,135 @@
+import pytest
+from pymerlin import merlin
+from pymerlin import horizon
+from pymerlin.processes import BudgetProcess, ConstantProvider, StaffFTE
+from pymerlin.test_merlin import (sim, computation_test_harness,  # @UnusedImport
+                                  funded_computation_test_harness)  # @UnusedImport
+
+
+@pytest.fixture()
+def staff_model(sim) -> merlin.Simulation:
+    """a budget and accommodation paying and housing staff"""
+    sim.set_time_span(24)
+    sim.add_unit_types(['staff$', 'staff_accomodated', 'LS_FTE'])
+    output = merlin.Output('LS_FTE', name='line staff fte')
+    sim.add_output(output)
+
+    e_budget = merlin.Entity(name='budget')
+    e_building = merlin.Entity(name='building')
+    e_staff = merlin.Entity(name='staff')
+    sim.add_entities([e_budget, e_building, e_staff])
+    sim.set_source_entities([e_budget, e_building])
+    sim.connect_entities(e_budget, e_staff, 'staff$')
+    sim.connect_entities(e_building, e_staff, 'staff_accomodated')
+    sim.connect_output(e_staff, output)
+
+    e_budget.create_process(
+        BudgetProcess,
+        {'name': 'budget', 'start_amount': 12.0e7, 'budget_type': 'staff$'})
+    e_building.create_process(
+        ConstantProvider,
+        {'name': 'desks', 'unit': 'staff_accomodated', 'amount': 1200})
+    e_staff.create_process(StaffFTE, {'name': 'staff'})
+    return sim
+
+
+def _property_action(sim, process_name, prop_name, tick, value):
+    p = sim.get_process_by_name(process_name)
+    return merlin.Event(
+        [merlin.ModifyProcessPropertyAction(
+            p.parent.id, p.get_prop(prop_name).id, value)],
+        tick)
+
+
+def _run_both(sim, **kwargs):
+    sim.run(**kwargs)
+    expected = sim.get_sim_telemetry()
+    horizon.run(sim, **kwargs)
+    return expected, sim.get_sim_telemetry()
+
+
+class TestHorizon:
+
+    def test_run(self, staff_model):
+        sim = staff_model  # type: merlin.Simulation
+        assert horizon.supported(sim)
+        expected, telemetry = _run_both(sim)
+        assert telemetry == expected
+        assert [len(o.result) for o in sim.outputs] == [24]
+
+    def test_scenarios(self, staff_model):
+        sim = staff_model  # type: merlin.Simulation
+        sim.get_process_by_name('staff').get_prop('training').set_schedule(
+            merlin.PropertySchedule({6: 0.9, 18: 0.7}))
+        scenario = merlin.Scenario({
+            _property_action(sim, 'staff', 'oh_number', 4, 150),
+            _property_action(sim, 'desks', 'amount', 10, 1000.0),
+            _property_action(sim, 'budget', 'amount', 15, 14.0e7)})
+        budget = sim.get_process_by_name('budget')
+        for instantaneous_update in (True, False):
+            budget.instantaneous_update = instantaneous_update
+            expected, telemetry = _run_both(
+                sim, scenarios=[scenario], rollback=True)
+            assert telemetry == expected
+            assert sim.get_process_by_name('desks').amount == 1200
+
+    def test_messages(self, staff_model):
+        sim = staff_model  # type: merlin.Simulation
+        scenario = merlin.Scenario({
+            _property_action(sim, 'desks', 'amount', 3, 10.0),
+            _property_action(sim, 'budget', 'amount', 5, 1.0)})
+        sim.run(scenarios=[scenario], rollback=True)
+        expected = sim.get_run_messages()
+        results = [list(o.result) for o in sim.outputs]
+        horizon.run(sim, scenarios=[scenario], rollback=True)
+        assert sorted(expected, key=repr) == \
+            sorted(sim.get_run_messages(), key=repr)
+        assert [list(o.result) for o in sim.outputs] == results
+
+    def test_message_threshold(self, staff_model, monkeypatch):
+        # messages below the threshold are not even formatted
+        sim = staff_model  # type: merlin.Simulation
+        sim.message_threshold = merlin.MerlinMessage.MessageType.error
+
+        def log_message(*args, **kwargs):
+            raise AssertionError("should not log")
+
+        monkeypatch.setattr(sim, 'log_message', log_message)
+        scenario = merlin.Scenario({
+            _property_action(sim, 'desks', 'amount', 3, 10.0),
+            _property_action(sim, 'budget', 'amount', 5, 1.0)})
+        _run_both(sim, scenarios=[scenario], rollback=True)
+        assert sim.shortfalls
+
+    def test_input_requirement_exception(self, staff_model, monkeypatch):
+        # processes still raising provide zeros in both modes
+        sim = staff_model  # type: merlin.Simulation
+
+        def compute(self, tick):
+            raise merlin.InputRequirementException(
+                self, self.inputs['staff_budget'], 1.0, 2.0)
+
+        def compute_horizon(self, ticks, inputs, props):
+            raise merlin.InputRequirementException(
+                self, self.inputs['staff_budget'], 1.0, 2.0)
+
+        monkeypatch.setattr(StaffFTE, 'compute', compute)
+        monkeypatch.setattr(StaffFTE, 'compute_horizon', compute_horizon)
+        expected, telemetry = _run_both(sim)
+        shortfalls = list(sim.shortfalls)
+        assert telemetry == expected
+        assert [list(o.result) for o in sim.outputs] == [[0.0] * 24]
+        sim.run()
+        assert sorted(sim.shortfalls) == sorted(shortfalls)
+        assert len(shortfalls) == 24
+
+    def test_unsupported(self, funded_computation_test_harness, staff_model):
+        # the call center staff has no compute_horizon
+        assert not horizon.supported(funded_computation_test_harness)
+        with pytest.raises(merlin.MerlinException):
+            horizon.run(funded_computation_test_harness)
+
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.RemoveEntityAction(
+                staff_model.get_entity_by_name('building').id)], 2)})
+        assert not horizon.supported(staff_model, [scenario])
@@ -5,7 +5,9 @@ from pymerlin import merlin
 from pymerlin.processes import (BudgetProcess,
                                 CallCenterStaffProcess,
                                 BuildingMaintainenceProcess,
-                                ConstantProvider)
+                                ConstantProvider,
+                                StaffFTE,
+                                LeasedAccomodationProvider)
 from examples import RecordStorageFacility
 from examples import DIAServicesModel
 
@@ -32,7 +34,7 @@ def computation_test_harness(sim) -> merlin.Simulation:
     sim.add_unit_types(['$', 'desks', 'requests_handled'])
 
     sim_output = merlin.Output('requests_handled', name='requests handled')
-    sim.outputs.add(sim_output)
+    sim.add_output(sim_output)
 
     # Create Entities
     e_budget = merlin.Entity(
@@ -68,6 +70,16 @@ def computation_test_harness(sim) -> merlin.Simulation:
     return sim
 
 
+@pytest.fixture()
+def funded_computation_test_harness(computation_test_harness) -> merlin.Simulation:
+    """The computation test harness with enough budget for all processes"""
+    sim = computation_test_harness
+    budget = sim.get_process_by_name('Budget')
+    budget.get_prop('amount').default = 12000.0
+    budget.get_prop('amount').reset()
+    return sim
+
+
 @pytest.fixture()
 def sim() -> merlin.Simulation:
     """ Returns a simulation object """
@@ -152,15 +164,33 @@ class TestIntegration:
         assert len(list(sim.outputs)[0].result) != 0
 
 
-    def test_output(self, computation_test_harness):
-        sim = computation_test_harness
+    def test_output(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness
         sim.run()
         result = list(sim.outputs)[0].result
         expected_result = \
             [20.0, 40.0, 60.0, 80.0, 100.0, 100.0, 100.0, 100.0, 100.0, 100.0]
 
+        assert len(result) == len(expected_result)
         for i in range(0, len(result)):
             npt.assert_almost_equal(result[i], expected_result[i])
+        assert sim.shortfalls == []
+
+    def test_insufficient_input(self, computation_test_harness):
+        sim = computation_test_harness
+        sim.run()
+        # the underfunded building provides no desks, the call center
+        # downstream is computed all the same
+        assert list(sim.outputs)[0].result == [0.0] * sim.num_steps
+        building = sim.get_process_by_name('Building Maintenance')
+        staff = sim.get_process_by_name('Call Center Staff')
+        assert sim.shortfalls[:3] == [
+            merlin.InputShortfall(1, building.id, '$', 500.0 / 1.2, 500.0),
+            merlin.InputShortfall(1, staff.id, 'desks', 0.0, 100.0),
+            merlin.InputShortfall(1, staff.id, '$', 500.0 / 1.2, 500.0)]
+        assert len(sim.shortfalls) == 3 * sim.num_steps
+        with pytest.deprecated_call():
+            assert sim.get_last_run_errors() == sim.shortfalls
 
 
 class TestSimulation:
@@ -237,6 +267,101 @@ class TestSimulation:
                     assert len(to['data']['value']) == sim.num_steps
 
 
+    def test_output_telemetry_is_result(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        sim.run()
+        first_run = output.get_telemetry_data()['value']
+        assert first_run is output.result
+        sim.run(end=5)
+        # telemetry of earlier runs stays untouched
+        assert len(first_run) == 10
+        assert output.get_telemetry_data()['value'] == output.result
+        assert len(output.result) == 5
+
+    def test_repeated_messages_are_folded(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        messages = sim.get_run_messages()
+        assert [m['message_id'] for m in messages] == [
+            'building_maint_underfund',
+            'call_center_required_desks',
+            'call_center_required_salary']
+        m = messages[0]
+        assert m['count'] == sim.num_steps
+        assert m['time'] == m['first_time'] == 1
+        assert m['last_time'] == sim.num_steps
+        assert m['ticks'] == list(range(1, sim.num_steps + 1))
+        assert [c['type'] for c in m['context']] == [
+            'ProcessProperty', 'InputConnector']
+        # a new run starts with an empty store
+        sim.run(end=3)
+        assert sim.get_run_messages()[0]['count'] == 3
+
+    def test_message_threshold(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        sim.message_threshold = merlin.MerlinMessage.MessageType.error
+        assert not sim.wants_message(merlin.MerlinMessage.MessageType.warn)
+        sim.run()
+        assert sim.get_run_messages() == []
+
+    def test_random_streams(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_process_by_name('Budget')
+        staff = sim.get_process_by_name('Call Center Staff')
+
+        def draws():
+            return (budget.get_random_generator().random(),
+                    staff.get_random_generator().random())
+
+        sim.run(seed=3)
+        assert sim.run_seed == 3
+        first = draws()
+        assert first[0] != first[1]
+        sim.run(seed=3)
+        assert draws() == first
+        sim.run(seed=4)
+        assert draws() != first
+
+        sim.seed = 3
+        sim.run()
+        assert draws() == first
+        # derived from the ids, not the objects or their order
+        copy = sim.clone()
+        copy.run()
+        assert (copy.get_process_by_id(budget.id).get_random_generator()
+                .random()) == first[0]
+
+        sim.seed = None
+        sim.run()
+        assert sim.run_seed is not None
+        assert draws() != first
+
+    def test_seeded_stochastic_model(self):
+        sim = DIAServicesModel.createAllServicesInOneModel()
+        sim.num_steps = 24
+        copy = sim.clone()
+        sim.run(seed=11)
+        copy.run(seed=11)
+
+        def data(s):
+            return {(t['id'], k): list(v) for t in s.get_sim_telemetry()
+                    if 'data' in t for k, v in t['data'].items()}
+
+        # the sums over sets of connectors may differ in the last digit
+        expected = data(sim)
+        for k, v in data(copy).items():
+            npt.assert_allclose(v, expected[k], rtol=1e-12)
+
+    def test_message_context_is_flattened(self, sim):
+        e = merlin.Entity(sim, 'e')
+        p = merlin.Process('p')
+        sim.log_message(
+            merlin.MerlinMessage.MessageType.warn, p, 'id', 'msg',
+            context=[e, [p, e]])
+        m = sim.get_run_messages()[0]
+        assert [c['id'] for c in m['context']] == [e.id, p.id, e.id]
+
     def test_consistant_telemetry_output_size(self, dia_record_storage_model):
         sim = dia_record_storage_model  # type: merlin.Simulation
         sim.num_steps = 10
@@ -414,6 +539,180 @@ class TestEntity:
         assert seg[3] == i
 
 
+class TestProcess:
+
+    def test_get_prop(self):
+        p = BudgetProcess(start_amount=1200.0)
+        prop = p.get_prop('amount')
+        assert p.get_prop('annual amount') is prop
+        assert p.get_prop_value('annual amount') == 1200.0
+        assert p.get_prop('no such property') is None
+        assert p.get_prop_value('no such property') is None
+        p.remove_property('amount')
+        assert p.get_prop('annual amount') is None
+        p.add_property('annual amount', 'amount',
+                       merlin.ProcessProperty.PropertyType.number_type, 1.0)
+        assert p.get_prop('annual amount') is p.props['amount']
+
+    def test_property_value(self):
+        p = CallCenterStaffProcess()
+        assert CallCenterStaffProcess.staff_number.name == 'staff number'
+        assert p.staff_number == 100
+        p.get_prop('staff number').set_value(50)
+        assert p.staff_number == 50
+        p.remove_property('staff number')
+        with pytest.raises(AttributeError):
+            p.staff_number
+
+    def test_schema(self):
+        class Schematic(merlin.Process):
+            schema = merlin.ProcessSchema(
+                inputs=[('in', 'a')],
+                outputs=[('out', 'b')],
+                properties=[
+                    ('Amount', 'amount',
+                     merlin.ProcessProperty.PropertyType.number_type, 1.0),
+                    ('Fixed', 'fixed',
+                     merlin.ProcessProperty.PropertyType.bool_type, True,
+                     True)])
+
+            def __init__(self, amount=1.0):
+                super(Schematic, self).__init__('schematic')
+                self.apply_schema({'amount': amount})
+
+        p1 = Schematic(amount=5.0)
+        p2 = Schematic()
+        for p, amount in ((p1, 5.0), (p2, 1.0)):
+            assert p.inputs['in'].name == 'in'
+            assert p.inputs['in'].type == 'a'
+            assert p.outputs['out'].type == 'b'
+            assert p.get_prop('Amount').parent is p
+            assert p.get_prop_value('amount') == amount
+            assert p.get_prop('amount').default == amount
+            assert p.get_prop('fixed').readonly
+        objects = [p1.inputs['in'], p2.inputs['in'], p1.outputs['out'],
+                   p1.props['amount'], p2.props['amount']]
+        assert len({o.id for o in objects}) == len(objects)
+        p2.get_prop('amount').set_value(2.0)
+        assert p1.get_prop_value('amount') == 5.0
+
+        # the declared objects are added to those of the add_ methods
+        p1.add_property('Extra', 'extra',
+                        merlin.ProcessProperty.PropertyType.number_type, 3.0)
+        assert p1.get_prop_value('Extra') == 3.0
+        assert 'extra' not in p2.props
+        with pytest.raises(KeyError):
+            p1.apply_schema()
+
+    def test_pure(self, funded_computation_test_harness, monkeypatch):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        assert BuildingMaintainenceProcess.pure
+        sim.run()
+        expected = sim.get_sim_telemetry()
+
+        computed = list()
+        compute = BuildingMaintainenceProcess.compute
+
+        def counting_compute(self, tick):
+            computed.append(tick)
+            compute(self, tick)
+
+        monkeypatch.setattr(
+            BuildingMaintainenceProcess, 'compute', counting_compute)
+        sim.run()
+        assert sim.get_sim_telemetry() == expected
+        # the budget and thus the inputs are the same every tick
+        assert computed == [1]
+
+        e = sim.get_entity_by_name('office building')
+        prop = e.get_process_by_name('Building Maintenance').get_prop(
+            'desks provided')
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.ModifyProcessPropertyAction(e.id, prop.id, 50.0)], 5)})
+        computed.clear()
+        sim.run(scenarios=[scenario])
+        assert computed == [1, 5]
+        monkeypatch.setattr(BuildingMaintainenceProcess, 'pure', False)
+        memoised = sim.get_sim_telemetry()
+        sim.run(scenarios=[scenario])
+        assert memoised == sim.get_sim_telemetry()
+
+    def test_pure_messages(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        expected = sim.get_sim_telemetry()
+        assert expected[-1]['messages']
+
+        # the underfunded building maintenance logs a message every tick
+        sim.run()
+        assert sim.get_sim_telemetry() == expected
+        assert all(p._memo is None for e in sim.get_entities()
+                   for p in e.get_processes()
+                   if isinstance(p, BuildingMaintainenceProcess))
+
+    def test_schema_processes(self):
+        fte = StaffFTE(ls_number=10)
+        assert list(fte.inputs) == ['staff_budget', 'staff_accom']
+        assert fte.get_prop('Line Staff Number').get_value() == 10
+        assert fte.oh_number == 100
+        accom = LeasedAccomodationProvider(
+            provided_unit_type='desks', accom_type='desk')
+        assert accom.get_prop('desk / area (m2)') is \
+            accom.props['accom_type_per_area']
+        assert accom.outputs['o_accomodated'].type == 'desks'
+        assert LeasedAccomodationProvider().get_prop(
+            'staff / area (m2)') is not None
+
+    def test_desktop_cohorts(self):
+        p = DIAServicesModel.InternalICTDesktopService(actual_desktops=100)
+        p.random_cohort_spread = False
+        p.reset()
+        p.create_desktop_simulation()
+        assert p.cohort_ages.tolist() == [4.0 * i for i in range(18)]
+        assert p.cohort_desktops.tolist() == [6] * 10 + [5] * 8
+
+        p.random_cohort_spread = True
+        p.random_seed = 7891011
+        p.reset()
+        p.create_desktop_simulation()
+        spread = p.cohort_desktops.tolist()
+        assert sum(spread) == 100
+        # seeded by random_seed
+        p.reset()
+        p.create_desktop_simulation()
+        assert p.cohort_desktops.tolist() == spread
+
+    def test_require_input(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        sim.message_threshold = merlin.MerlinMessage.MessageType.error
+        sim.run(end=2)
+        building = sim.get_process_by_name('Building Maintenance')
+        assert building.require_input('$', 400.0)
+        assert not building.require_input('$', 500.0)
+        assert sim.shortfalls[-1] == merlin.InputShortfall(
+            2, building.id, '$', 500.0 / 1.2, 500.0)
+        # ticks recording shortfalls are not replayed, even without messages
+        assert building._memo is None
+        assert len(sim.get_run_messages()) == 0
+
+    def test_input_requirement_exception(
+            self, computation_test_harness, monkeypatch):
+        sim = computation_test_harness  # type: merlin.Simulation
+
+        def compute(self, tick):
+            raise merlin.InputRequirementException(
+                self, self.inputs['$'], 1.0, 2.0)
+
+        monkeypatch.setattr(BuildingMaintainenceProcess, 'compute', compute)
+        sim.run()
+        building = sim.get_process_by_name('Building Maintenance')
+        assert sim.shortfalls[0] == merlin.InputShortfall(
+            1, building.id, '$', 1.0, 2.0)
+        assert building.outputs['desks'].connector.get_telemetry_data()[
+            'value'] == [0.0] * sim.num_steps
+        assert list(sim.outputs)[0].result == [0.0] * sim.num_steps
+
+
 class TestOutputConnector:
 
     def test_write(self, simple_entity_graph):
@@ -433,6 +732,15 @@ class TestOutputConnector:
         assert seg[2].get_endpoints() == []
         assert seg[2] not in seg[0].outputs
 
+    def test_remove_input_detached(self):
+        out_con = merlin.OutputConnector('unit_type', None, name='output')
+        inputs = [merlin.InputConnector('unit_type', None) for _ in range(2)]
+        for i in inputs:
+            out_con.add_input(i)
+        for i in inputs:
+            out_con.remove_input(i)
+        assert out_con.get_endpoints() == []
+
     def test_set_endpoint_bias(self, simple_branching_output_graph):
         g = simple_branching_output_graph
         g[3].set_endpoint_bias(g[4], 0.8)
@@ -455,6 +763,67 @@ class TestOutputConnector:
                 npt.assert_almost_equal(e[1], 0.1)
 
 
+class TestMessageStore:
+
+    @pytest.fixture()
+    def logged(self, sim):
+        warn = merlin.MerlinMessage.MessageType.warn
+        error = merlin.MerlinMessage.MessageType.error
+        parent = merlin.Entity(sim, 'parent')
+        child = merlin.Entity(sim, 'child')
+        other = merlin.Entity(sim, 'other')
+        sim.add_entity(parent)
+        sim.add_entity(child)
+        sim.add_entity(other)
+        parent.add_child(child)
+        p_child = child.create_process(
+            ConstantProvider, {'name': 'child process', 'unit': 'u'})
+        p_other = other.create_process(
+            ConstantProvider, {'name': 'other process', 'unit': 'u'})
+        for t in range(1, 11):
+            sim.current_step = t
+            sim.log_message(warn, p_child, 'child_warn', 'w', [other])
+            if t > 5:
+                sim.log_message(error, p_other, 'other_error', 'e')
+            sim.log_message(warn, p_other, 'tick_{0}'.format(t), 'w')
+        return sim, parent, other
+
+    def test_query(self, logged):
+        sim, parent, other = logged
+        store = sim._messages
+        types = merlin.MerlinMessage.MessageType
+        assert len(store) == 12
+        assert store.count() == 25
+        assert [r.message_id for r in store.query(message_type=types.error)
+                ] == ['other_error']
+        assert len(store.query(min_type=types.warn)) == 12
+        assert len(store.query(min_type=types.error)) == 1
+        assert [r.message_id for r in store.query(context_ids=[other.id])
+                ] == ['child_warn']
+        assert [r.message_id for r in store.query(start=3, end=4)] == [
+            'child_warn', 'tick_3', 'tick_4']
+        assert [r.message_id for r in store.query(
+            message_type=[types.error], start=1, end=5)] == []
+
+    def test_entity_subtree(self, logged):
+        sim, parent, other = logged
+        page = sim.query_messages(entity=parent)
+        assert page['total'] == 1
+        assert page['messages'][0]['message_id'] == 'child_warn'
+        assert sim.query_messages(entity=other)['total'] == 11
+
+    def test_pagination(self, logged):
+        sim, parent, other = logged
+        page = sim.query_messages(offset=2, limit=3)
+        assert page['total'] == 12
+        assert page['offset'] == 2
+        assert [m['message_id'] for m in page['messages']] == [
+            'tick_2', 'tick_3', 'tick_4']
+        assert sim.query_messages(offset=11, limit=3)['messages'][0][
+            'message_id'] == 'tick_10'
+        assert sim.query_messages()['messages'] == sim.get_run_messages()
+
+
 class TestEvents:
 
     def test_add_dict_events(self):
@@ -573,6 +942,55 @@ class TestEvents:
                 + UnitType
                 """)
 
+    def test_parse(self, capsys):
+        script = "Entity 1 + Process pymerlin.processes.ConstantProvider, " \
+                 "100, amount:float = 3.0, name:str = p\n- Entity 2"
+        ast = merlin.Action.parse(script)
+        assert ast == [
+            {
+                'op': '+',
+                'operand_1':
+                    {'type': 'Entity', 'params': ['1'], 'props': {}},
+                'operand_2':
+                    {
+                        'type': 'Process',
+                        'params': [
+                            'pymerlin.processes.ConstantProvider', '100'],
+                        'props': {'amount': 3.0, 'name': 'p'}
+                    }
+            },
+            {
+                'op': '-',
+                'operand_1': {'type': 'Entity', 'params': ['2'], 'props': None},
+                'operand_2': None
+            }]
+        assert capsys.readouterr().out == ''
+        # cached trees are not shared with the caller
+        ast[0]['operand_2']['props']['amount'] = 4.0
+        assert merlin.Action.parse(script)[0]['operand_2']['props'][
+            'amount'] == 3.0
+        a1 = merlin.Action.create(script)
+        a2 = merlin.Action.create(script)
+        assert a1[0] is not a2[0]
+        assert a1[0].serialize() == a2[0].serialize()
+
+    def test_create_many(self):
+        events = merlin.Event.create_many([
+            (1, '+ Attribute foo, bar'),
+            (2, '[{"op": "+", "operand_1": {"type": "UnitType", '
+                '"params": "bar"}, "operand_2": null}]'),
+            (3, '+ Attribute foo, bar'),
+            (4, '  + Attribute foo, bar  ')])
+        assert [e.time for e in events] == [1, 2, 3, 4]
+        assert isinstance(events[1].actions[0], merlin.UnitTypeAction)
+        for e in [events[0], events[2], events[3]]:
+            assert isinstance(e.actions[0], merlin.AddAttributesAction)
+            assert e.actions[0].attributes == ['foo', 'bar']
+        assert events[0].actions[0] is not events[2].actions[0]
+
+        with pytest.raises(merlin.MerlinScriptException):
+            merlin.Action.create_many(['+ Attribute foo', '* UnitType'])
+
     def test_remove_entity_event(self, computation_test_harness):
         sim = computation_test_harness
         b_entity = sim.get_entity_by_name('Budget')
@@ -831,4 +1249,409 @@ class TestCoreActions:
         npt.assert_almost_equal(eps[0].bias, 0.7)
         npt.assert_almost_equal(eps[1].bias, 0.3)
 
+    def test_bind(self, computation_test_harness, monkeypatch):
+        sim = computation_test_harness  # type: merlin.Simulation
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff salary')
+        a = merlin.ModifyProcessPropertyAction(e.id, prop.id, 2.0)
+        assert a.bind(sim) is a
+
+        lookups = []
+        find = sim.find_sim_object
+        monkeypatch.setattr(
+            sim, 'find_sim_object',
+            lambda *args: lookups.append(args) or find(*args))
+        a.execute(sim)
+        a.execute(sim)
+        assert prop.get_value() == 2.0
+        assert lookups == []
 
+        # structural changes resolve the references again
+        version = sim.structure_version
+        merlin.AddEntityAction('annex').execute(sim)
+        assert sim.structure_version > version
+        a.execute(sim)
+        assert len(lookups) == 2
+        a.execute(sim)
+        assert len(lookups) == 2
+
+    def test_bind_property_changes(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        p = sim.get_process_by_name('Call Center Staff')
+        prop = p.get_prop('staff salary')
+        a = merlin.ModifyProcessPropertyAction(
+            p.parent.id, prop.id, 2.0).bind(sim)
+        version = sim.structure_version
+        p.remove_property('staff salary')
+        assert sim.structure_version > version
+        # the detached property is not written to
+        a.execute(sim)
+        assert prop.get_value() == 5.0
+
+        version = sim.structure_version
+        p.add_property('salary', 'salary', prop.type, 1.0)
+        assert sim.structure_version > version
+
+    def test_bind_missing_reference(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_entity_by_name('Budget')
+        prop = sim.get_process_by_name('Call Center Staff').get_prop(
+            'staff salary')
+        with pytest.raises(merlin.SimReferenceNotFoundException):
+            merlin.RemoveEntityAction('no such entity').bind(sim)
+        # the property exists, but not in this entity
+        a = merlin.ModifyProcessPropertyAction(budget.id, prop.id, 2.0)
+        with pytest.raises(merlin.SimReferenceNotFoundException):
+            a.bind(sim)
+        a.execute(sim)
+        assert prop.get_value() == 5.0
+        scenario = merlin.Scenario({merlin.Event([a], 1)})
+        with pytest.raises(merlin.SimReferenceNotFoundException):
+            scenario.bind(sim)
+
+
+def _structure(sim):
+    """a comparable description of the model structure and settings"""
+    def entity(e):
+        return (
+            e.id, e.parent and e.parent.id,
+            sorted(c.id for c in e.get_children()),
+            sorted((o.id, sorted((ep.connector.id, ep.bias)
+                                 for ep in o.get_endpoint_objects()))
+                   for o in e.outputs),
+            sorted((i.id, i.source and i.source.id) for i in e.inputs),
+            sorted((p.id, p.parent.id,
+                    sorted((pp.id, pp.get_value())
+                           for pp in p.get_properties()))
+                   for p in e.get_processes()))
+    return (sorted(entity(e) for e in sim.get_entities()),
+            sorted(e.id for e in sim.source_entities),
+            sorted((o.id, o.minimum, sorted(i.id for i in o.inputs))
+                   for o in sim.outputs))
+
+
+class TestRollback:
+
+    @pytest.fixture()
+    def scenario(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_entity_by_name('Budget')
+        call_center = sim.get_entity_by_name('call center')
+        office = sim.get_entity_by_name('office building')
+        staff = call_center.get_process_by_name('Call Center Staff')
+        output = list(sim.outputs)[0]
+        ep = budget.get_output_by_type('$').get_endpoint_objects()[0]
+        events = {
+            merlin.Event([
+                merlin.ModifyProcessPropertyAction(
+                    call_center.id, staff.get_prop('staff number').id, 50.0),
+                merlin.ModifyEndpointBiasAction(budget.id, ep.id, bias=0.8),
+                merlin.ModifyOutputMinimumAction(output.id, 60.0),
+                merlin.AddEntityAction('annex'),
+                merlin.AddProcessAction(
+                    'annex', 'pymerlin.processes.ConstantProvider', 100,
+                    {'name': 'annex desks', 'unit': 'desks',
+                     'amount': 20.0}),
+                merlin.AddConnectionAction(budget.id, 'annex', '$'),
+                merlin.ParentEntityAction('annex', office.id)],
+                3),
+            merlin.Event([
+                merlin.RemoveConnectionAction(budget.id, office.id, '$'),
+                merlin.RemoveProcessAction(
+                    call_center.id, staff.id)],
+                6),
+            merlin.Event([merlin.RemoveEntityAction(office.id)], 8)}
+        return sim, merlin.Scenario(events)
+
+    def test_run_rollback(self, scenario):
+        sim, s = scenario
+        before = _structure(sim)
+        version = sim.structure_version
+        sim.run(scenarios=[s], rollback=True)
+        first = list(list(sim.outputs)[0].result)
+        assert _structure(sim) == before
+        assert sim.structure_version > version
+
+        sim.run(scenarios=[s], rollback=True)
+        assert list(sim.outputs)[0].result == first
+        assert _structure(sim) == before
+
+    def test_value_rollback(self, funded_computation_test_harness):
+        # undoing changes of values keeps the bound actions
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_entity_by_name('Budget')
+        call_center = sim.get_entity_by_name('call center')
+        staff = call_center.get_process_by_name('Call Center Staff')
+        output = list(sim.outputs)[0]
+        ep = budget.get_output_by_type('$').get_endpoint_objects()[0]
+        s = merlin.Scenario({merlin.Event([
+            merlin.ModifyProcessPropertyAction(
+                call_center.id, staff.get_prop('staff number').id, 50.0),
+            merlin.ModifyEndpointBiasAction(budget.id, ep.id, bias=0.8),
+            merlin.ModifyOutputMinimumAction(output.id, 60.0)], 3)})
+        before = _structure(sim)
+        sim.run(scenarios=[s], rollback=True)
+        version = sim.structure_version
+        sim.run(scenarios=[s], rollback=True)
+        assert sim.structure_version == version
+        assert _structure(sim) == before
+
+    def test_rollback_on_request(self, scenario):
+        sim, s = scenario
+        before = _structure(sim)
+        sim.run()
+        baseline = list(sim.outputs)[0].result
+        sim.run(scenarios=[s])
+        assert _structure(sim) != before
+        # removed together with its new parent
+        assert sim.get_entity_by_name('annex') is None
+        assert sim.get_entity_by_name('office building') is None
+        sim.rollback()
+        assert _structure(sim) == before
+        assert sim.get_entity_by_name('office building') is not None
+        sim.run()
+        assert list(sim.outputs)[0].result == baseline
+
+
+class TestEditSession:
+
+    def test_scenario_ticks(self, computation_test_harness, monkeypatch):
+        # only ticks with events open a session
+        sim = computation_test_harness  # type: merlin.Simulation
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        sessions = []
+        index = merlin._SimIndex
+        monkeypatch.setattr(
+            merlin, '_SimIndex',
+            lambda *args: sessions.append(sim.current_step) or index(*args))
+        sim.run(scenarios=[merlin.Scenario({merlin.Event(
+            [merlin.ModifyProcessPropertyAction(e.id, prop.id, 50.0)],
+            3)})])
+        assert sessions == [3]
+
+    def test_apply_actions(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_entity_by_name('Budget')
+        actions = [merlin.AddEntityAction('branch {0}'.format(i))
+                   for i in range(4)]
+        actions += [merlin.AddConnectionAction(
+            budget.id, 'branch {0}'.format(i), '$') for i in range(4)]
+        assert sim.apply_actions(actions) == []
+
+        o_con = budget.get_output_by_type('$')
+        biases = [b for _, b in o_con.get_endpoints()]
+        assert len(biases) == 6
+        npt.assert_allclose(biases, [1.0 / 6] * 6)
+        # the index is only used within the session
+        assert sim._index is None
+
+    def test_deferred_balance(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        budget = sim.get_entity_by_name('Budget')
+        o_con = budget.get_output_by_type('$')
+        with sim.edit_session():
+            e = merlin.Entity(sim, 'branch')
+            sim.add_entity(e)
+            sim.connect_entities(budget, e, '$')
+            assert o_con._unbalanced
+            # accessing the biases balances them
+            eps = o_con.get_endpoint_objects()
+            npt.assert_allclose([ep.bias for ep in eps], [1.0 / 3] * 3)
+            sim.disconnect_entities(budget, e, '$')
+        assert not o_con._unbalanced
+        npt.assert_allclose([b for _, b in o_con.get_endpoints()], [0.5, 0.5])
+
+    def test_session_lookups(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        office = sim.get_entity_by_name('office building')
+        with sim.edit_session():
+            assert sim.find_sim_object('office building', 'Entity') is office
+            sim.add_entity(merlin.Entity(sim, 'annex'))
+            assert sim.find_sim_object('annex', 'Entity') is not None
+            merlin.RemoveEntityAction(office.id).execute(sim)
+            assert sim.find_sim_object(office.id, 'Entity') is None
+            assert sim.find_sim_object('office building', 'Entity') is None
+            prop = sim.get_process_by_name('Call Center Staff').get_prop(
+                'staff number')
+            assert sim.find_sim_object(
+                prop.id, 'ProcessProperty') is prop
+            assert sim.find_sim_object(prop.id, 'Connector') is None
+            # the display name differs from the key
+            amount = sim.get_process_by_name('Budget').get_prop('amount')
+            assert sim.find_sim_object(
+                amount.id, 'ProcessProperty') is amount
+
+    def test_unresolved_references(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        call_center = sim.get_entity_by_name('call center')
+        prop = call_center.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        missing = [merlin.RemoveEntityAction('no such entity'),
+                   merlin.AddProcessAction(
+                       'annex', 'pymerlin.processes.ConstantProvider', 100,
+                       {'name': 'p', 'unit': 'u', 'amount': 1.0})]
+        actions = [missing[0],
+                   merlin.ModifyProcessPropertyAction(
+                       call_center.id, prop.id, 50.0),
+                   missing[1]]
+        with pytest.raises(merlin.SimReferenceNotFoundException) as e:
+            sim.apply_actions(actions)
+        assert '2 actions' in str(e.value)
+        assert prop.get_value() == 50.0
+
+        assert sim.apply_actions(actions, strict=False) == missing
+
+        sim.initial_state = actions
+        with pytest.raises(merlin.SimReferenceNotFoundException):
+            sim.init_state()
+
+
+class TestProcessRegistry:
+
+    def test_cached_lookup(self, monkeypatch):
+        registry = merlin.ProcessRegistry()
+        monkeypatch.setattr(merlin, 'process_registry', registry)
+        imports = []
+        import_module = merlin.importlib.import_module
+        monkeypatch.setattr(
+            merlin.importlib, 'import_module',
+            lambda name: imports.append(name) or import_module(name))
+        for i in range(10):
+            a = merlin.AddProcessAction(
+                'e', 'pymerlin.processes.ConstantProvider', 100)
+            assert a.process_class is ConstantProvider
+            assert a.serialize()['operand_2']['params'][0] == \
+                'pymerlin.processes.ConstantProvider'
+        assert imports == ['pymerlin.processes']
+        with pytest.raises(ValueError):
+            registry.get_class('pymerlin.processes.NoSuchProcess')
+        with pytest.raises(ValueError):
+            registry.get_class('no_such_module.NoSuchProcess')
+
+    def test_short_name(self, monkeypatch):
+        # classes found by other names are still written qualified
+        registry = merlin.ProcessRegistry()
+        monkeypatch.setattr(
+            merlin, 'ConstantProvider', ConstantProvider, raising=False)
+        assert registry.get_class('ConstantProvider') is ConstantProvider
+        assert registry.get_name(ConstantProvider) == \
+            'pymerlin.processes.ConstantProvider'
+        assert registry.get_class('ConstantProvider') is ConstantProvider
+
+    def test_register(self, monkeypatch):
+        registry = merlin.ProcessRegistry()
+        monkeypatch.setattr(merlin, 'process_registry', registry)
+
+        @registry.register
+        class LocalProcess(merlin.Process):
+            pass
+
+        registry.register(ConstantProvider, 'constant')
+        assert registry.get_class(
+            'pymerlin.test_merlin.LocalProcess') is LocalProcess
+        a = merlin.AddProcessAction('e', 'constant', 100)
+        assert a.process_class is ConstantProvider
+        # serialised under the name it was first registered with
+        registry.register(BudgetProcess, 'budget')
+        assert registry.get_name(BudgetProcess) == 'budget'
+        a = merlin.AddProcessAction('e', BudgetProcess, 100)
+        assert a.serialize()['operand_2']['params'][0] == 'budget'
+        with pytest.raises(TypeError):
+            registry.register(merlin.Entity)
+        with pytest.raises(TypeError):
+            registry.get_name(merlin.Entity)
+
+
+class TestPropertySchedule:
+
+    @staticmethod
+    def _events(e, prop, changes):
+        # the equivalent of a schedule as one event per change
+        return merlin.Scenario({
+            merlin.Event(
+                [merlin.ModifyProcessPropertyAction(e.id, prop.id, v)], t)
+            for t, v in changes.items()})
+
+    def test_schedule(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        sim.run(scenarios=[self._events(e, prop, {3: 80, 6: 60})])
+        expected = list(output.result)
+
+        prop.set_schedule(merlin.PropertySchedule({3: 80, 6: 60}))
+        sim.run()
+        npt.assert_allclose(output.result, expected)
+        assert prop.get_telemetry_data()['value'] == \
+            [100]*2 + [80]*3 + [60]*5
+
+        # a run starting later takes the latest scheduled value
+        sim.run(start=4)
+        assert prop.get_telemetry_data()['value'] == [80]*2 + [60]*5
+
+        prop.set_schedule(
+            merlin.PropertySchedule.from_series(range(100, 90, -1)))
+        sim.run()
+        assert prop.get_telemetry_data()['value'] == list(range(100, 90, -1))
+
+    def test_action(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        sim.run(scenarios=[self._events(e, prop, {3: 90, 5: 70})])
+        expected = list(output.result)
+
+        action = merlin.ScheduleProcessPropertyAction(
+            e.id, prop.id, {'ticks': [0, 2], 'values': [90, 70]})
+        actions = merlin.Action.create_from_dict([action.serialize()])
+        assert actions[0].serialize() == action.serialize()
+        # the schedule starts with the event
+        scenario = merlin.Scenario(
+            {merlin.Event(actions, 2)}, start_offset=1)
+        sim.run(scenarios=[scenario], rollback=True)
+        npt.assert_allclose(output.result, expected)
+        assert prop.schedule is None
+
+    def test_action_ends_with_run(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        prop.set_schedule(merlin.PropertySchedule({4: 90}))
+        sim.run()
+        expected = prop.get_telemetry_data()['value']
+        assert expected == [100]*3 + [90]*7
+
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.ScheduleProcessPropertyAction(
+                e.id, prop.id, {'ticks': [0], 'values': [50]})], 3)})
+        sim.run(scenarios=[scenario])
+        assert prop.get_telemetry_data()['value'] == [100]*2 + [50]*8
+        # without rollback, the model's schedule is back in the next run
+        assert prop.schedule.changes == {4: 90}
+        sim.run()
+        assert prop.get_telemetry_data()['value'] == expected
+
+        # a scenario removing the schedule
+        sim.run(scenarios=[merlin.Scenario({merlin.Event(
+            [merlin.ScheduleProcessPropertyAction(e.id, prop.id, None)],
+            1)})])
+        assert prop.get_telemetry_data()['value'] == [100]*10
+        sim.run()
+        assert prop.get_telemetry_data()['value'] == expected
+
+    def test_invalid(self):
+        with pytest.raises(merlin.MerlinScriptException):
+            merlin.Action.create_from_dict([{
+                'op': ':=',
+                'operand_1': {'type': 'Entity', 'params': [1],
+                              'props': None},
+                'operand_2': {'type': 'Schedule', 'params': [2],
+                              'props': {'ticks': [1, 2], 'values': [3]}}}])
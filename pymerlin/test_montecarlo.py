@@ -0,0 +1,158 @@
+import numpy as np
+import numpy.testing as npt
+import pytest
+from pymerlin import merlin
+from pymerlin import montecarlo
+from pymerlin.processes import BudgetProcess
+from pymerlin.formula import FormulaProcess
+from pymerlin.test_merlin import sim  # @UnusedImport
+
+
+@pytest.fixture()
+def paid_staff_model(sim) -> merlin.Simulation:
+    """a budget paying the staff of a formula process, which never runs out"""
+    sim.set_time_span(6)
+    sim.add_unit_types(['$', 'requests_handled'])
+    output = merlin.Output('requests_handled', name='requests handled')
+    sim.add_output(output)
+    e_budget = merlin.Entity(name='budget')
+    e_staff = merlin.Entity(name='staff')
+    sim.add_entities([e_budget, e_staff])
+    sim.set_source_entities([e_budget])
+    sim.connect_entities(e_budget, e_staff, '$')
+    sim.connect_output(e_staff, output)
+    e_budget.create_process(
+        BudgetProcess, {'name': 'budget', 'start_amount': 1e9})
+    e_staff.create_process(FormulaProcess, {
+        'name': 'Staff',
+        'inputs': {'budget': '$'},
+        'properties': {'staff': 100, 'salary': 5.0},
+        'requirements': {'budget': 'staff * salary'},
+        'outputs': {'handled': ['requests_handled', 'staff * 0.9']}})
+    return sim
+
+
+def _staff_id(sim):
+    return sim.get_process_by_name('Staff').get_prop('staff').id
+
+
+class TestMonteCarlo:
+
+    def test_deterministic(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        result = montecarlo.run(sim, 8, seed=1)
+        band = result['outputs'][next(iter(sim.outputs)).id]
+        assert result['runs'] == 8
+        assert band['name'] == 'requests handled'
+        npt.assert_allclose(band['mean'], [90.0] * 6)
+        npt.assert_allclose(band['variance'], [0.0] * 6, atol=1e-9)
+        for values in band['quantiles'].values():
+            npt.assert_allclose(values, [90.0] * 6)
+
+    def test_distributions(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff_id = _staff_id(sim)
+        result = montecarlo.run(
+            sim, 200, {staff_id: ('normal', 100.0, 10.0)},
+            quantiles=(0.1, 0.5, 0.9), seed=7)
+        band = result['outputs'][next(iter(sim.outputs)).id]
+
+        # the same values drawn by hand
+        staff = list()
+        for i in range(200):
+            values_seed, _ = np.random.SeedSequence([7, i]).spawn(2)
+            staff.append(np.random.default_rng(values_seed).normal(100, 10))
+        handled = np.array(staff) * 0.9
+        npt.assert_allclose(band['mean'], [handled.mean()] * 6)
+        npt.assert_allclose(band['variance'], [handled.var(ddof=1)] * 6)
+        for q, values in band['quantiles'].items():
+            npt.assert_allclose(
+                values, [np.quantile(handled, q)] * 6, rtol=0.02)
+
+    def test_model_unchanged(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Staff').get_prop('staff')
+        montecarlo.run(sim, 5, {staff.id: ('uniform', 50.0, 60.0)}, seed=3)
+        assert staff.get_value() == 100
+        sim.run()
+        assert next(iter(sim.outputs)).result == [90.0] * 6
+
+    def test_schedule(self, paid_staff_model):
+        # the values drawn replace the schedule of the property
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Staff').get_prop('staff')
+        staff.set_schedule(merlin.PropertySchedule({1: 100.0, 4: 200.0}))
+        result = montecarlo.run(
+            sim, 5, {staff.id: ('uniform', 10.0, 10.0)}, seed=2)
+        band = result['outputs'][next(iter(sim.outputs)).id]
+        npt.assert_allclose(band['mean'], [9.0] * 6)
+        assert staff.schedule.changes == {1: 100.0, 4: 200.0}
+
+        overlay = montecarlo.property_overlay(
+            sim, {staff.id: merlin.PropertySchedule({3: 50.0})}, 3)
+        sim.run(3, scenarios=[overlay])
+        assert next(iter(sim.outputs)).result == [45.0] * 4
+        sim.run()
+        assert next(iter(sim.outputs)).result == [90.0] * 3 + [180.0] * 3
+
+    def test_workers(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        distributions = {_staff_id(sim): ('uniform', 80.0, 120.0)}
+        serial = montecarlo.run(sim, 12, distributions, seed=5)
+        parallel = montecarlo.run(sim, 12, distributions, seed=5, workers=2)
+        assert parallel == serial
+
+    def test_seed(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        distributions = {_staff_id(sim): ('normal', 100.0, 10.0)}
+        result = montecarlo.run(sim, 6, distributions)
+        assert montecarlo.run(
+            sim, 6, distributions, seed=result['seed']) == result
+
+    @pytest.mark.parametrize('distribution', [
+        ('no_such_distribution', 1.0),
+        ('_bit_generator',),
+        ('bit_generator',),
+        (),
+    ])
+    def test_invalid_distribution(self, paid_staff_model, distribution):
+        sim = paid_staff_model  # type: merlin.Simulation
+        with pytest.raises(merlin.MerlinException):
+            montecarlo.run(sim, 2, {_staff_id(sim): distribution})
+
+    def test_unknown_property(self, paid_staff_model):
+        with pytest.raises(merlin.MerlinException):
+            montecarlo.run(paid_staff_model, 2, {-1: ('normal', 0.0, 1.0)})
+
+
+class TestEstimators:
+
+    def test_running_moments(self):
+        values = np.random.default_rng(0).normal(size=(50, 3))
+        m = montecarlo.RunningMoments()
+        m.add(values[0])
+        npt.assert_allclose(m.variance, [0.0] * 3)
+        for v in values[1:]:
+            m.add(v)
+        npt.assert_allclose(m.mean, values.mean(axis=0))
+        npt.assert_allclose(m.variance, values.var(axis=0, ddof=1))
+
+    @pytest.mark.parametrize('p', [0.05, 0.5, 0.95])
+    def test_p2_quantile(self, p):
+        values = np.random.default_rng(1).normal(size=(5000, 4))
+        q = montecarlo.P2Quantile(p)
+        for v in values:
+            q.add(v)
+        npt.assert_allclose(
+            q.estimate, np.quantile(values, p, axis=0), atol=0.05)
+
+    def test_p2_quantile_few(self):
+        q = montecarlo.P2Quantile(0.5)
+        assert q.estimate is None
+        for v in ([1.0], [3.0], [2.0]):
+            q.add(v)
+        npt.assert_allclose(q.estimate, [2.0])
+
+    def test_invalid_quantile(self):
+        with pytest.raises(merlin.MerlinException):
+            montecarlo.P2Quantile(1.0)
@@ -0,0 +1,115 @@
+import pytest
+from pymerlin import merlin
+from pymerlin import runcache
+from pymerlin.test_merlin import (sim, computation_test_harness,  # @UnusedImport
+                                  funded_computation_test_harness)  # @UnusedImport
+
+
+def _staff_scenario(sim, tick, staff_number):
+    e = sim.get_entity_by_name('call center')
+    prop = e.get_process_by_name('Call Center Staff').get_prop('staff number')
+    return merlin.Scenario({merlin.Event(
+        [merlin.ModifyProcessPropertyAction(e.id, prop.id, staff_number)],
+        tick)})
+
+
+class TestFingerprint:
+
+    def test_model(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        fp = runcache.model_fingerprint(sim)
+        assert runcache.model_fingerprint(sim) == fp
+        assert runcache.model_fingerprint(sim.clone()) == fp
+
+        prop = sim.get_process_by_name('Budget').get_prop('amount')
+        prop.default = 1.0
+        assert runcache.model_fingerprint(sim) != fp
+        prop.default = 12000.0
+        assert runcache.model_fingerprint(sim) == fp
+
+        sim.seed = 1
+        assert runcache.model_fingerprint(sim) != fp
+        sim.seed = 0
+
+        o_con = sim.get_entity_by_name('Budget').get_output_by_type('$')
+        i_con, _ = o_con.get_endpoints()[0]
+        o_con.set_endpoint_bias(i_con, 0.9)
+        assert runcache.model_fingerprint(sim) != fp
+
+    def test_structure(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        fp = runcache.model_fingerprint(sim)
+        sim.add_entity(merlin.Entity(sim, 'annex'))
+        assert runcache.model_fingerprint(sim) != fp
+
+    def test_scenarios(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        key = runcache.run_key(sim, scenarios=[_staff_scenario(sim, 5, 50)])
+        assert runcache.run_key(
+            sim, scenarios=[_staff_scenario(sim, 5, 50)]) == key
+        assert runcache.run_key(
+            sim, scenarios=[_staff_scenario(sim, 6, 50)]) != key
+        assert runcache.run_key(
+            sim, scenarios=[_staff_scenario(sim, 5, 60)]) != key
+        assert runcache.run_key(
+            sim, end=4, scenarios=[_staff_scenario(sim, 5, 50)]) != key
+        # events after the last tick are never executed
+        assert runcache.run_key(sim, end=4) == runcache.run_key(
+            sim, end=4, scenarios=[_staff_scenario(sim, 5, 50)])
+
+
+class TestCachedRun:
+
+    def test_memory(self, funded_computation_test_harness, monkeypatch):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        cache = runcache.MemoryCache()
+        scenarios = [_staff_scenario(sim, 5, 50)]
+        result = runcache.cached_run(sim, cache, scenarios=scenarios)
+        sim.run(scenarios=scenarios)
+        assert result['telemetry'] == sim.get_sim_telemetry()
+        assert result['shortfalls'] == []
+        assert len(cache) == 1
+
+        def run(*args, **kwargs):
+            raise AssertionError("should not run")
+
+        monkeypatch.setattr(sim, 'run', run)
+        assert runcache.cached_run(
+            sim, cache, scenarios=[_staff_scenario(sim, 5, 50)]) is result
+        with pytest.raises(AssertionError):
+            runcache.cached_run(sim, cache, end=5)
+
+    def test_unseeded(self, funded_computation_test_harness):
+        # runs drawing new random numbers every time are not cached
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.seed = None
+        cache = runcache.MemoryCache()
+        result = runcache.cached_run(sim, cache)
+        assert len(cache) == 0
+        assert runcache.cached_run(sim, cache) is not result
+
+    def test_shortfalls(self, computation_test_harness):
+        sim = computation_test_harness  # type: merlin.Simulation
+        result = runcache.cached_run(sim, runcache.MemoryCache())
+        sim.run()
+        assert result['shortfalls'] == sim.shortfalls
+        assert len(result['shortfalls']) == 3 * sim.num_steps
+
+    def test_lru(self):
+        cache = runcache.MemoryCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+
+    def test_directory(self, funded_computation_test_harness, tmpdir):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        cache = runcache.DirectoryCache(str(tmpdir))
+        result = runcache.cached_run(sim, cache)
+        key = runcache.run_key(sim)
+        assert cache.get(key) == result
+        assert runcache.DirectoryCache(str(tmpdir)).get(key) == result
+        assert cache.get('missing') is None
@@ -0,0 +1,138 @@
+import pytest
+from pymerlin import merlin
+from pymerlin import sensitivity
+from pymerlin.test_merlin import sim  # @UnusedImport
+from pymerlin.test_montecarlo import paid_staff_model  # @UnusedImport
+
+
+class NoisyStaffProcess(merlin.Process):
+    """handles between half and one and a half requests per staff"""
+
+    def __init__(self, name='Noisy Staff'):
+        super(NoisyStaffProcess, self).__init__(name)
+        self.add_property(
+            'staff', 'staff', merlin.ProcessProperty.PropertyType.number_type,
+            100.0)
+        self.add_output('handled', 'requests_handled')
+
+    def compute(self, tick):
+        self.provide_output(
+            'handled', self.get_prop_value('staff') *
+            self.get_random_generator().uniform(0.5, 1.5))
+
+
+@pytest.fixture()
+def noisy_model(sim) -> merlin.Simulation:
+    sim.set_time_span(6)
+    sim.add_unit_types(['requests_handled'])
+    output = merlin.Output('requests_handled', name='requests handled')
+    sim.add_output(output)
+    e = merlin.Entity(name='staff')
+    sim.add_entities([e])
+    sim.set_source_entities([e])
+    sim.connect_output(e, output)
+    e.create_process(NoisyStaffProcess, {})
+    return sim
+
+
+def _props(sim):
+    staff = sim.get_process_by_name('Staff')
+    return staff.get_prop('staff'), staff.get_prop('salary')
+
+
+class TestSensitivity:
+
+    def test_analyse(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, salary = _props(sim)
+        o_id = next(iter(sim.outputs)).id
+        result = sensitivity.analyse(sim, [salary.id, staff.id], step=0.2)
+        assert result['baseline'] == {o_id: pytest.approx(540.0)}
+        assert result['elasticities'][o_id] == {
+            staff.id: pytest.approx(1.0), salary.id: pytest.approx(0.0)}
+        bars = result['rankings'][o_id]
+        assert [b['property'] for b in bars] == [staff.id, salary.id]
+        assert bars[0]['name'] == staff.name
+        assert bars[0]['low'] == pytest.approx(432.0)
+        assert bars[0]['high'] == pytest.approx(648.0)
+        assert bars[1]['low'] == bars[1]['high'] == pytest.approx(540.0)
+
+    def test_shortfall(self, paid_staff_model):
+        # the budget pays exactly the staff, more staff get nothing done
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, salary = _props(sim)
+        budget = sim.get_process_by_name('budget')
+        budget.get_prop('amount').default = 12 * 500.0
+        o_id = next(iter(sim.outputs)).id
+        result = sensitivity.analyse(sim, [staff.id, salary.id], [o_id])
+        assert result['elasticities'][o_id] == {
+            staff.id: pytest.approx(-486.0 / 540.0 / 0.2),
+            salary.id: pytest.approx(-540.0 / 540.0 / 0.2)}
+        bars = result['rankings'][o_id]
+        assert [b['property'] for b in bars] == [salary.id, staff.id]
+        assert (bars[1]['low'], bars[1]['high']) == \
+            (pytest.approx(486.0), 0.0)
+
+    def test_model_unchanged(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, salary = _props(sim)
+        sensitivity.analyse(sim, [staff.id, salary.id])
+        assert staff.get_value() == 100
+        assert salary.get_value() == 5.0
+        sim.run()
+        assert next(iter(sim.outputs)).result == [90.0] * 6
+
+    def test_workers(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        ids = [p.id for p in _props(sim)]
+        assert sensitivity.analyse(sim, ids, workers=2) == \
+            sensitivity.analyse(sim, ids)
+
+    def test_zero(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, salary = _props(sim)
+        salary.default = 0.0
+        o_id = next(iter(sim.outputs)).id
+        result = sensitivity.analyse(sim, [salary.id])
+        assert result['elasticities'][o_id] == {salary.id: None}
+
+    def test_schedule(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, _ = _props(sim)
+        staff.set_schedule(merlin.PropertySchedule({1: 100.0, 4: 200.0}))
+        o_id = next(iter(sim.outputs)).id
+        result = sensitivity.analyse(sim, [staff.id], step=0.2)
+        assert result['baseline'][o_id] == pytest.approx(810.0)
+        assert result['elasticities'][o_id][staff.id] == pytest.approx(1.0)
+        assert result['rankings'][o_id][0]['low'] == pytest.approx(648.0)
+        assert staff.schedule.changes == {1: 100.0, 4: 200.0}
+
+        # the default until the schedule starts
+        staff.set_schedule(merlin.PropertySchedule({4: 200.0}))
+        result = sensitivity.analyse(sim, [staff.id], step=0.2)
+        assert result['elasticities'][o_id][staff.id] == pytest.approx(1.0)
+
+    def test_seed(self, noisy_model):
+        # the variants draw the same numbers, even without a model seed
+        sim = noisy_model  # type: merlin.Simulation
+        sim.seed = None
+        staff = sim.get_process_by_name('Noisy Staff').get_prop('staff')
+        o_id = next(iter(sim.outputs)).id
+        result = sensitivity.analyse(sim, [staff.id])
+        assert result['seed'] is not None
+        assert result['elasticities'][o_id][staff.id] == pytest.approx(1.0)
+        assert sensitivity.analyse(
+            sim, [staff.id], seed=result['seed']) == result
+
+        sim.seed = 5
+        assert sensitivity.analyse(sim, [staff.id])['seed'] == 5
+
+    def test_invalid(self, paid_staff_model):
+        sim = paid_staff_model  # type: merlin.Simulation
+        staff, _ = _props(sim)
+        with pytest.raises(merlin.MerlinException):
+            sensitivity.analyse(sim, [-1])
+        with pytest.raises(merlin.MerlinException):
+            sensitivity.analyse(sim, [staff.id], [-1])
+        with pytest.raises(merlin.MerlinException):
+            sensitivity.analyse(sim, [staff.id], step=1.0)
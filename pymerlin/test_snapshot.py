@@ -0,0 +1,154 @@
+import pickle
+import threading
+import pytest
+import numpy.testing as npt
+from pymerlin import merlin
+from pymerlin import snapshot
+from pymerlin.test_merlin import (sim, computation_test_harness,  # @UnusedImport
+                                  funded_computation_test_harness,  # @UnusedImport
+                                  dia_reg_service)  # @UnusedImport
+
+
+def _results(sim):
+    return {o.id: list(o.result) for o in sim.outputs}
+
+
+class TestSnapshot:
+
+    def test_seed(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.seed = None
+        assert snapshot.from_dict(snapshot.to_dict(sim)).seed is None
+        # snapshots from before seeds take the default of new models
+        data = snapshot.to_dict(sim)
+        del data['simulation']['seed']
+        assert snapshot.from_dict(data).seed == merlin.Simulation().seed
+
+    def test_round_trip(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        data = snapshot.dumps(sim)
+        loaded = snapshot.loads(data)
+        assert snapshot.dumps(loaded) == data
+        assert loaded.id == sim.id
+        assert {e.id for e in loaded.get_entities()} == \
+            {e.id for e in sim.get_entities()}
+        assert {e.id for e in loaded.source_entities} == \
+            {e.id for e in sim.source_entities}
+
+        sim.run()
+        loaded.run()
+        assert _results(loaded) == _results(sim)
+
+    def test_model_state(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        staff = sim.get_process_by_name('Call Center Staff')
+        staff.get_prop('staff number').set_value(50)
+        staff.get_prop('staff salary').set_schedule(
+            merlin.PropertySchedule({4: 6.0}))
+        budget = sim.get_entity_by_name('Budget')
+        o_con = budget.get_output_by_type('$')
+        i_con = sim.get_entity_by_name('office building').get_input_by_type(
+            '$')
+        o_con.set_endpoint_bias(i_con, 0.25)
+        annex = merlin.Entity(sim, 'annex')
+        sim.get_entity_by_name('office building').add_child(annex)
+
+        loaded = snapshot.loads(snapshot.dumps(sim))
+        l_staff = loaded.get_process_by_id(staff.id)
+        assert type(l_staff) is type(staff)
+        assert l_staff.priority == staff.priority
+        assert l_staff.default_params == staff.default_params
+        assert l_staff.get_prop('staff number').get_value() == 50
+        assert l_staff.get_prop('staff number').id == \
+            staff.get_prop('staff number').id
+        assert l_staff.get_prop('staff salary').schedule.changes == {4: 6.0}
+        assert l_staff.parent.inputs == {
+            pi.connector for pi in l_staff.inputs.values()}
+
+        l_o_con = loaded.get_entity_by_id(budget.id).get_output_by_type('$')
+        assert l_o_con.id == o_con.id
+        assert sorted((i.id, b) for i, b in l_o_con.get_endpoints()) == \
+            sorted((i.id, b) for i, b in o_con.get_endpoints())
+        assert all(i.source is l_o_con for i, _ in l_o_con.get_endpoints())
+
+        l_office = loaded.get_entity_by_name('office building')
+        l_annex = l_office.get_child_by_id(annex.id)
+        assert l_annex.parent is l_office
+        assert l_annex not in loaded.get_entities()
+
+    def test_save_load(self, dia_reg_service, tmpdir):
+        sim = dia_reg_service  # type: merlin.Simulation
+        sim.num_steps = 24
+        path = str(tmpdir.join('model.json'))
+        snapshot.save(sim, path)
+        loaded = snapshot.load(path)
+        assert snapshot.dumps(loaded) == snapshot.dumps(sim)
+        sim.run()
+        loaded.run()
+        for o in loaded.outputs:
+            npt.assert_allclose(o.result, _results(sim)[o.id])
+
+    def test_unknown_format(self, sim):
+        data = snapshot.to_dict(sim)
+        data['format'] = 0
+        with pytest.raises(ValueError):
+            snapshot.from_dict(data)
+
+    def test_pickle(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.initial_state = [merlin.AddAttributesAction(['budget'])]
+        sim.initial_state[0].bind(sim)
+        sim.run()
+        copy = pickle.loads(pickle.dumps(sim))
+        assert snapshot.dumps(copy) == snapshot.dumps(sim)
+        # the run state is not pickled
+        assert copy.get_sim_telemetry()[-1]['messages'] == []
+        assert all(o.result == [] for o in copy.outputs)
+        assert copy.initial_state[0].serialize() == \
+            sim.initial_state[0].serialize()
+
+        copy.run()
+        assert _results(copy) == _results(sim)
+
+
+class TestClone:
+
+    def test_placeholder_ids_per_thread(self):
+        # objects created by other threads during a load get their own ids
+        created = []
+        with merlin._placeholder_id_scope():
+            assert merlin.Entity(name='loaded').id < 0
+            t = threading.Thread(
+                target=lambda: created.append(merlin.Entity(name='other')))
+            t.start()
+            t.join()
+        assert created[0].id > 0
+
+    def test_clone(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        copy = sim.clone()
+        assert snapshot.dumps(copy) == snapshot.dumps(sim)
+        assert all(o.result == [] for o in copy.outputs)
+        staff = sim.get_process_by_name('Call Center Staff')
+        c_staff = copy.get_process_by_id(staff.id)
+        assert c_staff is not staff
+        assert c_staff.default_params is staff.default_params
+
+        c_staff.get_prop('staff number').default = 50
+        assert staff.get_prop('staff number').default == 100
+        copy.run()
+        assert _results(copy) != _results(sim)
+
+    def test_scenario_on_clone(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        e = sim.get_entity_by_name('call center')
+        prop = e.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        scenario = merlin.Scenario({merlin.Event(
+            [merlin.ModifyProcessPropertyAction(e.id, prop.id, 50.0)], 1)})
+        copy = sim.clone()
+        copy.run(scenarios=[scenario])
+        sim.run(scenarios=[scenario])
+        assert _results(copy) == _results(sim)
+        assert copy.shortfalls == sim.shortfalls == []
@@ -0,0 +1,192 @@
+import pytest
+import numpy as np
+import numpy.testing as npt
+from pymerlin import merlin
+from pymerlin import telemetry
+from pymerlin.test_merlin import (sim, computation_test_harness,  # @UnusedImport
+                                  funded_computation_test_harness)  # @UnusedImport
+
+
+def _staff_scenario(sim, tick, staff_number):
+    e = sim.get_entity_by_name('call center')
+    prop = e.get_process_by_name('Call Center Staff').get_prop('staff number')
+    return merlin.Scenario({
+        merlin.Event(
+            [merlin.ModifyProcessPropertyAction(e.id, prop.id, staff_number),
+             merlin.AddEntityAction('annex'),
+             merlin.AddProcessAction(
+                 'annex', 'pymerlin.processes.ConstantProvider', 100,
+                 {'name': 'annex supply', 'unit': 'chairs', 'amount': 3.0})],
+            tick)})
+
+
+class TestCompareRuns:
+
+    def test_frame(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        frame = telemetry.TelemetryFrame.from_simulation(sim)
+        output = list(sim.outputs)[0]
+        npt.assert_allclose(frame.get(output.id), output.result)
+        assert frame.get(output.id, 'no_such_channel') is None
+
+    def test_identical_runs(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        baseline = sim.get_sim_telemetry()
+        sim.run()
+        diff = telemetry.compare_runs(baseline, sim.get_sim_telemetry())
+        assert diff.changed_channels() == []
+        assert diff.top_changed() == []
+        assert diff.only_in_baseline == []
+        assert diff.only_in_variant == []
+
+    def test_scenario_diff(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        sim.run()
+        baseline = sim.get_sim_telemetry()
+        sim.run(scenarios=[_staff_scenario(sim, 7, 50.0)])
+        variant = sim.get_sim_telemetry()
+
+        diff = telemetry.compare_runs(baseline, variant)
+        row = diff.keys.index((output.id, 'value'))
+        assert diff.first_divergence[row] == 7
+        npt.assert_allclose(diff.delta[row], [0.0]*6 + [-50.0]*4)
+        npt.assert_allclose(diff.relative[row], [0.0]*6 + [-0.5]*4)
+
+        annex = sim.get_entity_by_name('annex')
+        supply = annex.get_process_by_name('annex supply')
+        assert supply.get_prop('amount').id in diff.only_in_variant
+        assert annex.get_output_by_type('chairs').id in diff.only_in_variant
+        assert diff.only_in_baseline == []
+
+        top = diff.top_changed(k=2)
+        assert len(top) == 2
+        assert top[0]['total_abs_delta'] >= top[1]['total_abs_delta']
+        assert output.id in [t['id'] for t in diff.top_changed(k=100)]
+
+        summary = diff.serialize()
+        assert 'chairs_output' in [
+            o['name'] for o in summary['only_in_variant']]
+        assert all(c['first_divergence'] >= 7 for c in summary['channels'])
+
+    def test_tolerance(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        sim.run()
+        baseline = sim.get_sim_telemetry()
+        sim.run(scenarios=[_staff_scenario(sim, 7, 99.9)])
+        diff = telemetry.compare_runs(baseline, sim.get_sim_telemetry(),
+                                      atol=0.5)
+        row = diff.keys.index((output.id, 'value'))
+        assert diff.first_divergence[row] == -1
+
+
+class TestAggregation:
+
+    def test_window_ticks(self):
+        assert telemetry.window_ticks(48, 12) == [1, 13, 25, 37]
+        # a run starting mid year gets a partial first window
+        assert telemetry.window_ticks(12, 12, start_tick=7) == [7, 13]
+        assert telemetry.window_ticks(10, 3, align=2) == [1, 2, 5, 8]
+
+    def test_yearly(self):
+        monthly = np.arange(1.0, 49.0)
+        npt.assert_allclose(
+            telemetry.aggregate(monthly, 12),
+            [monthly[i:i+12].sum() for i in range(0, 48, 12)])
+        npt.assert_allclose(
+            telemetry.aggregate(monthly, 12, 'mean'),
+            [monthly[i:i+12].mean() for i in range(0, 48, 12)])
+        npt.assert_allclose(telemetry.aggregate(monthly, 12, 'min'),
+                            [1, 13, 25, 37])
+        npt.assert_allclose(telemetry.aggregate(monthly, 12, 'max'),
+                            [12, 24, 36, 48])
+        npt.assert_allclose(telemetry.aggregate(monthly, 12, 'last'),
+                            [12, 24, 36, 48])
+
+    def test_partial_and_missing(self):
+        values = np.array([[1.0, 2.0, 3.0, 4.0, 5.0],
+                           [1.0, np.nan, np.nan, np.nan, np.nan]])
+        npt.assert_allclose(telemetry.aggregate(values, 2, 'sum'),
+                            [[3.0, 7.0, 5.0], [1.0, np.nan, np.nan]])
+        npt.assert_allclose(telemetry.aggregate(values, 2, 'last'),
+                            [[2.0, 4.0, 5.0], [1.0, np.nan, np.nan]])
+
+    def test_unknown_aggregation(self):
+        with pytest.raises(ValueError):
+            telemetry.aggregate([1.0, 2.0], 2, 'median')
+
+    def test_sim_telemetry(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        output = list(sim.outputs)[0]
+        sim.run()
+        quarterly = sim.get_sim_telemetry(window=3)
+        t_output = next(t for t in quarterly if t.get('id') == output.id)
+        npt.assert_allclose(t_output['data']['value'],
+                            [120.0, 280.0, 300.0, 100.0])
+        assert 'messages' in quarterly[-1]
+
+        last = sim.get_sim_telemetry(window=3, how='last', align=3)
+        t_output = next(t for t in last if t.get('id') == output.id)
+        npt.assert_allclose(t_output['data']['value'],
+                            [40.0, 100.0, 100.0, 100.0])
+
+
+class TestRunLengthSeries:
+
+    def test_list_behaviour(self):
+        values = [1.0, 1.0, 1.0, 2.0, 2.0, 1.0, 3.0, 3.0]
+        s = telemetry.RunLengthSeries(values)
+        assert len(s) == len(values)
+        assert s == values
+        assert list(s) == values
+        assert s[3] == 2.0
+        assert s[-1] == 3.0
+        assert s[2:6] == values[2:6]
+        assert s.runs() == [(0, 1.0), (3, 2.0), (5, 1.0), (6, 3.0)]
+        npt.assert_allclose(s.to_array(), values)
+        with pytest.raises(IndexError):
+            s[len(values)]
+
+    def test_keeps_types(self):
+        s = telemetry.RunLengthSeries([1, 1.0, True])
+        assert [type(v) for v in s] == [int, float, bool]
+
+    def test_empty(self):
+        s = telemetry.RunLengthSeries()
+        assert len(s) == 0
+        assert s == []
+        assert s.to_array().shape == (0,)
+
+    def test_property_telemetry(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        sim.run()
+        prop = sim.get_process_by_name('Call Center Staff').get_prop(
+            'staff number')
+        stored = prop.get_telemetry_data()['value']
+        assert isinstance(stored, telemetry.RunLengthSeries)
+        assert stored.runs() == [(0, 100)]
+        assert len(stored) == sim.num_steps
+
+        tele = sim.get_sim_telemetry()
+        t_prop = next(t for t in tele if t.get('id') == prop.id)
+        assert t_prop['data']['value'] == [100] * sim.num_steps
+        assert type(t_prop['data']['value']) is list
+
+        tele = sim.get_sim_telemetry(expand=False)
+        t_prop = next(t for t in tele if t.get('id') == prop.id)
+        assert t_prop['data']['value'] is stored
+
+    def test_connector_flag(self, funded_computation_test_harness):
+        sim = funded_computation_test_harness  # type: merlin.Simulation
+        o_con = sim.get_entity_by_name('Budget').get_output_by_type('$')
+        o_con.set_telemetry_compression('value')
+        sim.run()
+        stored = o_con.get_telemetry_data()['value']
+        assert isinstance(stored, telemetry.RunLengthSeries)
+        assert stored == [1000.0] * sim.num_steps
+        o_con.set_telemetry_compression('value', False)
+        sim.run()
+        assert type(o_con.get_telemetry_data()['value']) is list